@@ -11,10 +11,13 @@ from qgis.core import QgsProject, QgsApplication
 
 from geocatbridge.errorhandler import handleError
 from geocatbridge.process.provider import BridgeProvider
+from geocatbridge.publish.metadata import precompileXslt
+from geocatbridge.publish.style import invalidateStyle, clearStyleCache
 from geocatbridge.servers import manager
 from geocatbridge.ui.bridgedialog import BridgeDialog
 from geocatbridge.ui.styleviewerwidget import StyleviewerWidget
 from geocatbridge.utils import meta, files, feedback
+from geocatbridge.utils.logchannel import CHANNEL as LOG_CHANNEL
 
 
 class GeocatBridge:
@@ -75,8 +78,14 @@ class GeocatBridge:
         QgsApplication.processingRegistry().addProvider(self.provider)  # noqa
 
     def initGui(self):
+        # Start buffered (batched) writing of log messages on the main thread
+        LOG_CHANNEL.start()
+
         self.initProcessing()
 
+        # Compile the metadata XSLT stylesheets in the background
+        precompileXslt()
+
         # Publish / main dialog menu item + toolbar button
         self.action_publish = QAction(QIcon(files.getIconPath("publish_button")),
                                       QCoreApplication.translate(self.name, "Publish"), self._win)
@@ -109,6 +118,7 @@ class GeocatBridge:
 
     def unload(self):
         files.removeTempFolder()
+        LOG_CHANNEL.stop()
 
         # Remove layer event handlers
         try:
@@ -121,10 +131,12 @@ class GeocatBridge:
                 sys.excepthook = self.qgis_hook
             return
         self._layerSignals.clear()
+        clearStyleCache()
 
         # Remove StyleViewer button and close StyleViewer
         self.action_styleviewer.triggered.disconnect(self.widget_styleviewer.show)
         self.iface.removePluginWebMenu(self.name, self.action_styleviewer)
+        self.widget_styleviewer.stopRefresh()
         self.closeDialog(self.widget_styleviewer)  # noqa
         self.action_styleviewer = None
 
@@ -147,12 +159,15 @@ class GeocatBridge:
 
     def layersAdded(self, layers):
         for lyr in layers:
+            # Note: the cached style conversion must be invalidated before the StyleViewer is updated
+            self._layerSignals.connect(lyr, invalidateStyle)
             self._layerSignals.connect(lyr, self.widget_styleviewer.updateLayer)
 
     def layersWillBeRemoved(self, layer_ids):
         layer_ids = frozenset(layer_ids)
         for lyr_id in layer_ids:
             self._layerSignals.disconnect(lyr_id)
+            invalidateStyle(lyr_id)
 
     def bridgeButtonClicked(self):
         """ Opens the Bridge Publish dialog. This will always create a new BridgeDialog instance."""
@@ -200,25 +215,23 @@ class LayerStyleEventManager:
         """ Connects an event handler function to the layer styleChanged event.
         It is expected that the handler function requires a layer argument.
         Optionally, other *args and **kwargs may be passed on to the function.
+        Multiple handlers can be connected to the same layer: they are called in the order of connection.
         """
         try:
             func = partial(handler, lyr, *args, **kwargs)
             lyr.styleChanged.connect(func)
-            self._store[lyr.id()] = lyr, func
+            self._store.setdefault(lyr.id(), (lyr, []))[1].append(func)
         except RuntimeError:
             pass
 
     def disconnect(self, layer_id):
-        lyr, func = self._store.get(layer_id, (None, None))
-        if lyr and func:
+        """ Disconnects all event handlers of the layer with the given ID. """
+        lyr, funcs = self._store.pop(layer_id, (None, ()))
+        for func in funcs:
             try:
                 lyr.styleChanged.disconnect(func)  # noqa
             except (TypeError, RuntimeError):
                 pass
-        try:
-            del self._store[layer_id]
-        except KeyError:
-            pass
 
     def clear(self):
         all_ids = list(self._store.keys())
@@ -1,7 +1,9 @@
+import os
+
 from qgis.PyQt.QtGui import QIcon
 from qgis.core import QgsProcessingAlgorithm
 
-from geocatbridge.utils import meta
+from geocatbridge.utils import meta, metrics
 from geocatbridge.utils.files import getIconPath
 from geocatbridge.utils.feedback import translate
 
@@ -18,6 +20,7 @@ class BridgeAlgorithm(QgsProcessingAlgorithm):
     def __init__(self):
         super().__init__()
         self.tr = translate
+        self._metrics_baseline = None
 
     def initAlgorithm(self, config=None):  # noqa
         super().initAlgorithm(config)
@@ -36,3 +39,23 @@ class BridgeAlgorithm(QgsProcessingAlgorithm):
 
     def tags(self):
         return []
+
+    def prepareAlgorithm(self, parameters, context, feedback):  # noqa
+        """ Takes a metrics baseline before `processAlgorithm()` runs, so that each (headless) run only reports
+        its own metrics and cache statistics. The metrics are not reset, because a publish task may be running.
+        """
+        self._metrics_baseline = metrics.REGISTRY.baseline()
+        return True
+
+    def postProcessAlgorithm(self, context, feedback):
+        """ Writes the collected metrics to the folder set by the metrics environment variable (if set).
+        This allows ops tooling to collect the metrics of headless publishing jobs.
+        """
+        folder = os.environ.get(metrics.METRICS_DIR_ENV)
+        if folder:
+            try:
+                json_file, _ = metrics.REGISTRY.save(folder, self.name(), self._metrics_baseline)
+                feedback.pushInfo(f'Metrics written to {json_file}')
+            except OSError as err:
+                feedback.reportError(f'Failed to write metrics to {folder}: {err}')
+        return {}
@@ -1,5 +1,6 @@
 from typing import List, Union, NamedTuple, Iterable
 from pathlib import Path
+from time import perf_counter
 
 from qgis.core import (
     QgsVectorFileWriter,
@@ -8,7 +9,7 @@ from qgis.core import (
     QgsProject
 )
 
-from geocatbridge.utils import feedback
+from geocatbridge.utils import feedback, metrics, tracing
 from geocatbridge.utils.layers import BridgeLayer, layerById
 from geocatbridge.utils.files import tempFileInSubFolder
 from geocatbridge.utils.fields import fieldIndexLookup, fieldsForLayer
@@ -65,6 +66,7 @@ def _writeVector(layer: BridgeLayer, fields: List[str],
     return result
 
 
+@tracing.traced(tracing.CAT_EXPORT)
 @feedback.inject
 def exportVector(layer: BridgeLayer, fields: List[str],
                  force_shp: bool = False, target_path: str = None, **kwargs) -> Path:
@@ -99,10 +101,12 @@ def exportVector(layer: BridgeLayer, fields: List[str],
 
     # Perform GeoPackage or Shapefile export
     output = target_path or tempFileInSubFolder(layer.file_slug + ext)
+    start = perf_counter()
     result = _writeVector(layer, fields, output)
 
     # Check if first item in result tuple is an error code
     if result[0] == QgsVectorFileWriter.NoError:
+        metrics.recordExport(ext.lstrip('.'), perf_counter() - start, layer.featureCount(), output)
         logger.logInfo(f"Layer {layer.name()} exported to {output}")
     else:
         # Dump the result tuple as-is when there are errors (the tuple size depends on the QGIS version)
@@ -111,6 +115,7 @@ def exportVector(layer: BridgeLayer, fields: List[str],
     return Path(output)
 
 
+@tracing.traced(tracing.CAT_EXPORT)
 @feedback.inject
 def exportRaster(layer: BridgeLayer, target_path: str = None, **kwargs) -> Path:
     """
@@ -132,6 +137,7 @@ def exportRaster(layer: BridgeLayer, target_path: str = None, **kwargs) -> Path:
     output = target_path or tempFileInSubFolder(layer.file_slug + EXT_GEOTIFF)
     writer = QgsRasterFileWriter(output)
     writer.setOutputFormat(DRIVER_GEOTIFF)
+    start = perf_counter()
     try:
         # For QGIS versions >= 3.8, pass transform context argument
         result = writer.writeRaster(layer.pipe(), layer.width(), layer.height(), layer.extent(), layer.crs(),
@@ -142,6 +148,7 @@ def exportRaster(layer: BridgeLayer, target_path: str = None, **kwargs) -> Path:
 
     # Return type is WriterError (int)
     if result == QgsRasterFileWriter.NoError:
+        metrics.recordExport(EXT_GEOTIFF.lstrip('.'), perf_counter() - start, path=output)
         logger.logInfo(f"Layer {layer.name()} exported to {output}")
     else:
         # Dump the result tuple as-is when there are errors (the tuple size depends on the QGIS version)
@@ -1,19 +1,23 @@
+import hashlib
+import json
 import os
+import threading
 import uuid
 import zipfile
+from collections import namedtuple
+from io import BytesIO
+from pathlib import Path
+from typing import Union, BinaryIO, Optional
 from datetime import datetime
 from xml.dom import minidom
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element, SubElement
 
-from qgis.PyQt.QtCore import QSize
-from qgis.PyQt.QtGui import QImage, QColor, QPainter
-from qgis.core import (
-    QgsMapSettings,
-    QgsMapRendererCustomPainterJob
-)
+from qgis.PyQt.QtCore import QSettings
+from qgis.PyQt.QtXml import QDomDocument
 
-from geocatbridge.utils import meta, feedback
+from geocatbridge.publish.thumbnails import Thumbnail, layerThumbnail, thumbnailKey
+from geocatbridge.utils import meta, feedback, metrics, tracing
 from geocatbridge.utils.files import tempFileInSubFolder, getResourcePath
 from geocatbridge.utils.layers import BridgeLayer
 
@@ -30,6 +34,20 @@ ISO19139_TO_QMD_XSLT = getResourcePath("iso19139-to-qgis.xsl")
 ISO19115_TO_ISO19139_XSLT = getResourcePath("iso19115-to-iso19139.xsl")
 WRAPPING_ISO19115_TO_ISO19139_XSLT = getResourcePath("ISO19115-wrapping-MD_Metadata-to-ISO19139.xslt")
 FGDC_TO_ISO19115 = getResourcePath("ArcCatalogFgdc_to_ISO19115.xsl")
+ALL_XSLT = (QMD_TO_ISO19139_XSLT, ISO19139_TO_QMD_XSLT, ISO19115_TO_ISO19139_XSLT,
+            WRAPPING_ISO19115_TO_ISO19139_XSLT, FGDC_TO_ISO19115)
+
+# Metadata dialects that can be imported by loadMetadataFromXml()
+DIALECT_ISO = "ISO19139"
+DIALECT_ESRI = "ESRI-ISO"
+DIALECT_WRAPPING_ESRI = "ESRI-ISO (wrapping ISO19139)"
+DIALECT_FGDC = "FGDC"
+
+# Lowercase element names (without namespace) that determine the metadata dialect
+_DIALECT_TAGS = frozenset(('esri', 'md_metadata', 'mdcontact', 'cntinfo', 'metadata', 'mdstanname'))
+
+# Settings key for the fingerprints of the published metadata records (per catalog)
+FINGERPRINTS_SETTING = f"{meta.PLUGIN_NAMESPACE}/MetadataFingerprints"
 
 
 class MetadataDependencyError(ModuleNotFoundError):
@@ -41,77 +59,124 @@ class MetadataDependencyError(ModuleNotFoundError):
         return "'lxml' python package is unavailable"
 
 
+class _XsltCache:
+    """ Cache of compiled XSLT stylesheets, keyed by file path and modification time.
+
+    Compiled lxml XSLT objects should not be shared between threads (and copying them compiles them again),
+    so each thread compiles a stylesheet once and keeps it in a thread-local cache.
+    The parsed stylesheet documents are shared by all threads, so each file is only read and parsed once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parsed = {}
+        self._local = threading.local()
+
+    def parse(self, xslt_file: str):
+        """ Returns the (shared) parsed stylesheet document for the given file. """
+        xslt_file = str(xslt_file)
+        mtime = os.path.getmtime(xslt_file)
+        with self._lock:
+            parsed = self._parsed.get(xslt_file)
+            if not parsed or parsed[0] != mtime:
+                parsed = self._parsed[xslt_file] = (mtime, lxml.parse(xslt_file))
+        return parsed[1]
+
+    def get(self, xslt_file):
+        """ Returns a compiled XSLT object for the given stylesheet file that can be used in the current thread. """
+        xslt_file = str(xslt_file)
+        mtime = os.path.getmtime(xslt_file)
+        own = getattr(self._local, 'compiled', None)
+        if own is None:
+            own = self._local.compiled = {}
+        cached = own.get(xslt_file)
+        if cached and cached[0] == mtime:
+            metrics.cacheHit('xslt')
+            return cached[1]
+        metrics.cacheMiss('xslt')
+        doc = self.parse(xslt_file)
+        with self._lock:
+            # Compile from the shared document one thread at a time
+            transform = lxml.XSLT(doc)
+        own[xslt_file] = (mtime, transform)
+        return transform
+
+    def clear(self):
+        """ Removes all cached stylesheets (for all threads that request a stylesheet after this call). """
+        with self._lock:
+            self._parsed.clear()
+        self._local = threading.local()
+
+
+_XSLT_CACHE = _XsltCache()
+
+
+def precompileXslt():
+    """ Reads and parses all Bridge XSLT stylesheets in a background thread, so that the first metadata
+    transformation does not have to wait for it. Stylesheets are compiled by each thread that uses them.
+    Does nothing if lxml is unavailable.
+    """
+    if lxml is None:
+        return
+
+    def _compile():
+        for xslt_file in ALL_XSLT:
+            try:
+                _XSLT_CACHE.parse(xslt_file)
+            except Exception as err:
+                feedback.logWarning(f"Failed to parse XSLT stylesheet {xslt_file}: {err}")
+
+    threading.Thread(target=_compile, name=f"{meta.PLUGIN_NAMESPACE}_xslt", daemon=True).start()
+
+
+@tracing.traced(tracing.CAT_METADATA)
 def _transformDom(input_file, xslt_file):
-    in_dom = lxml.parse(input_file)
-    xslt = lxml.parse(xslt_file)
-    transform = lxml.XSLT(xslt)
+    """ Transforms the input (a file path or an already parsed lxml document) using the given XSLT file. """
+    in_dom = lxml.parse(input_file) if isinstance(input_file, (str, os.PathLike)) else input_file
+    transform = _XSLT_CACHE.get(xslt_file)
     out_dom = transform(in_dom)
     if not out_dom:
         raise Exception("Failed to convert metadata")
     return out_dom
 
 
-def _writeDom(dom, output_file):
-    s = '<?xml version="1.0" encoding="UTF-8"?>\n' + lxml.tostring(dom, pretty_print=True).decode()
-    with open(output_file, "w", encoding="utf8") as f:
-        f.write(s)
-
-
-def _convertMetadata(input_file, output_file, xslt_file):
-    out_dom = _transformDom(input_file, xslt_file)
-    _writeDom(out_dom, output_file)
+def _serializeDom(dom) -> bytes:
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n' + lxml.tostring(dom, pretty_print=True, encoding="UTF-8")
 
 
-def _loadMetadataFromIsoXml(layer, filename):
-    qmd_filename = tempFileInSubFolder("fromiso.qmd")
-    feedback.logInfo(f"Exporting ISO19193 metadata to {qmd_filename}")
-    _convertMetadata(filename, qmd_filename, ISO19139_TO_QMD_XSLT)
-    layer.loadNamedMetadata(qmd_filename)
+def _isoToQmd(source):
+    feedback.logInfo("Converting ISO19139 metadata to QGIS metadata")
+    return _transformDom(source, ISO19139_TO_QMD_XSLT)
 
 
-def _loadMetadataFromEsriXml(layer, filename):
-    iso_filename = tempFileInSubFolder("fromesri.xml")
-    feedback.logInfo(f"Exporting ISO19115 metadata to {iso_filename}")
-    _convertMetadata(filename, iso_filename, ISO19115_TO_ISO19139_XSLT)
-    _loadMetadataFromIsoXml(layer, iso_filename)
+def _esriToQmd(source):
+    feedback.logInfo("Converting ISO19115 metadata to ISO19139")
+    return _isoToQmd(_transformDom(source, ISO19115_TO_ISO19139_XSLT))
 
 
-def _loadMetadataFromWrappingEsriXml(layer, filename):
-    iso_filename = tempFileInSubFolder("fromesri.xml")
-    feedback.logInfo(f"Exporting Wrapping-ISO19115 metadata to {iso_filename}")
-    _convertMetadata(filename, iso_filename, WRAPPING_ISO19115_TO_ISO19139_XSLT)
-    _loadMetadataFromIsoXml(layer, iso_filename)
+def _wrappingEsriToQmd(source):
+    feedback.logInfo("Converting Wrapping-ISO19115 metadata to ISO19139")
+    return _isoToQmd(_transformDom(source, WRAPPING_ISO19115_TO_ISO19139_XSLT))
 
 
-def _loadMetadataFromFgdcXml(layer, filename):
-    iso_filename = tempFileInSubFolder("fromfgdc.xml")
-    feedback.logInfo(f"Exporting FGDC metadata to {iso_filename}")
-    _convertMetadata(filename, iso_filename, FGDC_TO_ISO19115)
-    _loadMetadataFromEsriXml(layer, iso_filename)
+def _fgdcToQmd(source):
+    feedback.logInfo("Converting FGDC metadata to ISO19115")
+    return _esriToQmd(_transformDom(source, FGDC_TO_ISO19115))
 
 
-def _saveLayerThumbnail(layer):
-    filename = tempFileInSubFolder("thumbnail.png")
-    img = QImage(QSize(800, 800), QImage.Format_A2BGR30_Premultiplied)
-    color = QColor(255, 255, 255, 255)
-    img.fill(color.rgba())
-    p = QPainter()
-    p.begin(img)
-    p.setRenderHint(QPainter.Antialiasing)
-    ms = QgsMapSettings()
-    ms.setBackgroundColor(color)
-    ms.setLayers([layer])
-    ms.setExtent(layer.extent())
-    ms.setOutputSize(img.size())
-    render = QgsMapRendererCustomPainterJob(ms, p)
-    render.start()
-    render.waitForFinished()
-    p.end()
-    img.save(filename)
-    return filename
+_DIALECT_CONVERTERS = {
+    DIALECT_ISO: _isoToQmd,
+    DIALECT_ESRI: _esriToQmd,
+    DIALECT_WRAPPING_ESRI: _wrappingEsriToQmd,
+    DIALECT_FGDC: _fgdcToQmd
+}
 
 
-def _transformMetadata(filename, uuid, api_url, wms, wfs, layer_name):
+@tracing.traced(tracing.CAT_METADATA)
+def _transformMetadata(qmd_dom, uuid, api_url, wms, wfs, layer_name, thumbnail_name="thumbnail.png") -> bytes:
+    """ Transforms the QGIS metadata document to ISO19139, sets the record ID, service links and thumbnail URL,
+    and returns the serialized ISO19139 XML.
+    """
 
     def _ns(n):
         return f"{{http://www.isotc211.org/2005/gmd}}{n}"
@@ -131,9 +196,8 @@ def _transformMetadata(filename, uuid, api_url, wms, wfs, layer_name):
         csname = lxml.SubElement(name, "{http://www.isotc211.org/2005/gco}CharacterString")
         csname.text = md_layer
 
-    iso_filename = tempFileInSubFolder("metadata.xml")
-    feedback.logInfo(f"Creating metadata export file {iso_filename}")
-    out_dom = _transformDom(filename, QMD_TO_ISO19139_XSLT)
+    feedback.logInfo(f"Creating ISO19139 metadata for record {uuid}")
+    out_dom = _transformDom(qmd_dom, QMD_TO_ISO19139_XSLT)
 
     for ident in out_dom.iter(_ns("fileIdentifier")):
         ident[0].text = uuid
@@ -148,21 +212,61 @@ def _transformMetadata(filename, uuid, api_url, wms, wfs, layer_name):
         browse_graphic = lxml.SubElement(overview, _ns("MD_BrowseGraphic"))
         file = lxml.SubElement(browse_graphic, _ns("fileName"))
         cs = lxml.SubElement(file, "{http://www.isotc211.org/2005/gco}CharacterString")
-        thumbnail_url = f"{api_url}/records/{uuid}/attachments/thumbnail.png"
+        thumbnail_url = f"{api_url}/records/{uuid}/attachments/{thumbnail_name}"
         cs.text = thumbnail_url
 
-    _writeDom(out_dom, iso_filename)
-    return iso_filename
+    return _serializeDom(out_dom)
+
 
+# ISO19139 metadata record (serialized XML) and its thumbnail, ready to be written to a MEF archive
+MefRecord = namedtuple('MefRecord', 'uuid data thumbnail')
 
-def _createMef(uuid, md_filename, mef_filename, thumb_filename):
-    feedback.logInfo(f"Creating MEF file {mef_filename}")
-    z = zipfile.ZipFile(mef_filename, "w")
-    z.write(md_filename, os.path.join(uuid, "metadata", os.path.basename(md_filename)))
-    z.write(thumb_filename, os.path.join(uuid, "public", os.path.basename(thumb_filename)))
-    info = _getInfoXmlContent(uuid, thumb_filename)
-    z.writestr(os.path.join(uuid, "info.xml"), info)
-    z.close()
+# All inputs of a metadata record: QGIS metadata document (QMD), thumbnail, service links and record name
+RecordSnapshot = namedtuple('RecordSnapshot', 'uuid qmd thumbnail api_url wms_url wfs_url record_name')
+
+
+def _addMefRecord(z: zipfile.ZipFile, record: MefRecord):
+    """ Writes the metadata, thumbnail and info.xml of a record to a (MEF) zip file. """
+    z.writestr(f"{record.uuid}/metadata/metadata.xml", record.data)
+    z.writestr(f"{record.uuid}/public/{record.thumbnail.filename}", record.thumbnail.data)
+    z.writestr(f"{record.uuid}/info.xml", _getInfoXmlContent(record.uuid, record.thumbnail.filename))
+
+
+@tracing.traced(tracing.CAT_METADATA)
+def _createMef(uuid, md_data: bytes, mef_file: Union[str, BinaryIO], thumbnail: Thumbnail):
+    """ Writes a MEF archive for the given record to a file path or a (binary) file-like object. """
+    feedback.logInfo(f"Creating MEF archive for record {uuid}")
+    with zipfile.ZipFile(mef_file, "w", zipfile.ZIP_DEFLATED) as z:
+        _addMefRecord(z, MefRecord(uuid, md_data, thumbnail))
+
+
+class MefArchive:
+    """ In-memory MEF (version 2) archive that can hold multiple metadata records. """
+
+    def __init__(self):
+        self._buffer = BytesIO()
+        self._zip = zipfile.ZipFile(self._buffer, "w", zipfile.ZIP_DEFLATED)
+        self.uuids = []
+
+    def __len__(self):
+        return len(self.uuids)
+
+    @property
+    def size(self) -> int:
+        """ Returns the (compressed) number of bytes written so far. """
+        return self._buffer.tell()
+
+    @tracing.traced(tracing.CAT_METADATA, '_createMef')
+    def add(self, record: MefRecord):
+        """ Adds a metadata record to the archive. """
+        _addMefRecord(self._zip, record)
+        self.uuids.append(record.uuid)
+
+    def close(self) -> BytesIO:
+        """ Finalizes the archive and returns the (rewound) buffer. No records can be added afterwards. """
+        self._zip.close()
+        self._buffer.seek(0)
+        return self._buffer
 
 
 def _addSubElement(parent, tag, value=None, attrib=None):
@@ -200,6 +304,80 @@ def _getInfoXmlContent(uuid, thumb_filename):
     return dom.toprettyxml(indent="  ")
 
 
+def _exportQmd(layer: BridgeLayer) -> bytes:
+    """ Returns the QGIS (QMD) metadata document of the layer, as written by `saveNamedMetadata()`. """
+    doc = QDomDocument()
+    layer.exportNamedMetadata(doc, "")
+    return bytes(doc.toByteArray())
+
+
+def metadataFingerprint(layer: BridgeLayer, api_url: str = None, wms_url: str = None,
+                        wfs_url: str = None, record_name: str = None) -> str:
+    """ Returns a fingerprint of the metadata record (and thumbnail) that `metadataRecord()` would create.
+    The fingerprint is a hash of all inputs of the record: the canonicalized (C14N) QGIS metadata,
+    the ISO19139 stylesheet version, the service links and the thumbnail key (layer style, extent and data).
+    This means that the XSLT transformation and thumbnail rendering are not needed to detect changes.
+    """
+    if lxml is None:
+        raise MetadataDependencyError()
+    digest = hashlib.sha1(lxml.tostring(lxml.fromstring(_exportQmd(layer)), method="c14n"))
+    links = (api_url or "", wms_url or "", wfs_url or "", record_name or layer.web_slug)
+    digest.update(f"{os.path.getmtime(QMD_TO_ISO19139_XSLT)}|{'|'.join(links)}".encode())
+    digest.update(thumbnailKey(layer).encode())
+    return digest.hexdigest()
+
+
+class RecordFingerprints:
+    """ Persistent lookup of the fingerprint (see `metadataFingerprint()`) and the catalog change date
+    of each metadata record that was published to a catalog. The records are stored in the QGIS settings.
+
+    :param catalog:     Unique catalog key (e.g. the API URL).
+    """
+
+    def __init__(self, catalog: str):
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        self._records = None
+
+    @staticmethod
+    def _readAll() -> dict:
+        try:
+            return json.loads(QSettings().value(FINGERPRINTS_SETTING) or '{}')
+        except (TypeError, ValueError):
+            return {}
+
+    def _load(self) -> dict:
+        if self._records is None:
+            self._records = self._readAll().get(self._catalog) or {}
+        return self._records
+
+    def get(self, uuid: str) -> tuple:
+        """ Returns a (fingerprint, change date) tuple for the given record ID, or (None, None) if unknown. """
+        with self._lock:
+            return tuple(self._load().get(uuid) or (None, None))
+
+    def set(self, uuid: str, fingerprint: str, change_date: str = None):
+        """ Stores the fingerprint and the catalog change date (if known) for the given record ID. """
+        with self._lock:
+            self._load()[uuid] = [fingerprint, change_date]
+
+    def remove(self, uuids):
+        """ Forgets the given record IDs (e.g. because the records were deleted). """
+        with self._lock:
+            records = self._load()
+            for uuid in uuids:
+                records.pop(uuid, None)
+
+    def save(self):
+        """ Writes the records of this catalog to the settings (the records of other catalogs are kept). """
+        with self._lock:
+            if self._records is None:
+                return
+            all_records = self._readAll()
+            all_records[self._catalog] = self._records
+            QSettings().setValue(FINGERPRINTS_SETTING, json.dumps(all_records))
+
+
 def uuidForLayer(layer: BridgeLayer) -> str:
     """ If the layer includes a valid UUID, use that ID. Otherwise, calculate a UUID from the layer source path. """
     try:
@@ -210,59 +388,159 @@ def uuidForLayer(layer: BridgeLayer) -> str:
     return str(lyr_id)
 
 
+def _detectDialect(found: set, standard) -> str:
+    """ Returns the metadata dialect for the (lowercase) dialect element names that were found in a document.
+
+    :param found:       Set of the names in `_DIALECT_TAGS` that occur in the document.
+    :param standard:    The first "mdStanName" element in the document (if any).
+    """
+    if 'esri' in found:
+        if 'md_metadata' in found:
+            return DIALECT_WRAPPING_ESRI
+        elif 'mdcontact' not in found and 'cntinfo' in found:
+            return DIALECT_FGDC
+        return DIALECT_ESRI
+    elif 'md_metadata' in found:
+        return DIALECT_ISO
+    elif 'metadata' in found and standard is not None:
+        schema_name = standard.text or ''
+        if "FGDC-STD" in schema_name:
+            return DIALECT_FGDC
+        elif "19115" in schema_name:
+            return DIALECT_ISO
+        raise ValueError(f"Unsupported metadata standard '{schema_name}'")
+    return DIALECT_FGDC
+
+
+def _sniffMetadata(filename) -> tuple:
+    """ Parses a metadata XML file and detects its dialect (see `_detectDialect()`).
+
+    The dialect is detected while the file is parsed incrementally: the element names are only checked
+    until the dialect is certain, or until the attachments (Binary element) of an ESRI document are reached.
+    The rest of the document (e.g. large base64 encoded thumbnails) is parsed, but not inspected.
+
+    :param filename:    Path to the metadata XML file.
+    :returns:           A tuple of (dialect, parsed lxml document).
+    """
+    found = set()
+    standard = None
+    dialect = None
+    context = lxml.iterparse(filename, events=('start',), huge_tree=True)
+    for _, element in context:
+        tag = element.tag
+        name = tag[tag.rfind('}') + 1:].lower()
+        if name == 'md_metadata' and element.getparent() is None:
+            # Plain ISO19139 document
+            dialect = DIALECT_ISO
+            break
+        if name == 'binary' and 'esri' in found:
+            # ESRI attachments do not affect the dialect
+            break
+        if name not in _DIALECT_TAGS:
+            continue
+        found.add(name)
+        if name == 'mdstanname' and standard is None:
+            standard = element
+        if 'esri' in found and 'md_metadata' in found:
+            dialect = DIALECT_WRAPPING_ESRI
+            break
+    for _ in context:
+        # Parse the remainder of the document
+        pass
+    return dialect or _detectDialect(found, standard), context.root.getroottree()
+
+
+def sidecarMetadataFile(layer: BridgeLayer) -> Optional[Path]:
+    """ Returns the path of the metadata XML (sidecar) file next to the data of a file-based layer, or None.
+    The file must have the same name as the layer source with the extension replaced by (or followed by) ".xml".
+    """
+    source = layer.uri if layer.is_file_based else None
+    if source is None:
+        return None
+    for metadata_file in (source.with_suffix(".xml"), source.with_suffix(f"{source.suffix}.xml")):
+        if metadata_file.exists():
+            return metadata_file
+    return None
+
+
+def convertMetadataFromXml(filename) -> bytes:
+    """ Converts an ISO19139, ESRI (ISO19115) or FGDC XML file into a QGIS (QMD) metadata document.
+    The file is only parsed once: the parsed document is used for the dialect detection and the transformation.
+    This function does not modify any layer, so it can safely be called from a worker thread.
+
+    :param filename:    Path to the metadata XML file.
+    :returns:           The serialized QMD document, which can be applied using `applyQmdMetadata()`.
+    """
+    if lxml is None:
+        raise MetadataDependencyError()
+    dialect, dom = _sniffMetadata(str(filename))  # make sure that it's not a Path
+    feedback.logInfo(f"Importing {dialect} metadata from {filename}")
+    return _serializeDom(_DIALECT_CONVERTERS[dialect](dom))
+
+
+def applyQmdMetadata(layer, qmd_data: bytes):
+    """ Loads a QGIS (QMD) metadata document into the layer metadata. Must be called from the main thread. """
+    qmd_filename = tempFileInSubFolder("fromiso.qmd")
+    with open(qmd_filename, "wb") as f:
+        f.write(qmd_data)
+    layer.loadNamedMetadata(qmd_filename)
+
+
 def loadMetadataFromXml(layer, filename):
+    """ Imports the metadata from an ISO19139, ESRI (ISO19115) or FGDC XML file into the layer metadata. """
+    applyQmdMetadata(layer, convertMetadataFromXml(filename))
+
+
+def metadataSnapshot(layer: BridgeLayer, api_url: str = None, wms_url: str = None,
+                     wfs_url: str = None, record_name: str = None) -> RecordSnapshot:
+    """ Collects all layer-dependent inputs of a metadata record: the QGIS metadata document and the thumbnail.
+    This accesses the layer (and may render the thumbnail), so it should run on the thread that owns the layer.
+    """
+    return RecordSnapshot(uuidForLayer(layer), _exportQmd(layer), layerThumbnail(layer),
+                          api_url or "", wms_url, wfs_url, record_name or layer.web_slug)
+
+
+def buildRecord(snapshot: RecordSnapshot) -> MefRecord:
+    """ Creates the ISO19139 metadata record from a snapshot (see `metadataSnapshot()`).
+    This does not access the layer, so it can safely be called from a worker thread.
+    """
     if lxml is None:
         raise MetadataDependencyError()
-    filename = str(filename)  # make sure that it's not a Path
-    root = ElementTree.parse(filename).getroot()
-    tags = set()
-
-    def _hasTag(tag):
-        """ Checks if the given tag exists in the XML document.
-
-        Title-case tags (capital followed by lowercase only) will be also be searched in a lowercase.
-        Tags prefixed by a namespace will also be searched without the namespace.
-        """
-        if not tags:
-            tags.update(e.tag for e in root.iter())
-            tags.update(t[t.find('}') + 1:] for t in tags.copy() if
-                        t.startswith('{') and t.count('}') == 1 and not t.endswith('}'))
-            tags.update(t.lower() for t in tags.copy() if t.istitle())
-
-        return tag in tags or tag.lower() in tags
-
-    if _hasTag("Esri"):
-        if _hasTag("MD_Metadata"):
-            _loadMetadataFromWrappingEsriXml(layer, filename)
-        elif not _hasTag("mdContact") and _hasTag("cntinfo"):
-            _loadMetadataFromFgdcXml(layer, filename)
-        else:
-            _loadMetadataFromEsriXml(layer, filename)
-    elif _hasTag("MD_Metadata"):
-        _loadMetadataFromIsoXml(layer, filename)
-    elif _hasTag("metadata") and _hasTag("mdStanName"):
-        md_standard = next(root.iter("metadata/mdStanName"))
-        if md_standard:
-            schema_name = md_standard.text
-            if "FGDC-STD" in schema_name:
-                _loadMetadataFromFgdcXml(layer, filename)
-            elif "19115" in schema_name:
-                _loadMetadataFromIsoXml(layer, filename)
-    else:
-        _loadMetadataFromFgdcXml(layer, filename)
+    qmd_dom = lxml.ElementTree(lxml.fromstring(snapshot.qmd))
+    md_data = _transformMetadata(qmd_dom, snapshot.uuid, snapshot.api_url, snapshot.wms_url, snapshot.wfs_url,
+                                 snapshot.record_name, snapshot.thumbnail.filename)
+    return MefRecord(snapshot.uuid, md_data, snapshot.thumbnail)
 
 
-def saveMetadata(layer: BridgeLayer, mef_file: str = None,
-                 api_url: str = None, wms_url: str = None, wfs_url: str = None, record_name: str = None):
+def metadataRecord(layer: BridgeLayer, api_url: str = None, wms_url: str = None,
+                   wfs_url: str = None, record_name: str = None) -> MefRecord:
+    """ Creates the ISO19139 metadata record (including the thumbnail) for the given layer in memory. """
     if lxml is None:
         raise MetadataDependencyError()
-    uuid_ = uuidForLayer(layer)
-    filename = tempFileInSubFolder(layer.file_slug + ".qmd")
-    layer.saveNamedMetadata(filename)
-    thumbnail = _saveLayerThumbnail(layer)
-    api_url = api_url or ""
-    record_name = record_name or layer.web_slug
-    md_result = _transformMetadata(filename, uuid_, api_url, wms_url, wfs_url, record_name)
-    mef_file = mef_file or tempFileInSubFolder(uuid_ + ".mef")
-    _createMef(uuid_, md_result, mef_file, thumbnail)
+    return buildRecord(metadataSnapshot(layer, api_url, wms_url, wfs_url, record_name))
+
+
+def _writeMef(layer: BridgeLayer, mef_file: Union[str, BinaryIO],
+              api_url: str = None, wms_url: str = None, wfs_url: str = None, record_name: str = None):
+    """ Creates the MEF archive for the layer metadata in memory and writes it to the given file or buffer. """
+    record = metadataRecord(layer, api_url, wms_url, wfs_url, record_name)
+    _createMef(record.uuid, record.data, mef_file, record.thumbnail)
+
+
+@tracing.traced(tracing.CAT_METADATA)
+def metadataAsMef(layer: BridgeLayer, api_url: str = None, wms_url: str = None,
+                  wfs_url: str = None, record_name: str = None) -> BytesIO:
+    """ Returns an in-memory MEF archive for the layer metadata (rewound, so it can be uploaded directly). """
+    buffer = BytesIO()
+    _writeMef(layer, buffer, api_url, wms_url, wfs_url, record_name)
+    buffer.seek(0)
+    return buffer
+
+
+@tracing.traced(tracing.CAT_METADATA)
+def saveMetadata(layer: BridgeLayer, mef_file: str = None,
+                 api_url: str = None, wms_url: str = None, wfs_url: str = None, record_name: str = None):
+    """ Writes a MEF archive for the layer metadata to the given file path (or a temp file if omitted). """
+    mef_file = mef_file or tempFileInSubFolder(uuidForLayer(layer) + ".mef")
+    _writeMef(layer, mef_file, api_url, wms_url, wfs_url, record_name)
     return mef_file
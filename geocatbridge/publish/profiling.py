@@ -0,0 +1,133 @@
+"""
+Local render-cost profiler: renders layers headlessly (like the metadata thumbnails) on tile-sized images
+at a set of representative scales, so that publishers know how expensive a layer is to draw before publishing.
+"""
+import csv
+import statistics
+from collections import namedtuple
+from typing import Iterable, List
+
+from qgis.core import QgsMapRendererParallelJob, QgsRectangle
+
+from geocatbridge.publish.thumbnails import layerMapSettings
+from geocatbridge.utils import tracing
+from geocatbridge.utils.layers import BridgeLayer
+
+# Width and height (in pixels) of a rendered tile
+TILE_SIZE = 256
+
+# Zoom factors relative to the full layer extent at which the layer is rendered (around the extent center)
+PROFILE_ZOOMS = (1, 4, 16, 64)
+
+# Number of times each tile is rendered (the fastest render is used, so that warm-up costs are ignored)
+PROFILE_REPEATS = 3
+
+# Render time (in milliseconds per tile) from which a layer is considered slow
+SLOW_TILE_MS = 500
+
+
+class RenderSample(namedtuple('RenderSample', 'scale ms')):
+    """ Render time (in milliseconds) of a single tile at the given scale denominator. """
+    __slots__ = ()
+
+
+class LayerProfile(namedtuple('LayerProfile', 'layer_id name samples')):
+    """ Render-cost profile of a layer: the RenderSample objects for each profiled scale. """
+    __slots__ = ()
+
+    @property
+    def mean(self) -> float:
+        """ Returns the mean render time (in milliseconds) per tile. """
+        return statistics.mean(s.ms for s in self.samples) if self.samples else 0.0
+
+    @property
+    def worst(self) -> RenderSample:
+        """ Returns the sample with the highest render time (or None if there are no samples). """
+        return max(self.samples, key=lambda s: s.ms, default=None)
+
+    @property
+    def is_slow(self) -> bool:
+        return self.worst is not None and self.worst.ms >= SLOW_TILE_MS
+
+    def __str__(self):
+        details = ", ".join(f"1:{s.scale:,.0f} = {s.ms:.0f} ms" for s in self.samples)
+        return f"{self.name}: {self.mean:.0f} ms per tile ({details})"
+
+
+def _profileExtents(layer: BridgeLayer, zooms: Iterable[int]) -> List[QgsRectangle]:
+    """ Returns square extents around the center of the layer extent for each zoom factor. """
+    extent = layer.extent()
+    if extent.isEmpty():
+        return [extent]
+    center = extent.center()
+    extents = []
+    for zoom in zooms:
+        half = max(extent.width(), extent.height()) / (2 * zoom)
+        extents.append(QgsRectangle(center.x() - half, center.y() - half, center.x() + half, center.y() + half))
+    return extents
+
+
+def _renderTime(job, layer: BridgeLayer) -> float:
+    """ Returns the time (in milliseconds) that the finished job spent on rendering the layer.
+    Uses the per-layer rendering time if the QGIS version exposes it, and the total job time otherwise
+    (the job only renders a single layer, so the difference is the job overhead).
+    """
+    per_layer = getattr(job, 'perLayerRenderingTime', None)
+    if callable(per_layer):
+        for lyr, ms in per_layer().items():
+            if lyr is not None and lyr.id() == layer.id():
+                return float(ms)
+    return float(job.renderingTime())
+
+
+class ProfileJob(namedtuple('ProfileJob', 'layer_id name snapshot settings')):
+    """ Prepared render-cost profile of a layer (see `prepareProfile()`): a snapshot (clone) of the layer
+    and the map settings of each tile to render.
+    """
+    __slots__ = ()
+
+
+def prepareProfile(layer: BridgeLayer, zooms: Iterable[int] = PROFILE_ZOOMS) -> ProfileJob:
+    """ Prepares the render-cost profile of a layer, which can then be run on another thread (see `profileLayer()`).
+    This must be called on the GUI thread: the map settings render a clone of the layer,
+    so that the user can keep on editing the original layer while the profile is running.
+
+    :param layer:   The layer to profile.
+    :param zooms:   Zoom factors relative to the full layer extent (see `PROFILE_ZOOMS`).
+    """
+    snapshot = layer.clone()
+    if snapshot is None:
+        raise ValueError(f"Failed to clone layer '{layer.name()}'")
+    settings = [layerMapSettings(snapshot, TILE_SIZE, extent) for extent in _profileExtents(snapshot, zooms)]
+    return ProfileJob(layer.id(), layer.name(), snapshot, settings)
+
+
+@tracing.traced(tracing.CAT_STYLE)
+def profileLayer(job: ProfileJob, repeats: int = PROFILE_REPEATS) -> LayerProfile:
+    """ Renders the prepared tiles (see `prepareProfile()`) and measures the render time per tile.
+    Tiles are rendered one at a time, so that the timings are not skewed by other render jobs.
+
+    :param job:     The prepared profile of the layer.
+    :param repeats: Number of times each tile is rendered (the fastest render time is used).
+    :returns:       A LayerProfile with a RenderSample for each zoom factor.
+    """
+    samples = []
+    for ms in job.settings:
+        times = []
+        for _ in range(max(1, repeats)):
+            render_job = QgsMapRendererParallelJob(ms)
+            render_job.start()
+            render_job.waitForFinished()
+            times.append(_renderTime(render_job, job.snapshot))
+        samples.append(RenderSample(ms.scale(), min(times)))
+    return LayerProfile(job.layer_id, job.name, samples)
+
+
+def exportProfiles(profiles: Iterable[LayerProfile], filename: str):
+    """ Writes the render samples of the given profiles to a CSV file (one row per layer and scale). """
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(('layer', 'layer_id', 'scale', 'tile_size', 'ms'))
+        for profile in profiles:
+            for sample in profile.samples:
+                writer.writerow((profile.name, profile.layer_id, round(sample.scale), TILE_SIZE, round(sample.ms, 1)))
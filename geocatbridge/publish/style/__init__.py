@@ -1,20 +1,259 @@
+import hashlib as _hashlib
 import json as _json
-from typing import Dict as _Dict, List, Tuple
-from xml.dom import minidom
+import shutil as _shutil
+import threading as _threading
+from collections import OrderedDict as _OrderedDict
+from contextlib import contextmanager as _contextmanager
+from contextvars import ContextVar as _ContextVar
+from copy import deepcopy as _deepcopy
+from functools import lru_cache as _lru_cache
+from typing import Dict as _Dict, List, Tuple, Union as _Union
 from xml.etree import ElementTree as ETree
 
+from qgis.PyQt.QtCore import QSettings as _QSettings
+from qgis.core import QgsMapLayer as _QgsMapLayer, QgsMapLayerStyle as _QgsMapLayerStyle
+
 # Maps required bridgestyle functionality to a more convenient geocatbridge.publish.style namespace.
 # This also makes sure that we are importing the bridgestyle lib matching this version of GeoCat Bridge.
 from geocatbridge.libs.bridgestyle.bridgestyle.qgis import *  # noqa
+from geocatbridge.publish.style import compaction
 from geocatbridge.utils import layers as _lyr
 from geocatbridge.utils import meta as _meta
+from geocatbridge.utils import metrics as _metrics
+from geocatbridge.utils import tracing as _tracing
 
 # Shortcuts to other functions that were imported by doing import * above
 convertDictToMapfile = mapserver.fromgeostyler.convertDictToMapfile
-convertStyle = togeostyler.convert
+_convertStyle = _tracing.traced(_tracing.CAT_STYLE, 'convertStyle')(togeostyler.convert)
+
+# Maximum number of style conversions to keep in memory
+STYLE_CACHE_SIZE = 200
+
+# If set to true, SLD styles are published as compact (non-indented) XML
+COMPACT_SLD_SETTING = f"{_meta.PLUGIN_NAMESPACE}/CompactSld"
+
+# If set to false, the rules of large categorized or graduated styles are not compacted (see compaction.py)
+COMPACT_RULES_SETTING = f"{_meta.PLUGIN_NAMESPACE}/CompactStyleRules"
+
+# If set to true, large categorized or graduated SLD styles are recoded into a single rule (see compaction.py).
+# This is lossy: WMS legends (GetLegendGraphic) no longer show an entry per class.
+RECODE_RULES_SETTING = f"{_meta.PLUGIN_NAMESPACE}/RecodeStyleRules"
+
+# The bridgestyle converters keep their state (e.g. warnings) in module globals, so they must not run concurrently
+_CONVERTER_LOCK = _threading.RLock()
+
+# ID of the project layer of which a snapshot (clone) is being converted (see `snapshotSource()`)
+_SNAPSHOT_SOURCE = _ContextVar(f'{_meta.PLUGIN_NAMESPACE}_style_snapshot_source', default=None)
+
+# Mapbox GL style layer properties that reference a sprite by name
+_SPRITE_PROPERTIES = frozenset(("icon-image", "fill-pattern", "line-pattern"))
+
+
+class StyleConversion:
+    """ GeoStyler conversion of a layer style, from which the Mapbox GL and Mapfile styles are derived.
+    Derived styles are only created when they are requested for the first time.
+    Note that the GeoStyler, icons and sprites objects are shared: callers should not modify them.
+    """
+
+    def __init__(self, geostyler: dict, icons: dict, sprites: dict, warnings: list):
+        self.geostyler = geostyler
+        self.icons = icons
+        self.sprites = sprites
+        self._warnings = tuple(warnings)
+        self._derived = {}
+
+    @property
+    def warnings(self) -> list:
+        """ Returns a (new) list with the GeoStyler conversion warnings. """
+        return list(self._warnings)
+
+    def _derive(self, name, func):
+        with _CONVERTER_LOCK:
+            if name not in self._derived:
+                self._derived[name] = func(self.geostyler)
+            return self._derived[name]
+
+    def _named(self, name: str = None) -> dict:
+        """ Returns the GeoStyler style for the given (published) layer name, without converting the style again. """
+        current = self.geostyler.get("name")
+        if not name or name == current:
+            return self.geostyler
+        # Rules of single symbol, heatmap and raster styles are named after the layer as well
+        rules = [dict(r, name=name) if r.get("name") == current else r for r in self.geostyler.get("rules", [])]
+        return dict(self.geostyler, name=name, rules=rules)
+
+    def mapbox(self, name: str = None) -> Tuple[str, list]:
+        """ Returns a tuple of (Mapbox GL style JSON string, warnings).
+
+        :param name:    The (published) name of the Mapbox source layer. Defaults to the QGIS layer name.
+        """
+        geostyler = self._named(name)
+        mbox, warnings = self._derive(('mapbox', geostyler["name"]),
+                                      lambda _: mapboxgl.fromgeostyler.convert(geostyler))
+        return mbox, list(warnings)
+
+    def mapboxLayers(self, name: str = None) -> Tuple[list, list]:
+        """ Returns a tuple of (Mapbox GL style layers, warnings), which can be used to assemble group styles.
+        Note that the style layers are shared: callers should not modify them.
+
+        :param name:    The (published) name of the Mapbox source layer. Defaults to the QGIS layer name.
+        """
+        def convert(_):
+            mbox, warnings = self.mapbox(name)
+            return _json.loads(mbox).get("layers", []), warnings
+
+        layers, warnings = self._derive(('mapbox_layers', self._named(name)["name"]), convert)
+        return layers, list(warnings)
+
+    def _mapfileDict(self, compact: bool) -> Tuple[dict, list, list]:
+        def convert(geostyler):
+            if compact:
+                geostyler = compaction.compactGeostyler(geostyler, binary=True)
+            mserver, symbols, warnings = mapserver.fromgeostyler.convertToDict(geostyler)
+            if compact:
+                compaction.hoistMapfileScales(mserver)
+            return mserver, symbols, list(warnings)
+        return self._derive(('mapfile_dict', compact), convert)
+
+    def mapfile(self, compact: bool = None) -> Tuple[str, str, list]:
+        """ Returns a tuple of (Mapfile layer string, Mapfile symbols string, warnings).
+
+        :param compact: If True, the style rules are compacted (see `compactRules()` for the default).
+        """
+        compact = compactRules() if compact is None else compact
+
+        def convert(_):
+            mserver, symbols, warnings = self._mapfileDict(compact)
+            return convertDictToMapfile(mserver), convertDictToMapfile({"SYMBOLS": symbols}), warnings
+
+        mserver, symbols, warnings = self._derive(('mapfile', compact), convert)
+        return mserver, symbols, list(warnings)
+
+    def mapfileDict(self, compact: bool = None) -> Tuple[dict, list, list]:
+        """ Returns a tuple of (Mapfile layer dict, Mapfile symbols list, warnings).
+        The dictionaries are copies, so they can be modified by the caller.
+
+        :param compact: If True, the style rules are compacted (see `compactRules()` for the default).
+        """
+        compact = compactRules() if compact is None else compact
+        mserver, symbols, warnings = self._mapfileDict(compact)
+        return _deepcopy(mserver), _deepcopy(symbols), list(warnings)
+
+
+class _StyleConversionCache:
+    """ Thread-safe, size-limited (least recently used) cache of style conversions.
+    Conversions are keyed by a hash of the layer style (QML) and the layer name, so that all Bridge functions
+    (and layer clones) that need the same style in another format share a single GeoStyler conversion.
+    """
+
+    def __init__(self, max_size=STYLE_CACHE_SIZE):
+        self._max_size = max_size
+        self._items = _OrderedDict()
+        self._layer_keys = {}  # layer ID -> set of cache keys
+        self._key_layers = {}  # cache key -> set of layer IDs
+        self._lock = _threading.Lock()
+
+    @staticmethod
+    def key(layer) -> str:
+        style = _QgsMapLayerStyle()
+        style.readFromLayer(layer)
+        digest = _hashlib.sha1(style.xmlData().encode())
+        digest.update(layer.name().encode())
+        return digest.hexdigest()
+
+    def get(self, layer) -> StyleConversion:
+        key = self.key(layer)
+        with self._lock:
+            conversion = self._items.get(key)
+            if conversion is not None:
+                self._items.move_to_end(key)
+        if conversion is not None:
+            _metrics.cacheHit('geostyler')
+            return conversion
+        _metrics.cacheMiss('geostyler')
+        with _CONVERTER_LOCK:
+            conversion = StyleConversion(*_convertStyle(layer))
+        layer_id = _SNAPSHOT_SOURCE.get() or layer.id()
+        with self._lock:
+            self._items[key] = conversion
+            self._layer_keys.setdefault(layer_id, set()).add(key)
+            self._key_layers.setdefault(key, set()).add(layer_id)
+            while len(self._items) > self._max_size:
+                self._drop(next(iter(self._items)))
+        return conversion
+
+    def _drop(self, key: str):
+        """ Removes the conversion with the given key and its layer references (the lock must be held). """
+        self._items.pop(key, None)
+        for layer_id in self._key_layers.pop(key, ()):
+            keys = self._layer_keys.get(layer_id)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._layer_keys[layer_id]
+
+    def invalidate(self, layer_id: str):
+        with self._lock:
+            for key in list(self._layer_keys.get(layer_id, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._layer_keys.clear()
+            self._key_layers.clear()
+
+
+_STYLE_CACHE = _StyleConversionCache()
+
+
+def styleKey(layer) -> str:
+    """ Returns a hash of the layer style (QML) and the layer name, which is used as the style conversion cache key.
+    If the key has not changed, the converted styles of the layer have not changed either.
+    """
+    return _StyleConversionCache.key(layer)
+
+
+@_contextmanager
+def snapshotSource(layer_id: str):
+    """ Context manager that makes sure that style conversions within the `with` block are cached (and invalidated)
+    for the project layer with the given ID. Use this when converting a snapshot (clone) of that layer,
+    e.g. on a background thread, so that the conversion is reused for (and invalidated with) the original layer.
+    """
+    token = _SNAPSHOT_SOURCE.set(layer_id)
+    try:
+        yield
+    finally:
+        _SNAPSHOT_SOURCE.reset(token)
 
 
-def convertMapboxGroup(group: _lyr.LayerGroup, layers: _Dict[str, _lyr.BridgeLayer], base_url: str, workspace: str):
+def styleConversion(layer) -> StyleConversion:
+    """ Returns the (cached) GeoStyler conversion of the layer style. """
+    return _STYLE_CACHE.get(layer)
+
+
+def invalidateStyle(layer: _Union[_QgsMapLayer, str]):
+    """ Removes the cached style conversions of a layer (or layer ID), e.g. when its style has changed. """
+    _STYLE_CACHE.invalidate(layer if isinstance(layer, str) else layer.id())
+
+
+def clearStyleCache():
+    """ Removes all cached style conversions. """
+    _STYLE_CACHE.clear()
+
+
+def convertStyle(layer) -> tuple:
+    """ Converts the layer style to GeoStyler (cached, see `styleConversion()`).
+    Returns a tuple of (geostyler, icons, sprites, warnings) like bridgestyle `togeostyler.convert()`.
+    """
+    conversion = styleConversion(layer)
+    return conversion.geostyler, conversion.icons, conversion.sprites, conversion.warnings
+
+
+@_tracing.traced(_tracing.CAT_STYLE)
+def convertMapboxGroup(group: _lyr.LayerGroup, layers: _Dict[str, _lyr.BridgeLayer], base_url: str, workspace: str,
+                       sprites: 'SpriteSet' = None):
     """ Reimplementation of the mapbox.convertGroup bridgestyle function,
     that is more robust and less sensitive to changes in Bridge.
 
@@ -22,6 +261,11 @@ def convertMapboxGroup(group: _lyr.LayerGroup, layers: _Dict[str, _lyr.BridgeLay
     :param layers:      Lookup of layer name (in group) and BridgeLayer objects.
     :param base_url:    The GeoServer base URL to append to the URIs.
     :param workspace:   The GeoServer workspace name to publish to.
+    :param sprites:     Optional SpriteSet to which the sprites of the group are added, e.g. to combine the sprites
+                        of all groups in a workspace. Sprites of which the name is already used by another image
+                        are renamed in the group style. By default, a new SpriteSet is created.
+    :returns:           A tuple of (Mapbox style JSON string, warnings, sprites). The sprites of all groups
+                        in a workspace should be combined in a single sprite sheet (see `buildSpriteSheet()`).
     """
     obj = {
         "version": 8,
@@ -41,44 +285,181 @@ def convertMapboxGroup(group: _lyr.LayerGroup, layers: _Dict[str, _lyr.BridgeLay
         "layers": []
     }
 
-    geostylers = {}
-    all_sprites = {}
+    all_sprites = SpriteSet() if sprites is None else sprites
     all_warnings = set()
 
-    # Build GeoStyler and Mapbox styles
+    # Assemble the Mapbox style from the (cached) style layers of each group layer:
+    # the style of each QGIS layer is only converted once, even if it participates in multiple groups
     for layer_name in (name for name in group.layers if isinstance(name, str)):
         layer = layers.get(layer_name)
         if not layer:
             all_warnings.add(f"Mapbox group layer '{layer_name}' not found")
             continue
-        # Clone the layer and make sure that the QGIS name matches the published name
-        layer_clone = layer.clone()
-        layer_clone.setName(layer_name)
-        # Convert layer style using bridgestyle
         try:
-            geostyler, icons, sprites, warnings = convertStyle(layer_clone)
-            all_sprites.update(sprites)  # combine/accumulate sprites
-            geostylers[layer_clone.name()] = geostyler
-            mbox, mb_warnings = mapboxgl.fromgeostyler.convert(geostyler)
+            conversion = styleConversion(layer)
+            renamed = all_sprites.add(conversion.sprites)  # combine/accumulate sprites
+            mb_layers, mb_warnings = conversion.mapboxLayers(layer_name)
             all_warnings.update(mb_warnings)
-            mbox_obj = _json.loads(mbox)
-            obj["layers"].extend(mbox_obj.get("layers", []))
+            obj["layers"].extend(_renameSprites(mb_layers, renamed) if renamed else mb_layers)
         except Exception as err:
             all_warnings.add(f"Could not create Mapbox style for layer '{layer_name}': {err}")
 
-    return _json.dumps(obj, indent=4), all_warnings, mapboxgl.fromgeostyler.toSpriteSheet(all_sprites)
+    return _json.dumps(obj, indent=4), all_warnings, all_sprites
+
+
+def _imageDigest(image) -> str:
+    """ Returns a hash of the size and pixel data of a QImage. """
+    size_in_bytes = getattr(image, 'sizeInBytes', None) or image.byteCount
+    digest = _hashlib.sha1(f"{image.width()}x{image.height()}:{image.format()}".encode())
+    digest.update(image.constBits().asstring(size_in_bytes()))
+    return digest.hexdigest()
+
+
+def _spriteDigest(images: dict) -> str:
+    return _imageDigest(images["image"]) + _imageDigest(images["image2x"])
+
+
+class SpriteSet:
+    """ Collection of Mapbox sprites (e.g. of all Mapbox groups in a workspace), keyed by image digest.
+    Sprites with identical images are stored once under all their names. A sprite of which the name
+    is already used by a different image is stored under a new name (see `add()`).
+    """
+
+    def __init__(self):
+        self._images = _OrderedDict()   # image digest -> (sprite images, sprite names)
+        self._names = {}                # sprite name -> image digest
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, sprites: dict) -> _Dict[str, str]:
+        """ Adds the given sprites (lookup of sprite name and a {"image": QImage, "image2x": QImage} dictionary).
+        Returns a lookup of sprite name and new name for the sprites that had to be renamed,
+        because their name is already used by a different image.
+        """
+        renamed = {}
+        for name, images in sprites.items():
+            digest = _spriteDigest(images)
+            if self._names.get(name, digest) != digest:
+                stem, ext = os.path.splitext(name)
+                renamed[name] = name = f"{stem}_{digest[:12]}{ext}"
+            if name in self._names:
+                continue
+            self._names[name] = digest
+            self._images.setdefault(digest, (images, []))[1].append(os.path.splitext(name)[0])
+        return renamed
+
+    def unique(self) -> list:
+        """ Returns a list of (sprite images, sprite names) tuples: one for each distinct image. """
+        return list(self._images.values())
+
+
+def _renameSprites(mb_layers: list, renamed: _Dict[str, str]) -> list:
+    """ Returns a copy of the Mapbox GL style layers in which the sprite references are renamed
+    according to the given lookup of sprite name and new name (see `SpriteSet.add()`).
+    The given (shared) style layers are not modified.
+    """
+    names = {os.path.splitext(old)[0]: os.path.splitext(new)[0] for old, new in renamed.items()}
+    result = []
+    for mb_layer in mb_layers:
+        mb_layer = dict(mb_layer)
+        for section in ("layout", "paint"):
+            props = mb_layer.get(section)
+            if not isinstance(props, dict):
+                continue
+            mb_layer[section] = {key: names.get(value, value) if key in _SPRITE_PROPERTIES and
+                                 isinstance(value, str) else value for key, value in props.items()}
+        result.append(mb_layer)
+    return result
+
+
+def buildSpriteSheet(sprites: _Union[dict, SpriteSet]) -> _Union[dict, None]:
+    """ Replacement of bridgestyle mapboxgl.fromgeostyler.toSpriteSheet() that combines the given sprites
+    (e.g. of all Mapbox groups in a workspace) in a single sprite sheet. Sprites with identical images
+    (e.g. the same SVG marker used under different names) are only drawn once.
+
+    :param sprites: A SpriteSet or a lookup of sprite name and a {"image": QImage, "image2x": QImage} dictionary.
+    :returns:       A dictionary with the "img", "img2x" (QImage) and "json", "json2x" (string) sprite sheet data,
+                    or None if there are no sprites.
+    """
+    if not sprites:
+        return None
+    if not isinstance(sprites, SpriteSet):
+        sprite_set = SpriteSet()
+        sprite_set.add(sprites)
+        sprites = sprite_set
+
+    unique = sprites.unique()
+    width = sum(images["image"].width() for images, _ in unique)
+    height = max(images["image"].height() for images, _ in unique)
+    img, img2x, painter, painter2x, sheet, sheet2x = togeostyler.initSpriteSheet(width, height)
+    x = 0
+    for images, (name, *aliases) in unique:
+        togeostyler.drawSpriteSheet(name, painter, painter2x, sheet, sheet2x, x, images["image"], images["image2x"])
+        for alias in aliases:
+            sheet[alias] = dict(sheet[name])
+            sheet2x[alias] = dict(sheet2x[name])
+        x += images["image"].width()
+    painter.end()
+    painter2x.end()
+    return {"img": img, "img2x": img2x, "json": _json.dumps(sheet), "json2x": _json.dumps(sheet2x)}
+
+
+@_lru_cache(maxsize=STYLE_CACHE_SIZE)
+def _fileDigest(path: str, mtime: int, size: int) -> str:  # noqa
+    digest = _hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sharedIconName(path: str) -> str:
+    """ Returns a file name for a (local) style icon that is derived from its content hash,
+    so that icons can be shared by all styles in a workspace: identical icons get the same name,
+    while different icons with the same file name do not overwrite each other.
+    """
+    stat = os.stat(path)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f"{stem}_{_fileDigest(path, stat.st_mtime_ns, stat.st_size)[:12]}{ext}"
+
+
+def _renameIcons(element: ETree.Element, icon_names: dict):
+    """ Replaces the icon references (external graphics and SVG marks) in the SLD element
+    by the names in the given lookup of icon path and (shared) file name.
+    """
+    names = {os.path.basename(path): name for path, name in icon_names.items()}
+    for resource in element.iter("OnlineResource"):
+        href = resource.get("xlink:href")
+        if href in names:
+            resource.set("xlink:href", names[href])
+    for mark in element.iter("WellKnownName"):
+        text = mark.text or ""
+        if text.startswith("file://") and text[7:] in names:
+            mark.text = f"file://{names[text[7:]]}"
 
 
 # noinspection HttpUrlsUsage
-def layerStyleAsSld(layer: _lyr.BridgeLayer, lowercase_props: bool = False) -> Tuple[str, dict, list]:
+@_tracing.traced(_tracing.CAT_STYLE)
+def layerStyleAsSld(layer: _lyr.BridgeLayer, lowercase_props: bool = False, pretty: bool = True,
+                    compact: bool = None, icon_names: _Dict[str, str] = None,
+                    recode: bool = None) -> Tuple[str, dict, list]:
     """ Function override of bridgestyle.qgis.layerStyleAsSld() to convert a QGIS layer style to an SLD string.
     Circumvents bridgestyle.sld.fromgeostyler.convert(), so we can properly set the layer name, title, and abstract.
 
     :param layer:           The Bridge layer for which to export an SLD.
     :param lowercase_props: For some styles, it may be necessary to use lowercase property names for attributes.
                             If that is the case, set this to True (defaults to False).
+    :param pretty:          If True (default), the SLD is indented. Set to False to write compact XML.
+    :param compact:         If True, the style rules are compacted (see `compactRules()` for the default).
+    :param icon_names:      Optional lookup of icon path and the (shared) file name under which the SLD
+                            should reference it (see `sharedIconName()`). By default, the icon file name is used.
+    :param recode:          If True, compacted category and range rules are recoded into a single rule
+                            (see `recodeRules()` for the default). Note that the legend then loses its classes.
     """
     geostyler, icons, sprites, warnings = convertStyle(layer)
+    compact = compactRules() if compact is None else compact
+    recode = compact and (recodeRules() if recode is None else recode)
 
     # Code below overrides bridgestyle.sld.fromgeostyler.convert()
     attribs = {
@@ -109,34 +490,174 @@ def layerStyleAsSld(layer: _lyr.BridgeLayer, lowercase_props: bool = False) -> T
     transformation = geostyler.get("transformation", {})
     if transformation:
         feature_type_style.append(sld.fromgeostyler.processTransformation(transformation))
-    for rule in geostyler.get("rules", []):
-        feature_type_style.append(sld.fromgeostyler.processRule(rule))
+    rules = geostyler.get("rules", [])
+    if compact:
+        rules = compaction.mergeCategoryRules(rules)
+    with _CONVERTER_LOCK:
+        feature_type_style.extend(compaction.sldRules(rules, recode=recode))
     if lowercase_props:
         # Convert property names to lowercase in order to match the feature type attributes if needed
         for p in feature_type_style.iter("ogc:PropertyName"):
             p.text = p.text.lower()
+    if icon_names:
+        _renameIcons(feature_type_style, icon_names)
     sld.fromgeostyler._addVendorOption(feature_type_style, "composite", geostyler.get("blendMode"))  # noqa
 
-    # Convert ElementTree to XML string (use minidom for proper formatting)
     root.insert(0, ETree.Comment(f"Generated by {_meta.getLongAppName()} {_meta.getVersion()} "
                                  f"(based on bridgestyle {sld.fromgeostyler.__version__})"))
-    sld_string = ETree.tostring(root, encoding="utf-8", method="xml").decode()
-    dom = minidom.parseString(sld_string)
-    return dom.toprettyxml(indent="  ", encoding="utf-8").decode(), icons, warnings
+    return serializeSld(root, pretty), icons, warnings
+
+
+# Tag of the "CDATA element" hack used by bridgestyle (see bridgestyle.sld.parsecdata)
+_CDATA_TAG = "![CDATA["
+
+
+def _escapeXml(text: str) -> str:
+    """ Escapes special XML characters in text and attribute values (like minidom does). """
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def _writeXml(element: ETree.Element, parts: list, indent: str, addindent: str, newl: str):
+    """ Appends the serialized element (and its children) to the given list of string parts.
+    The output is identical to what minidom would write for the parsed element (see `serializeSld()`).
+    """
+    if element.tag is ETree.Comment:
+        parts.append(f"{indent}<!--{element.text}-->{newl}")
+        return
+    if element.tag == _CDATA_TAG:
+        parts.append(f"<{_CDATA_TAG}{element.text}]]>")
+        return
 
+    # Collect child nodes: text nodes (element text and child tails) are strings
+    nodes = [element.text] if element.text else []
+    for child in element:
+        nodes.append(child)
+        if child.tail:
+            nodes.append(child.tail)
 
-def saveLayerStyleAsZippedSld(layer: _lyr.BridgeLayer, target_file: str, lowercase_props: bool = False) -> List[str]:
+    tag = element.tag
+    # Note: minidom writes namespace declarations before all other attributes
+    attrib = sorted(element.attrib.items(), key=lambda kv: not kv[0].startswith("xmlns"))
+    attrs = "".join(f' {k}="{_escapeXml(v)}"' for k, v in attrib)
+    if not nodes:
+        parts.append(f"{indent}<{tag}{attrs}/>{newl}")
+    elif len(nodes) == 1 and isinstance(nodes[0], str):
+        parts.append(f"{indent}<{tag}{attrs}>{_escapeXml(nodes[0])}</{tag}>{newl}")
+    elif len(nodes) == 1 and nodes[0].tag == _CDATA_TAG:
+        parts.append(f"{indent}<{tag}{attrs}>")
+        _writeXml(nodes[0], parts, "", "", "")
+        parts.append(f"</{tag}>{newl}")
+    else:
+        parts.append(f"{indent}<{tag}{attrs}>{newl}")
+        for node in nodes:
+            if isinstance(node, str):
+                parts.append(f"{indent}{addindent}{_escapeXml(node)}{newl}")
+            else:
+                _writeXml(node, parts, indent + addindent, addindent, newl)
+        parts.append(f"{indent}</{tag}>{newl}")
+
+
+def compactRules() -> bool:
+    """ Returns True if the rules of large categorized or graduated styles should be compacted
+    when SLD or Mapfile styles are generated (see `COMPACT_RULES_SETTING`, enabled by default).
+    """
+    return str(_QSettings().value(COMPACT_RULES_SETTING, True)).lower() in ("true", "1")
+
+
+def recodeRules() -> bool:
+    """ Returns True if compacted SLD category and range rules should also be recoded into a single rule
+    (see `RECODE_RULES_SETTING`, disabled by default, because the WMS legend then loses its classes).
+    """
+    return str(_QSettings().value(RECODE_RULES_SETTING, False)).lower() in ("true", "1")
+
+
+def compactSld() -> bool:
+    """ Returns True if SLD styles should be published as compact XML (see `COMPACT_SLD_SETTING`). """
+    return str(_QSettings().value(COMPACT_SLD_SETTING, False)).lower() in ("true", "1")
+
+
+def serializeSld(root: ETree.Element, pretty: bool = True) -> str:
+    """ Serializes an SLD ElementTree to an XML string in a single pass.
+    The pretty output is identical to serializing the tree with ElementTree, re-parsing it using minidom
+    and writing it with `toprettyxml(indent="  ")`, but much faster (and less memory-hungry) for large styles.
+
+    :param root:    The root element (StyledLayerDescriptor).
+    :param pretty:  If True (default), the XML is indented. If False, compact XML is written (e.g. for publishing).
+    """
+    indent, newl = ("  ", "\n") if pretty else ("", "")
+    parts = [f'<?xml version="1.0" encoding="utf-8"?>{newl}']
+    _writeXml(root, parts, "", indent, newl)
+    return "".join(parts)
+
+
+@_tracing.traced(_tracing.CAT_STYLE)
+def saveLayerStyleAsZippedSld(layer: _lyr.BridgeLayer, target_file: str, lowercase_props: bool = False,
+                              pretty: bool = True) -> List[str]:
     """ Function override of bridgestyle.qgis.saveLayerStyleAsZippedSld().
 
     :param layer:           The Bridge layer for which to export an SLD.
     :param target_file:     Path to the output zip file.
     :param lowercase_props: For some styles, it may be necessary to use lowercase property names for attributes.
                             If that is the case, set this to True (defaults to False).
+    :param pretty:          If True (default), the SLD is indented. Set to False to write compact XML.
     """
-    sld_string, icons, warnings = layerStyleAsSld(layer, lowercase_props)
+    sld_string, icons, warnings = layerStyleAsSld(layer, lowercase_props, pretty)
     with zipfile.ZipFile(target_file, "w") as z:
         for icon in icons.keys():
             if icon:
                 z.write(icon, os.path.basename(icon))
         z.writestr(layer.file_slug + ".sld", sld_string)
     return warnings
+
+
+def layerStyleAsMapbox(layer) -> Tuple[str, dict, list]:
+    """ Function override of bridgestyle.qgis.layerStyleAsMapbox() that uses the style conversion cache.
+    Returns a tuple of (Mapbox GL style JSON string, icons, warnings).
+    """
+    conversion = styleConversion(layer)
+    mbox, mb_warnings = conversion.mapbox()
+    return mbox, conversion.icons, conversion.warnings + mb_warnings
+
+
+def layerStyleAsMapboxFolder(layer, folder: str, name: str = None) -> list:
+    """ Function override of bridgestyle.qgis.layerStyleAsMapboxFolder() that uses the style conversion cache.
+    Writes the Mapbox GL style to a "style.mapbox" file in the given folder and returns the warnings.
+
+    :param layer:   The layer for which to write the Mapbox GL style.
+    :param folder:  The output folder.
+    :param name:    The (published) name of the Mapbox source layer. Defaults to the QGIS layer name.
+    """
+    conversion = styleConversion(layer)
+    mbox, _ = conversion.mapbox(name)
+    with open(os.path.join(folder, "style.mapbox"), "w", encoding="utf-8") as f:
+        f.write(mbox)
+    return conversion.warnings
+
+
+def layerStyleAsMapfile(layer) -> Tuple[str, str, dict, list]:
+    """ Function override of bridgestyle.qgis.layerStyleAsMapfile() that uses the style conversion cache.
+    Returns a tuple of (Mapfile layer string, Mapfile symbols string, icons, warnings).
+    """
+    conversion = styleConversion(layer)
+    mserver, symbols, ms_warnings = conversion.mapfile()
+    return mserver, symbols, conversion.icons, conversion.warnings + ms_warnings
+
+
+def layerStyleAsMapfileFolder(layer, folder: str, additional: dict = None) -> list:
+    """ Function override of bridgestyle.qgis.layerStyleAsMapfileFolder() that uses the style conversion cache.
+    Writes the Mapfile layer and symbols files (and icons) to the given folder and returns the warnings.
+
+    :param layer:       The layer for which to write the Mapfile.
+    :param folder:      The output folder.
+    :param additional:  Optional dictionary of additional LAYER properties.
+    """
+    conversion = styleConversion(layer)
+    mserver, symbols, ms_warnings = conversion.mapfileDict()
+    mserver["LAYER"].update(additional or {})
+    with open(os.path.join(folder, f"{layer.name()}.txt"), "w", encoding="utf-8") as f:
+        f.write(convertDictToMapfile(mserver))
+    with open(os.path.join(folder, f"{layer.name()}_symbols.txt"), "w", encoding="utf-8") as f:
+        f.write(convertDictToMapfile({"SYMBOLS": symbols}))
+    for icon in conversion.icons:
+        _shutil.copyfile(icon, os.path.join(folder, os.path.basename(icon)))
+    return conversion.warnings + ms_warnings
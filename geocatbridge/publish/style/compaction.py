@@ -0,0 +1,322 @@
+"""
+Optimization passes for the GeoStyler rules of large categorized or graduated styles.
+These are applied before the SLD and Mapfile styles are generated, so that servers have to evaluate
+far fewer rules (or classes) per feature. Rule order and rendering results are preserved.
+"""
+import json
+from typing import List, Optional
+from xml.etree import ElementTree as ETree
+
+from geocatbridge.libs.bridgestyle.bridgestyle.sld import fromgeostyler as sld_fromgeostyler
+
+OP_OR = "Or"
+OP_AND = "And"
+OP_EQUAL = "PropertyIsEqualTo"
+OP_PROPERTY = "PropertyName"
+
+# Lower and upper bound comparison operators of graduated (range) filters: operator -> inclusive
+_LOWER_OPS = {"PropertyIsGreaterThanOrEqualTo": True, "PropertyIsGreaterThan": False}
+_UPPER_OPS = {"PropertyIsLessThanOrEqualTo": True, "PropertyIsLessThan": False}
+
+# Minimum number of consecutive category or range rules before they are recoded into a single SLD rule
+# (only if recoding is enabled, see `sldRules()`). Smaller styles always keep an entry for each class in the legend.
+RECODE_MIN_RULES = 20
+
+# SLD elements of which the (literal) value may differ between rules that are recoded
+_RECODE_ELEMENTS = frozenset(("CssParameter", "SvgParameter", "Size", "Rotation", "Opacity"))
+
+# SLD rule child elements that are not symbolizers
+_RULE_ELEMENTS = frozenset(("Name", "Title", "Abstract", "ogc:Filter", "ElseFilter",
+                            "MinScaleDenominator", "MaxScaleDenominator"))
+
+
+def _isProperty(expr) -> bool:
+    return isinstance(expr, list) and len(expr) == 2 and expr[0] == OP_PROPERTY
+
+
+def _isLiteral(expr) -> bool:
+    return expr is not None and not isinstance(expr, (list, dict))
+
+
+def _number(expr) -> Optional[float]:
+    if isinstance(expr, bool) or not _isLiteral(expr):
+        return None
+    try:
+        return float(expr)
+    except (TypeError, ValueError):
+        return None
+
+
+def _categoryFilter(flt) -> Optional[tuple]:
+    """ Returns a tuple of (property name, values) if the filter matches a property against one or more literals
+    (i.e. an equality filter or an Or of equality filters on the same property), or None otherwise.
+    """
+    if not isinstance(flt, list) or not flt:
+        return None
+    if flt[0] == OP_EQUAL and len(flt) == 3:
+        if _isProperty(flt[1]) and _isLiteral(flt[2]):
+            return flt[1][1], (flt[2],)
+        if _isProperty(flt[2]) and _isLiteral(flt[1]):
+            return flt[2][1], (flt[1],)
+        return None
+    if flt[0] == OP_OR:
+        name, values = None, []
+        for operand in flt[1:]:
+            category = _categoryFilter(operand)
+            if category is None or name not in (None, category[0]):
+                return None
+            name = category[0]
+            values.extend(category[1])
+        return (name, tuple(values)) if name else None
+    return None
+
+
+def _rangeFilter(flt) -> Optional[tuple]:
+    """ Returns a tuple of (property name, lower bound, lower operator, upper bound, upper operator)
+    if the filter matches a property against a numeric range (like QGIS graduated renderers), or None otherwise.
+    """
+    if not isinstance(flt, list) or len(flt) != 3 or flt[0] != OP_AND:
+        return None
+    lower, upper = flt[1], flt[2]
+    for expr, ops in ((lower, _LOWER_OPS), (upper, _UPPER_OPS)):
+        if not isinstance(expr, list) or len(expr) != 3 or expr[0] not in ops or not _isProperty(expr[1]):
+            return None
+    lo, hi = _number(lower[2]), _number(upper[2])
+    if lo is None or hi is None or lower[1][1] != upper[1][1]:
+        return None
+    return lower[1][1], lo, lower[0], hi, upper[0]
+
+
+def _equalFilters(name: str, values) -> list:
+    return [[OP_EQUAL, [OP_PROPERTY, name], value] for value in values]
+
+
+def _orFilter(filters: list, binary: bool = False):
+    """ Combines the filters with Or. If `binary` is True, a balanced tree of binary Or filters is returned. """
+    if len(filters) == 1:
+        return filters[0]
+    if not binary:
+        return [OP_OR] + filters
+    middle = len(filters) // 2
+    return [OP_OR, _orFilter(filters[:middle], True), _orFilter(filters[middle:], True)]
+
+
+def _mergedName(names: list) -> str:
+    names = [n for n in names if n]
+    if len(names) <= 3:
+        return ", ".join(names)
+    return f"{names[0]}, {names[1]} and {len(names) - 2} more"
+
+
+def _symbolKey(rule: dict) -> str:
+    return json.dumps([rule.get("symbolizers"), rule.get("scaleDenominator")], sort_keys=True, default=str)
+
+
+def _mergeRun(run: list, binary: bool) -> list:
+    """ Merges the rules with identical symbolizers (and scale denominators) in a run of category rules. """
+    groups = {}
+    for rule, name, values in run:
+        groups.setdefault(_symbolKey(rule), []).append((rule, name, values))
+    result = []
+    for group in groups.values():
+        if len(group) == 1:
+            result.append(group[0][0])
+            continue
+        name = group[0][1]
+        merged = dict(group[0][0])
+        merged["name"] = _mergedName([r.get("name", "") for r, _, _ in group])
+        merged["filter"] = _orFilter(_equalFilters(name, (v for _, _, values in group for v in values)), binary)
+        result.append(merged)
+    return result
+
+
+def mergeCategoryRules(rules: List[dict], binary: bool = False) -> List[dict]:
+    """ Merges category rules (i.e. rules that match a property against one or more values) with identical
+    symbolizers and scale denominators into a single rule with an Or filter.
+    Only consecutive category rules on the same property with distinct values are merged: those are mutually
+    exclusive, so the rendering order does not change. The input rules are not modified.
+
+    :param rules:   List of GeoStyler rules.
+    :param binary:  If True, merged filters are a balanced tree of binary Or filters (e.g. for MapServer).
+    :returns:       A new list of GeoStyler rules.
+    """
+    result = []
+    run, run_name, run_values = [], None, set()
+    for rule in rules:
+        category = _categoryFilter(rule.get("filter"))
+        if category and run and category[0] == run_name and run_values.isdisjoint(category[1]):
+            run.append((rule, *category))
+            run_values.update(category[1])
+            continue
+        result.extend(_mergeRun(run, binary))
+        run, run_name, run_values = [], None, set()
+        if category:
+            run.append((rule, *category))
+            run_name = category[0]
+            run_values.update(category[1])
+        else:
+            result.append(rule)
+    result.extend(_mergeRun(run, binary))
+    return result
+
+
+def compactGeostyler(geostyler: dict, binary: bool = False) -> dict:
+    """ Returns a (shallow) copy of the GeoStyler style in which the category rules have been merged
+    (see `mergeCategoryRules()`).
+    """
+    return dict(geostyler, rules=mergeCategoryRules(geostyler.get("rules", []), binary))
+
+
+def hoistMapfileScales(mapfile: dict) -> dict:
+    """ Moves the scale denominators that all classes in a Mapfile layer dictionary have in common
+    to the layer itself, so that MapServer can skip the layer entirely when it is out of scale.
+    The dictionary is modified in place and returned.
+    """
+    layer = mapfile.get("LAYER", {})
+    classes = [c.get("CLASS", {}) for c in layer.get("CLASSES", [])]
+    if not classes:
+        return mapfile
+    for key in ("MINSCALEDENOM", "MAXSCALEDENOM"):
+        values = {json.dumps(c.get(key)) for c in classes}
+        if len(values) != 1 or classes[0].get(key) is None:
+            continue
+        layer[key] = classes[0][key]
+        for c in classes:
+            del c[key]
+    # Keep the classes at the end of the layer definition
+    layer["CLASSES"] = layer.pop("CLASSES")
+    return mapfile
+
+
+def _ruleKind(rule: dict) -> Optional[tuple]:
+    """ Returns a tuple that identifies a run of recodable rules (kind, property name, scale) and the filter info. """
+    scale = json.dumps(rule.get("scaleDenominator"), sort_keys=True)
+    category = _categoryFilter(rule.get("filter"))
+    if category:
+        return ("category", category[0], scale), category[1]
+    bounds = _rangeFilter(rule.get("filter"))
+    if bounds:
+        return ("range", bounds[0], scale), bounds[1:]
+    return None
+
+
+def _symbolizerNodes(rule_element: ETree.Element) -> list:
+    return [n for child in rule_element if child.tag not in _RULE_ELEMENTS for n in child.iter()]
+
+
+def _varyingNodes(rule_elements: list) -> Optional[list]:
+    """ Returns the positions of the symbolizer nodes of which the values differ between the rules,
+    or None if the symbolizers have a different structure (or differ in other than recodable parameters).
+    """
+    nodes = [_symbolizerNodes(r) for r in rule_elements]
+    first = nodes[0]
+    if not first or any(len(n) != len(first) for n in nodes):
+        return None
+    varying = []
+    for i, node in enumerate(first):
+        others = [n[i] for n in nodes]
+        if any(o.tag != node.tag or o.attrib != node.attrib or len(o) != len(node) for o in others):
+            return None
+        if all(o.text == node.text for o in others):
+            continue
+        if node.tag not in _RECODE_ELEMENTS or len(node):
+            return None
+        varying.append(i)
+    return varying
+
+
+def _literal(parent: ETree.Element, value):
+    ETree.SubElement(parent, "ogc:Literal").text = str(value)
+
+
+def _recodeRun(run: list, kind: tuple) -> Optional[ETree.Element]:
+    """ Combines a run of category or range rules into a single SLD rule, of which the varying symbolizer
+    parameters are Recode (categories) or Categorize (ranges) functions on the property.
+    Returns None if the rules cannot be combined.
+    """
+    rule_type, name = kind[0], kind[1]
+    if rule_type == "range":
+        # Ranges must be ascending and adjacent, and the thresholds must all belong to either range
+        mode = None
+        for (_, (_, _, prev_hi, prev_op)), (_, (lo, lo_op, _, _)) in zip(run, run[1:]):
+            if lo != prev_hi or _LOWER_OPS[lo_op] == _UPPER_OPS[prev_op]:
+                return None
+            lo_mode = "succeeding" if _LOWER_OPS[lo_op] else "preceding"
+            if mode not in (None, lo_mode):
+                return None
+            mode = lo_mode
+
+    elements = [sld_fromgeostyler.processRule(rule) for rule, _ in run]
+    varying = _varyingNodes(elements)
+    if varying is None:
+        return None
+
+    first_rule = run[0][0]
+    if rule_type == "category":
+        values = [v for _, info in run for v in info]
+        flt = _orFilter(_equalFilters(name, values))
+    else:
+        flt = [OP_AND, first_rule["filter"][1], run[-1][0]["filter"][2]]
+    combined = dict(first_rule, name=name, filter=flt)
+    result = sld_fromgeostyler.processRule(combined)
+    nodes = _symbolizerNodes(result)
+    rule_nodes = [_symbolizerNodes(e) for e in elements]
+    for i in varying:
+        node = nodes[i]
+        if rule_type == "category":
+            func = ETree.SubElement(node, "ogc:Function", name="Recode")
+            ETree.SubElement(func, f"ogc:{OP_PROPERTY}").text = name
+            for (_, info), r_nodes in zip(run, rule_nodes):
+                for value in info:
+                    _literal(func, value)
+                    _literal(func, r_nodes[i].text)
+        else:
+            func = ETree.SubElement(node, "ogc:Function", name="Categorize")
+            ETree.SubElement(func, f"ogc:{OP_PROPERTY}").text = name
+            _literal(func, rule_nodes[0][i].text)
+            for (rule, _), r_nodes in zip(run[1:], rule_nodes[1:]):
+                _literal(func, rule["filter"][1][2])  # lower bound (threshold)
+                _literal(func, r_nodes[i].text)
+            if mode == "preceding":
+                _literal(func, mode)
+        node.text = None
+    return result
+
+
+def sldRules(rules: List[dict], recode: bool = False) -> List[ETree.Element]:
+    """ Converts GeoStyler rules into SLD Rule elements.
+    If `recode` is True, runs of at least `RECODE_MIN_RULES` consecutive category (or adjacent range) rules
+    on the same property, of which the symbolizers only differ in their parameter values (e.g. colors),
+    are combined into a single rule with Recode (or Categorize) function-based symbolizer parameters.
+    Note that recoding is lossy: a WMS legend (GetLegendGraphic) shows a single entry for the combined rule
+    instead of an entry per class. Unlike `mergeCategoryRules()`, it is therefore not applied by default.
+    """
+    if not recode:
+        return [sld_fromgeostyler.processRule(rule) for rule in rules]
+
+    result = []
+    run, run_kind, run_values = [], None, set()
+
+    def flush():
+        combined = _recodeRun(run, run_kind) if len(run) >= RECODE_MIN_RULES else None
+        if combined is not None:
+            result.append(combined)
+        else:
+            result.extend(sld_fromgeostyler.processRule(rule) for rule, _ in run)
+
+    for rule in rules:
+        kind, info = _ruleKind(rule) or (None, None)
+        # Note: category values must be distinct, so that the rules in a run are mutually exclusive
+        values = set(info) if kind and kind[0] == "category" else set()
+        if kind is not None and kind == run_kind and run_values.isdisjoint(values):
+            run.append((rule, info))
+            run_values.update(values)
+            continue
+        flush()
+        run, run_kind, run_values = [], kind, values
+        if kind is not None:
+            run.append((rule, info))
+        else:
+            result.append(sld_fromgeostyler.processRule(rule))
+    flush()
+    return result
@@ -0,0 +1,206 @@
+"""
+Style performance linter: finds style constructs that are expensive to render (e.g. by GeoServer or MapServer)
+and ranks them by an estimated rendering cost, so that publishers can fix costly styles before publishing.
+
+The estimated cost of an issue is the (relative) rendering cost per feature of the construct,
+multiplied by the number of features of the layer. It is meant for ranking issues, not as an absolute measure.
+"""
+import os
+from collections import namedtuple
+from typing import List
+
+from qgis.core import QgsMapLayer, QgsWkbTypes
+
+from geocatbridge.libs.bridgestyle.bridgestyle.sld.fromgeostyler import expression_keys
+from geocatbridge.publish.style import _CONVERTER_LOCK, compaction, compactRules, recodeRules, styleConversion
+from geocatbridge.utils.strings import pluralize
+
+# Number of rules without scale limits from which the rule count is considered a problem
+MANY_RULES = 100
+
+# Number of features from which labeling without scale limits is considered a problem
+LARGE_LAYER_FEATURES = 100000
+
+# File size (in bytes) from which an SVG or image marker is considered heavy
+HEAVY_ICON_BYTES = 50 * 1024
+
+# Estimated rendering cost per feature (in relative units) of the checked style constructs
+RULE_COST = 1
+FUNCTION_COST = 5
+DATA_DEFINED_COST = 2
+GRAPHIC_FILL_COST = 10
+ICON_COST_PER_KB = 0.2
+LABEL_COSTS = {
+    QgsWkbTypes.PolygonGeometry: 25,
+    QgsWkbTypes.LineGeometry: 10,
+    QgsWkbTypes.PointGeometry: 4
+}
+
+# Estimated cost from which an issue has a high or medium severity
+HIGH_COST = 1000000
+MEDIUM_COST = 100000
+
+SEVERITY_HIGH = 'High'
+SEVERITY_MEDIUM = 'Medium'
+SEVERITY_LOW = 'Low'
+
+# Symbolizer properties that are not (data-defined) rendering properties
+_IGNORED_PROPERTIES = frozenset(("kind", "label", "graphicFill", "graphicStroke"))
+
+
+class StyleIssue(namedtuple('StyleIssue', 'cost check message')):
+    """ Style performance issue with an estimated rendering cost. """
+    __slots__ = ()
+
+    @property
+    def severity(self) -> str:
+        if self.cost >= HIGH_COST:
+            return SEVERITY_HIGH
+        if self.cost >= MEDIUM_COST:
+            return SEVERITY_MEDIUM
+        return SEVERITY_LOW
+
+    def __str__(self):
+        return f"[{self.severity}] {self.message} (estimated cost: {self.cost:,.0f})"
+
+
+def _isExpression(value) -> bool:
+    return isinstance(value, list) and bool(value) and isinstance(value[0], str)
+
+
+def _functions(expr) -> set:
+    """ Returns the names of the functions in a GeoStyler expression, i.e. all operators that cannot
+    be encoded as plain OGC filter operators (and are evaluated per feature).
+    """
+    if not _isExpression(expr):
+        return set()
+    names = set() if expr[0] in expression_keys else {expr[0]}
+    for arg in expr[1:]:
+        names.update(_functions(arg))
+    return names
+
+
+def _isScaleLimited(rule: dict) -> bool:
+    return bool(rule.get("scaleDenominator"))
+
+
+def _symbolizers(rule: dict):
+    """ Iterates over the symbolizers of a rule, including graphic fill and stroke symbolizers. """
+    for symbolizer in rule.get("symbolizers", []):
+        yield symbolizer
+        for key in ("graphicFill", "graphicStroke"):
+            for sub in symbolizer.get(key) or []:
+                if isinstance(sub, dict):
+                    yield sub
+
+
+def _unscaledSldRules(rules: List[dict]) -> int:
+    """ Returns the number of SLD rules without scale limits and text symbolizers that are published
+    for the given GeoStyler rules when recoding is enabled (see `compaction.sldRules()`).
+    """
+    with _CONVERTER_LOCK:
+        elements = compaction.sldRules(rules, recode=True)
+    return sum(1 for e in elements if not any(c.tag in ("MinScaleDenominator", "MaxScaleDenominator", "TextSymbolizer")
+                                              for c in e))
+
+
+def _featureCount(layer) -> int:
+    count = layer.featureCount() if layer.type() == QgsMapLayer.VectorLayer else -1
+    return count if count >= 0 else LARGE_LAYER_FEATURES
+
+
+def lintStyle(layer, geostyler: dict, icons: dict = None) -> List[StyleIssue]:
+    """ Checks the GeoStyler style of a (vector) layer for expensive constructs.
+
+    :param layer:       The layer to which the style belongs (used for the feature count and geometry type).
+    :param geostyler:   The GeoStyler style of the layer.
+    :param icons:       Dictionary of icon (SVG or image marker) file paths used by the style.
+    :returns:           A list of StyleIssue objects, ordered by estimated cost (highest first).
+    """
+    if layer.type() != QgsMapLayer.VectorLayer:
+        return []
+    features = _featureCount(layer)
+    rules = geostyler.get("rules", [])
+    compact = compactRules()
+    if compact:
+        # Rules are compacted when the style is published: check the rules that the server will evaluate
+        rules = compaction.mergeCategoryRules(rules)
+    text_rules = [r for r in rules if any(s.get("kind") == "Text" for s in r.get("symbolizers", []))]
+    text_ids = {id(r) for r in text_rules}
+    issues = []
+
+    if compact and recodeRules():
+        unscaled = _unscaledSldRules(rules)
+    else:
+        unscaled = sum(1 for r in rules if id(r) not in text_ids and not _isScaleLimited(r))
+    if unscaled >= MANY_RULES:
+        issues.append(StyleIssue(
+            unscaled * RULE_COST * features, 'rules',
+            f"{pluralize(unscaled, 'rule')} without scale limits are evaluated for every feature at all scales: "
+            f"merge similar classes or set scale-dependent visibility"
+        ))
+
+    unscaled_labels = [r for r in text_rules if not _isScaleLimited(r)]
+    if unscaled_labels and features >= LARGE_LAYER_FEATURES:
+        geometry_type = QgsWkbTypes.geometryType(layer.wkbType())
+        label_cost = LABEL_COSTS.get(geometry_type, LABEL_COSTS[QgsWkbTypes.PointGeometry])
+        issues.append(StyleIssue(
+            len(unscaled_labels) * label_cost * features, 'labels',
+            f"Labels are placed for all {features:,} features at all scales: "
+            f"set scale-dependent visibility for the labels"
+        ))
+
+    filter_functions, function_rules = set(), 0
+    for rule in rules:
+        names = _functions(rule.get("filter"))
+        if names:
+            function_rules += 1
+            filter_functions.update(names)
+    if function_rules:
+        issues.append(StyleIssue(
+            function_rules * FUNCTION_COST * features, 'filters',
+            f"{pluralize(function_rules, 'rule filter')} use functions ({', '.join(sorted(filter_functions))}) "
+            f"that cannot be encoded as a database query and are evaluated for each feature: "
+            f"use plain attribute comparisons or precompute the values in an attribute"
+        ))
+
+    data_defined, graphic_fills = set(), 0
+    for rule in rules:
+        for symbolizer in _symbolizers(rule):
+            if symbolizer.get("graphicFill") or symbolizer.get("graphicStroke"):
+                graphic_fills += 1
+            for key, value in symbolizer.items():
+                if key not in _IGNORED_PROPERTIES and _functions(value):
+                    data_defined.add(key)
+    if data_defined:
+        issues.append(StyleIssue(
+            len(data_defined) * DATA_DEFINED_COST * features, 'data-defined',
+            f"Symbol properties ({', '.join(sorted(data_defined))}) are computed for each feature: "
+            f"use fixed values or classes where possible"
+        ))
+    if graphic_fills:
+        issues.append(StyleIssue(
+            graphic_fills * GRAPHIC_FILL_COST * features, 'graphic-fills',
+            f"{pluralize(graphic_fills, 'symbol')} use marker pattern fills or marker lines, "
+            f"which draw many markers per feature"
+        ))
+
+    for path in icons or {}:
+        try:
+            size = os.path.getsize(path)
+        except (OSError, TypeError, ValueError):
+            continue
+        if size >= HEAVY_ICON_BYTES:
+            issues.append(StyleIssue(
+                size / 1024 * ICON_COST_PER_KB * features, 'icons',
+                f"Marker '{os.path.basename(path)}' is {size / 1024:,.0f} KB: "
+                f"simplify the SVG or use a smaller image"
+            ))
+
+    return sorted(issues, key=lambda i: i.cost, reverse=True)
+
+
+def lintLayerStyle(layer) -> List[StyleIssue]:
+    """ Checks the (cached) GeoStyler conversion of the layer style for expensive constructs (see `lintStyle()`). """
+    conversion = styleConversion(layer)
+    return lintStyle(layer, conversion.geostyler, conversion.icons)
@@ -3,7 +3,7 @@ import sys
 import traceback
 from typing import Union, List
 
-from qgis.PyQt.QtCore import pyqtSignal
+from qgis.PyQt.QtCore import pyqtSignal, QSettings
 from qgis.PyQt.QtWidgets import QWidget
 from qgis.core import (
     QgsTask,
@@ -19,14 +19,34 @@ from geocatbridge.publish import export
 from geocatbridge.publish.export import GeoPackager
 from geocatbridge.publish.metadata import uuidForLayer, saveMetadata
 from geocatbridge.publish.style import saveLayerStyleAsZippedSld
+from geocatbridge.publish.style.lint import lintLayerStyle
+from geocatbridge.publish import thumbnails
 from geocatbridge.servers.bases import DataCatalogServerBase, MetaCatalogServerBase
 from geocatbridge.ui.progressdialog import DATA, METADATA, SYMBOLOGY, GROUPS
 from geocatbridge.ui.publishreportdialog import PublishReportDialog
 from geocatbridge.utils import feedback
+from geocatbridge.utils import logchannel
+from geocatbridge.utils import metrics
 from geocatbridge.utils import strings
+from geocatbridge.utils import tracing
 from geocatbridge.utils.fields import fieldsForLayer, ShpFieldLookup, fieldNameEditor
-from geocatbridge.utils.layers import BridgeLayer, layerById
-from geocatbridge.utils.meta import getAppName
+from geocatbridge.utils.layers import BridgeLayer, layerById, listBridgeLayers
+from geocatbridge.utils.files import tempFolder
+from geocatbridge.utils.meta import getAppName, PLUGIN_NAMESPACE
+
+# If set to true, task traces and metrics are written to the QGIS project folder instead of the Bridge temp folder
+TRACE_IN_PROJECT_SETTING = f"{PLUGIN_NAMESPACE}/SaveTraceInProject"
+
+STEP_NAMES = {
+    SYMBOLOGY: 'symbology',
+    DATA: 'data',
+    METADATA: 'metadata',
+    GROUPS: 'groups'
+}
+
+# Report entries for issues that were logged by batched (non layer-specific) publish steps
+METADATA_RESULTS = '(metadata records)'
+GROUPS_RESULTS = '(layer groups)'
 
 
 class TaskBase(QgsTask):
@@ -34,31 +54,75 @@ class TaskBase(QgsTask):
     stepStarted = pyqtSignal(str, int)
     stepSkipped = pyqtSignal(str, int)
 
-    def __init__(self, layer_ids: List[str], field_map: dict):
+    def __init__(self, layer_ids: List[str], field_map: dict, trace_name: str):
         super().__init__(f'{getAppName()} publish/export task', QgsTask.CanCancel)
         self.layer_ids = layer_ids
         self.field_map = field_map
+        self.tracer = tracing.Tracer(trace_name)
+        self.trace_file = None
+        self.metrics_files = None
+        self._steps = {}
+        # Metrics are reported per task run (see `run()`), without resetting the metrics of other runs
+        self._metrics_baseline = None
 
     def run(self):
         raise NotImplementedError
 
+    def startStep(self, layer_id, step: int):
+        """ Emits the stepStarted signal and starts a trace span for the given step. """
+        self._steps[(layer_id, step)] = self.tracer.begin(STEP_NAMES[step], tracing.CAT_STEP, layer=layer_id)
+        self.stepStarted.emit(layer_id, step)
+
+    def finishStep(self, layer_id, step: int):
+        """ Ends the trace span for the given step and emits the stepFinished signal. """
+        token = self._steps.pop((layer_id, step), None)
+        if token:
+            self.tracer.end(token)
+        self.stepFinished.emit(layer_id, step)
+
+    def saveTrace(self, folder: str = None):
+        """ Writes the task trace (Chrome trace_event format) and metrics (JSON and Prometheus text)
+        to the given folder. If the folder is not specified or not writable, the files are written to the
+        Bridge temp folder, or to the project folder if the user opted in (see `TRACE_IN_PROJECT_SETTING`).
+        The paths are stored in the `trace_file` and `metrics_files` attributes.
+        """
+        in_project = str(QSettings().value(TRACE_IN_PROJECT_SETTING, False)).lower() in ("true", "1")
+        project_folder = QgsProject().instance().homePath() if in_project else None
+        for path in (folder, project_folder, tempFolder()):
+            if not path:
+                continue
+            try:
+                self.trace_file = self.tracer.save(path)
+                self.metrics_files = metrics.REGISTRY.save(path, f"{self.tracer.name}_metrics",
+                                                           self._metrics_baseline)
+            except OSError as err:
+                feedback.logWarning(f"Could not write trace file to {path}: {err}")
+                continue
+            feedback.logInfo(f"Trace and metrics of {self.tracer.name} task written to {path}")
+            return
+
 
 class PublishTask(TaskBase):
 
     def __init__(self, layer_ids: List[str], field_map: dict, only_symbology: bool,
                  geodata_server: DataCatalogServerBase, metadata_server: MetaCatalogServerBase, parent: QWidget):
-        super().__init__(layer_ids, field_map)
+        super().__init__(layer_ids, field_map, 'publish')
         self._geopackager = GeoPackager(layer_ids, field_map)
         self.geodata_server = geodata_server
         self.metadata_server = metadata_server
         self.only_symbology = only_symbology
         self.results = {}
+        self.skipped_metadata = set()
+        self.style_issues = {}
         self.exception = None
         self.exc_type = None
         self.parent = parent
 
+    @tracing.active
+    @logchannel.scoped
     def run(self):
         """ Start the publish task. """
+        self._metrics_baseline = metrics.REGISTRY.baseline()
 
         def _publish(lyr: BridgeLayer, pub_fields: Union[list, ShpFieldLookup, None] = None):
             pub_fields = pub_fields.values() if isinstance(pub_fields, ShpFieldLookup) else pub_fields
@@ -83,7 +147,11 @@ class PublishTask(TaskBase):
                 self.geodata_server.prepareForPublishing(self.only_symbology)
 
             self.results = {}
+            self.skipped_metadata = set()
+            self.style_issues = {}
             published_ids = set()
+            metadata_items = []
+            issues = logchannel.currentScope()
             for i, layer_id in enumerate(self.layer_ids):
                 if self.isCanceled():
                     return False
@@ -94,6 +162,7 @@ class PublishTask(TaskBase):
                     errors.append(f"Layer with ID {layer_id} is missing or no longer publishable")
                     continue
                 name = layer.name()
+                layer_span = self.tracer.begin(name, tracing.CAT_LAYER, id=layer_id)
                 if not strings.validate(name, first_alpha=True):
                     try:
                         msg = f"Layer name '{name}' may cause issues"
@@ -104,26 +173,33 @@ class PublishTask(TaskBase):
                            f"and follow with letters, numbers, or .-_"
                     warnings.append(msg)
                 md_valid, _ = validator.validate(layer.metadata())
+                issues.clear()
                 if self.geodata_server is not None:
-                    self.geodata_server.resetLogIssues()
-
                     publish_fields = fieldsForLayer(layer, self.field_map, self.geodata_server.vectorLayersAsShp())
                     with fieldNameEditor(layer, publish_fields):
 
                         # Publish style
-                        self.stepStarted.emit(layer_id, SYMBOLOGY)
+                        self.startStep(layer_id, SYMBOLOGY)
                         try:
                             self.geodata_server.publishStyle(layer)
                         except:
                             errors.append(traceback.format_exc())
-                        self.stepFinished.emit(layer_id, SYMBOLOGY)
+                        self.finishStep(layer_id, SYMBOLOGY)
+
+                        # Check the published style for expensive constructs (should never fail the publish)
+                        try:
+                            style_issues = lintLayerStyle(layer)
+                            if style_issues:
+                                self.style_issues[name] = style_issues
+                        except Exception as err:
+                            feedback.logWarning(f"Could not check style performance of layer '{name}': {err}")
 
                         if self.only_symbology:
                             # Skip data publish if "only symbology" was checked
                             self.stepSkipped.emit(layer_id, DATA)
                         else:
                             # Publish data
-                            self.stepStarted.emit(layer_id, DATA)
+                            self.startStep(layer_id, DATA)
                             try:
                                 if md_valid or (allow_without_md in (ALLOW, ALLOWONLYDATA)):
                                     _publish(layer, publish_fields)
@@ -132,7 +208,7 @@ class PublishTask(TaskBase):
                                     errors.append(f"Could not publish layer '{name}' because of invalid metadata")
                             except:
                                 errors.append(traceback.format_exc())
-                            self.stepFinished.emit(layer_id, DATA)
+                            self.finishStep(layer_id, DATA)
 
                 else:
                     # No geodata server selected: skip layer data and symbology
@@ -140,10 +216,8 @@ class PublishTask(TaskBase):
                     self.stepSkipped.emit(layer_id, DATA)
 
                 if self.metadata_server is not None:
-                    # User selected metadata server: publish metadata
-                    self.stepStarted.emit(layer_id, METADATA)
+                    # User selected metadata server: collect metadata (records are published in batches below)
                     try:
-                        self.metadata_server.resetLogIssues()
                         if md_valid or (allow_without_md == ALLOW):
                             wms = None
                             wfs = None
@@ -154,29 +228,32 @@ class PublishTask(TaskBase):
                                 if layer.type() == layer.VectorLayer:
                                     wfs = self.geodata_server.getWfsUrl()
                             self.autofillMetadata(layer)
-                            self.metadata_server.publishLayerMetadata(layer, wms, wfs, full_name)
+                            metadata_items.append((layer, wms, wfs, full_name))
                         else:
                             errors.append(f"Could not publish metadata of layer '{name}' because it is invalid")
+                            self.finishStep(layer_id, METADATA)
                     except:
                         errors.append(traceback.format_exc())
-                    self.stepFinished.emit(layer_id, METADATA)
+                        self.finishStep(layer_id, METADATA)
                 else:
                     self.stepSkipped.emit(layer_id, METADATA)
 
                 # Collect all layer-specific errors and warnings (if any)
-                if self.geodata_server is not None:
-                    w, e = self.geodata_server.getLogIssues()
-                    warnings.extend(w)
-                    errors.extend(e)
-                if self.metadata_server is not None:
-                    w, e = self.metadata_server.getLogIssues()
-                    warnings.extend(w)
-                    errors.extend(e)
+                warnings.extend(issues.warnings)
+                errors.extend(issues.errors)
                 self.results[name] = (set(warnings), set(errors))
+                self.tracer.end(layer_span)
+
+            # Publish metadata records (if any)
+            if metadata_items:
+                self.publishMetadata(metadata_items)
+                if self.isCanceled():
+                    return False
 
             # Create layer groups (if any)
             if published_ids and self.geodata_server is not None:
-                self.stepStarted.emit(None, GROUPS)
+                self.startStep(None, GROUPS)
+                issues.clear()
                 try:
                     self.geodata_server.createGroups(published_ids)
                 except Exception as err:
@@ -188,7 +265,8 @@ class PublishTask(TaskBase):
                         self.geodata_server.closePublishing(published_ids)
                     except Exception as err:
                         feedback.logError(f"Failed to finalize publish task: {err}")
-                    self.stepFinished.emit(None, GROUPS)
+                    self.finishStep(None, GROUPS)
+                    self.addIssues(GROUPS_RESULTS, issues)
             else:
                 self.stepSkipped.emit(None, GROUPS)
 
@@ -198,6 +276,52 @@ class PublishTask(TaskBase):
             self.exception = traceback.format_exc()
             return False
 
+    def publishMetadata(self, items: list):
+        """ Publishes the collected metadata records (batched, if the server supports it)
+        and adds the errors for each record to the results of the matching layer.
+        The names of the layers of which the record did not change (and was skipped) are collected as well.
+
+        The batch is traced as a single metadata step, and the issues that were logged during the batch
+        (e.g. rejected records or thumbnail failures) are added to the report as well.
+
+        :param items:   List of (layer, wms_url, wfs_url, linked_name) tuples.
+        """
+        for layer, *_ in items:
+            self.stepStarted.emit(layer.id(), METADATA)
+        issues = logchannel.currentScope()
+        issues.clear()
+        span = self.tracer.begin(STEP_NAMES[METADATA], tracing.CAT_STEP, layers=len(items))
+        try:
+            record_errors = self.metadata_server.publishLayersMetadata(items, self.isCanceled)
+        except Exception:
+            record_errors = {layer.id(): [traceback.format_exc()] for layer, *_ in items}
+        finally:
+            self.tracer.end(span)
+        for layer, *_ in items:
+            _, errors = self.results[layer.name()]
+            layer_errors = record_errors.get(layer.id(), [])
+            if layer_errors is None:
+                self.skipped_metadata.add(layer.name())
+            else:
+                errors.update(layer_errors)
+            self.finishStep(layer.id(), METADATA)
+        self.addIssues(METADATA_RESULTS, issues)
+
+    def addIssues(self, name: str, issues: logchannel.LogIssues):
+        """ Adds the warnings and errors that were collected in the given scope to the results under the given name.
+        Layer-specific errors that were already reported for a layer are not repeated.
+        """
+        reported = set()
+        for _, errors in self.results.values():
+            reported.update(errors)
+        warnings = set(issues.warnings)
+        errors = set(issues.errors) - reported
+        if not (warnings or errors):
+            return
+        result_warnings, result_errors = self.results.setdefault(name, (set(), set()))
+        result_warnings.update(warnings)
+        result_errors.update(errors)
+
     @staticmethod
     def autofillMetadata(layer):
         metadata = layer.metadata()
@@ -218,10 +342,12 @@ class PublishTask(TaskBase):
         layer.setMetadata(metadata)
 
     def finished(self, success: bool):
+        self.saveTrace()
         if success:
             dialog = PublishReportDialog(self.results, self.only_symbology,
                                          self.geodata_server, self.metadata_server,
-                                         self.parent)
+                                         self.parent, self.tracer, self.trace_file, self.skipped_metadata,
+                                         self.style_issues)
             dialog.exec_()
 
 
@@ -239,50 +365,61 @@ class ExportTask(TaskBase, feedback.FeedbackMixin):
         :param export_metadata:     Set to True if the layer metadata should be exported (zipped MEF).
         :param export_symbology:    Set to True if the layer styles should be exported (zipped SLDs).
         """
-        TaskBase.__init__(self, layer_ids, field_map)
+        TaskBase.__init__(self, layer_ids, field_map, 'export')
         self.exception = None
         self.folder = folder
         self.export_data = export_data
         self.export_metadata = export_metadata
         self.export_symbology = export_symbology
 
+    @tracing.active
+    @feedback.scoped
     def run(self):
         """ Start the export task. """
+        self._metrics_baseline = metrics.REGISTRY.baseline()
         try:
             os.makedirs(self.folder, exist_ok=True)
             for i, id_ in enumerate(self.layer_ids):
                 if self.isCanceled():
                     return False
+                if self.export_metadata and i % thumbnails.CACHE_SIZE == 0:
+                    # Render the thumbnails of the next layers in parallel (no more than fit in the cache)
+                    thumbnails.renderThumbnails(listBridgeLayers(self.layer_ids[i:i + thumbnails.CACHE_SIZE]))
                 self.setProgress(i * 100 / len(self.layer_ids))
                 layer = layerById(id_)
                 if not layer:
                     continue
+                layer_span = self.tracer.begin(layer.name(), tracing.CAT_LAYER, id=id_)
                 if self.export_symbology:
                     style_filename = os.path.join(self.folder, layer.file_slug + "_style.zip")
-                    self.stepStarted.emit(id_, SYMBOLOGY)
+                    self.startStep(id_, SYMBOLOGY)
                     saveLayerStyleAsZippedSld(layer, style_filename)
-                    self.stepFinished.emit(id_, SYMBOLOGY)
+                    self.finishStep(id_, SYMBOLOGY)
                 else:
                     self.stepSkipped.emit(id_, SYMBOLOGY)
                 if self.export_data:
-                    self.stepStarted.emit(id_, DATA)
+                    self.startStep(id_, DATA)
                     if layer.is_vector:
                         target_path = os.path.join(self.folder, 'vectordata' + export.EXT_GEOPACKAGE)
                         export.exportVector(layer, fieldsForLayer(layer, self.field_map), target_path=target_path)
                     elif layer.is_raster:
                         target_path = os.path.join(self.folder, layer.file_slug + export.EXT_GEOTIFF)
                         export.exportRaster(layer, target_path)
-                    self.stepFinished.emit(id_, DATA)
+                    self.finishStep(id_, DATA)
                 else:
                     self.stepSkipped.emit(id_, DATA)
                 if self.export_metadata:
                     metadata_filename = os.path.join(self.folder, layer.file_slug + "_metadata.zip")
-                    self.stepStarted.emit(id_, METADATA)
+                    self.startStep(id_, METADATA)
                     saveMetadata(layer, metadata_filename)
-                    self.stepFinished.emit(id_, METADATA)
+                    self.finishStep(id_, METADATA)
                 else:
                     self.stepSkipped.emit(id_, METADATA)
+                self.tracer.end(layer_span)
         except Exception:
             self.exception = traceback.format_exc()
             return False
         return True
+
+    def finished(self, success: bool):
+        self.saveTrace(self.folder)
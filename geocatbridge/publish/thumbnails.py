@@ -0,0 +1,256 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Iterable, Dict
+
+from qgis.PyQt.QtCore import Qt, QSettings, QSize, QBuffer, QByteArray, QIODevice
+from qgis.PyQt.QtGui import QColor, QImage
+from qgis.core import (
+    QgsMapSettings,
+    QgsMapLayerStyle,
+    QgsMapRendererParallelJob,
+    QgsRectangle
+)
+
+from geocatbridge.utils import feedback, metrics, tracing
+from geocatbridge.utils.layers import BridgeLayer
+from geocatbridge.utils.meta import PLUGIN_NAMESPACE
+
+SIZE_SETTING = f"{PLUGIN_NAMESPACE}/ThumbnailSize"
+FORMAT_SETTING = f"{PLUGIN_NAMESPACE}/ThumbnailFormat"
+
+DEFAULT_SIZE = 800
+DEFAULT_FORMAT = 'png'
+
+# Supported thumbnail formats: file extension -> (Qt image format name, MIME type)
+FORMATS = OrderedDict([
+    ('png', ('PNG', 'image/png')),
+    ('jpg', ('JPEG', 'image/jpeg')),
+    ('webp', ('WEBP', 'image/webp'))
+])
+
+# Maximum number of thumbnails that are rendered at the same time
+MAX_PARALLEL_JOBS = 4
+
+# Maximum number of rendered thumbnails to keep in memory
+CACHE_SIZE = 200
+
+# Files next to the main data file that also change when the data changes: file extension -> sidecar extensions
+_SIDECAR_EXTENSIONS = {
+    '.shp': ('.dbf', '.shx'),
+    '.tab': ('.dat', '.map', '.id')
+}
+
+# Suffixes of (SQLite-based) write-ahead log and journal files, which hold writes that were not checkpointed yet
+_LOG_SUFFIXES = ('-wal', '-journal')
+
+
+class Thumbnail(namedtuple('Thumbnail', 'key data ext')):
+    """ Rendered (encoded) layer thumbnail image. The key is a hash of the layer style, extent and data. """
+    __slots__ = ()
+
+    @property
+    def filename(self) -> str:
+        return f"thumbnail.{self.ext}"
+
+    @property
+    def mimetype(self) -> str:
+        return FORMATS[self.ext][1]
+
+
+class _ThumbnailCache:
+    """ Thread-safe, size-limited (least recently used) cache of rendered thumbnails. """
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self._max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            thumbnail = self._items.get(key)
+            if thumbnail is not None:
+                self._items.move_to_end(key)
+        if thumbnail is None:
+            metrics.cacheMiss('thumbnail')
+        else:
+            metrics.cacheHit('thumbnail')
+        return thumbnail
+
+    def put(self, thumbnail: Thumbnail):
+        with self._lock:
+            self._items[thumbnail.key] = thumbnail
+            self._items.move_to_end(thumbnail.key)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_CACHE = _ThumbnailCache()
+
+
+def thumbnailSettings() -> tuple:
+    """ Returns the configured thumbnail (size, format) tuple, or the defaults if the settings are invalid. """
+    settings = QSettings()
+    try:
+        size = max(16, int(settings.value(SIZE_SETTING, DEFAULT_SIZE)))
+    except (TypeError, ValueError):
+        size = DEFAULT_SIZE
+    fmt = str(settings.value(FORMAT_SETTING, DEFAULT_FORMAT) or '').lower().lstrip('.')
+    if fmt == 'jpeg':
+        fmt = 'jpg'
+    if fmt not in FORMATS:
+        fmt = DEFAULT_FORMAT
+    return size, fmt
+
+
+def _dataFiles(path: str) -> list:
+    """ Returns the main data file and the existing sidecar and write-ahead log files for a file-based source. """
+    stem, ext = os.path.splitext(path)
+    candidates = [path]
+    for sidecar in _SIDECAR_EXTENSIONS.get(ext.lower(), ()):
+        candidates.extend((stem + sidecar, stem + sidecar.upper()))
+    candidates.extend(path + suffix for suffix in _LOG_SUFFIXES)
+    return [p for p in candidates if os.path.isfile(p)]
+
+
+def _dataFingerprint(layer: BridgeLayer) -> str:
+    """ Returns a string that changes if the layer data changes.
+    For file-based layers, the modification time and size of the data file, its sidecar files (e.g. the .dbf
+    of a Shapefile) and write-ahead log (e.g. of a GeoPackage) are used.
+    For other layers (e.g. databases), the data timestamp (if the provider supports it) and the cached extent
+    are used: these do not require a query. Layers with uncommitted edits always get a new fingerprint.
+    """
+    source = layer.source()
+    parts = [source]
+    is_modified = getattr(layer, 'isModified', None)
+    if callable(is_modified) and is_modified():
+        # The edit buffer is rendered as well, but it cannot be fingerprinted cheaply
+        parts.append(f"modified:{time.time_ns()}")
+
+    path = source.split('|')[0]
+    files = _dataFiles(path) if os.path.isfile(path) else []
+    if files:
+        for file in files:
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue
+            parts.append(f"{os.path.basename(file)}:{stat.st_mtime_ns}:{stat.st_size}")
+        return ':'.join(parts)
+
+    provider = layer.dataProvider()
+    if provider is not None:
+        timestamp = provider.dataTimestamp()
+        if timestamp.isValid():
+            parts.append(timestamp.toString(Qt.ISODateWithMs))
+        parts.append(provider.extent().toString())
+    return ':'.join(parts)
+
+
+def _refreshExtent(layer: BridgeLayer):
+    """ Makes sure that the extent of a (non file-based) layer is not taken from a stale provider cache.
+    This may require a full query (e.g. ST_Extent), so it is only done for layers that are rendered.
+    """
+    if os.path.isfile(layer.source().split('|')[0]):
+        return
+    provider = layer.dataProvider()
+    if provider is not None and hasattr(provider, 'updateExtents'):
+        provider.updateExtents()
+        if hasattr(layer, 'updateExtents'):
+            layer.updateExtents()
+
+
+def thumbnailKey(layer: BridgeLayer, size: int = None, fmt: str = None) -> str:
+    """ Returns a hash of the layer style, extent and data fingerprint and the thumbnail size and format. """
+    if size is None or fmt is None:
+        size, fmt = thumbnailSettings()
+    style = QgsMapLayerStyle()
+    style.readFromLayer(layer)
+    digest = hashlib.sha1(style.xmlData().encode())
+    digest.update(layer.extent().toString().encode())
+    digest.update(_dataFingerprint(layer).encode())
+    digest.update(f"{size}:{fmt}".encode())
+    return digest.hexdigest()
+
+
+def layerMapSettings(layer: BridgeLayer, size: int, extent: QgsRectangle = None) -> QgsMapSettings:
+    """ Returns the map settings to render a single layer on a square image of the given size.
+
+    :param layer:   The layer to render.
+    :param size:    The width and height (in pixels) of the rendered image.
+    :param extent:  The extent to render. Defaults to the full layer extent.
+    """
+    ms = QgsMapSettings()
+    ms.setBackgroundColor(QColor(255, 255, 255, 255))
+    ms.setFlag(QgsMapSettings.Antialiasing, True)
+    ms.setLayers([layer])
+    ms.setExtent(layer.extent() if extent is None else extent)
+    ms.setOutputSize(QSize(size, size))
+    return ms
+
+
+def _encode(image: QImage, fmt: str) -> tuple:
+    """ Encodes the image in the given format and returns a tuple of (bytes, format).
+    If the image could not be encoded (e.g. because the Qt image plugin for the format is missing),
+    the image is encoded as PNG instead.
+    """
+    if fmt == 'jpg':
+        # JPEG does not support transparency
+        image = image.convertToFormat(QImage.Format_RGB32)
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    saved = image.save(buffer, FORMATS[fmt][0])
+    buffer.close()
+    if saved and not data.isEmpty():
+        return bytes(data), fmt
+    if fmt == DEFAULT_FORMAT:
+        raise ValueError(f"Failed to encode thumbnail as {FORMATS[fmt][0]}")
+    feedback.logWarning(f"Failed to encode thumbnail as {FORMATS[fmt][0]}: using {FORMATS[DEFAULT_FORMAT][0]} instead")
+    return _encode(image, DEFAULT_FORMAT)
+
+
+@tracing.traced(tracing.CAT_METADATA)
+def renderThumbnails(layers: Iterable[BridgeLayer]) -> Dict[str, Thumbnail]:
+    """ Renders the thumbnails for the given layers, using the configured size and format.
+    Thumbnails of which the style, extent and data did not change are taken from the cache.
+    All other thumbnails are rendered in parallel (at most `MAX_PARALLEL_JOBS` layers at a time).
+
+    :param layers:  The layers for which to render thumbnails.
+    :returns:       A dictionary of layer ID and Thumbnail.
+    """
+    size, fmt = thumbnailSettings()
+    results = {}
+    pending = []
+    for layer in layers:
+        key = thumbnailKey(layer, size, fmt)
+        thumbnail = _CACHE.get(key)
+        if thumbnail is None:
+            pending.append((layer, key))
+        else:
+            results[layer.id()] = thumbnail
+
+    for i in range(0, len(pending), MAX_PARALLEL_JOBS):
+        jobs = []
+        for layer, key in pending[i:i + MAX_PARALLEL_JOBS]:
+            _refreshExtent(layer)
+            job = QgsMapRendererParallelJob(layerMapSettings(layer, size))
+            job.start()
+            jobs.append((layer, key, job))
+        for layer, key, job in jobs:
+            job.waitForFinished()
+            thumbnail = Thumbnail(key, *_encode(job.renderedImage(), fmt))
+            _CACHE.put(thumbnail)
+            results[layer.id()] = thumbnail
+    return results
+
+
+def layerThumbnail(layer: BridgeLayer) -> Thumbnail:
+    """ Returns the (cached) thumbnail for a single layer. """
+    return renderThumbnails([layer])[layer.id()]
@@ -1,8 +1,10 @@
 import json
+import traceback
 from abc import ABC, abstractmethod
 from importlib import import_module
 from pathlib import Path
-from typing import Union, Iterable, Dict
+from time import perf_counter
+from typing import Union, Iterable, Dict, FrozenSet, Callable
 from urllib.parse import urlparse
 
 import requests
@@ -14,12 +16,15 @@ from qgis.core import (
     QgsProcessingAlgorithm
 )
 
-from geocatbridge.utils import files
+from geocatbridge.utils import files, metrics, tracing
 from geocatbridge.utils.feedback import FeedbackMixin
 from geocatbridge.utils.layers import BridgeLayer
 from geocatbridge.utils.enum_ import LabeledIntEnum
 from geocatbridge.utils.network import BridgeSession, UPLOAD_TIMEOUT
 
+# Error message for metadata records that were not published because the publication was canceled
+CANCELED_MESSAGE = "Publication was canceled"
+
 
 class AbstractServer(ABC):
 
@@ -259,7 +264,7 @@ class CatalogServerBase(ServerBase, ABC):
                 pass
 
         auth = None
-        self.logInfo(f"{method.upper()} {url}")
+        self.logDebug(f"{method.upper()} {url}")
         if session and isinstance(session, requests.Session):
             # An existing Session was passed-in: call request method on it (handle auth in session!)
             req_method = getattr(session, method.casefold())
@@ -275,7 +280,14 @@ class CatalogServerBase(ServerBase, ABC):
                 headers.get('Content-Type', '').endswith(('zip', 'octet-stream')):
             # If it looks like we're going to transfer something (potentially) large, increase the timeout
             kwargs['timeout'] = max(kwargs.get('timeout', 0), UPLOAD_TIMEOUT)
-        result = req_method(url, headers=headers, files=files_, data=data, auth=auth, **kwargs)
+        start = perf_counter()
+        try:
+            with tracing.span(f"{method.upper()} {urlparse(url).path}", tracing.CAT_HTTP, url=url):
+                result = req_method(url, headers=headers, files=files_, data=data, auth=auth, **kwargs)
+        except Exception as err:
+            metrics.recordRequest(method, url, perf_counter() - start, error=err)
+            raise
+        metrics.recordRequest(method, url, perf_counter() - start, result)
         result.raise_for_status()
         return result
 
@@ -313,11 +325,67 @@ class MetaCatalogServerBase(CatalogServerBase, ABC):
         """ This method must be implemented if the server offers a way to check if a metadata record was published. """
         raise NotImplementedError
 
+    def existingMetadata(self, uuids: Iterable[str]) -> FrozenSet[str]:
+        """ Returns the subset of the given record IDs that exist on the server.
+        By default, this calls `metadataExists()` for each record. Servers that can look up multiple records
+        at once (e.g. using a search API) should override this method.
+        """
+        return frozenset(uuid for uuid in uuids if self.metadataExists(uuid))
+
+    def metadataChangeDates(self, uuids: Iterable[str]) -> dict:
+        """ Returns a dictionary of record ID and the date on which the record was last changed on the server,
+        for the given record IDs that exist on the server. If the server does not report change dates,
+        the date is None. By default, this looks up the records using `existingMetadata()`.
+        """
+        return {uuid: None for uuid in self.existingMetadata(uuids)}
+
+    def deleteMetadata(self, uuid: str):
+        """ This method must be implemented if the server offers a way to delete a metadata record. """
+        raise NotImplementedError
+
+    def deleteMetadataRecords(self, uuids: Iterable[str]) -> FrozenSet[str]:
+        """ Deletes the records with the given IDs and returns the IDs of the deleted records.
+        By default, this calls `deleteMetadata()` for each record. Servers that can delete multiple records
+        at once should override this method.
+        """
+        deleted = set()
+        for uuid in uuids:
+            try:
+                self.deleteMetadata(uuid)
+            except Exception as err:
+                self.logError(f"Failed to delete metadata record {uuid} on '{self.serverName}': {err}")
+            else:
+                deleted.add(uuid)
+        return frozenset(deleted)
+
     def publishLayerMetadata(self, layer: BridgeLayer,
                              wms_url: str = None, wfs_url: str = None, linked_name: str = None):
         """ This method must be implemented if the server offers a way to publish a metadata record for a layer. """
         raise NotImplementedError
 
+    def publishLayersMetadata(self, items: list, canceled: Callable[[], bool] = None) -> dict:
+        """ Publishes the metadata records for multiple layers.
+        By default, this calls `publishLayerMetadata()` for each layer. Servers that can upload multiple
+        records at once should override this method.
+
+        :param items:       List of (layer, wms_url, wfs_url, linked_name) tuples.
+        :param canceled:    Optional function that returns True if the publication was canceled (e.g. by the user).
+                            Records that were not published yet when the publication was canceled get an error.
+        :returns:           Dictionary of layer ID and a list of error messages (empty if the record was published),
+                            or None if the record did not change since the last publication and was skipped.
+        """
+        results = {}
+        for layer, wms_url, wfs_url, linked_name in items:
+            if canceled and canceled():
+                results[layer.id()] = [CANCELED_MESSAGE]
+                continue
+            try:
+                self.publishLayerMetadata(layer, wms_url, wfs_url, linked_name)
+                results[layer.id()] = []
+            except Exception:
+                results[layer.id()] = [traceback.format_exc()]
+        return results
+
 
 class DataCatalogServerBase(CatalogServerBase, ABC):
 
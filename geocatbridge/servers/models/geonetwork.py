@@ -1,5 +1,15 @@
+import contextvars
+import re
+import threading
+import traceback
 import webbrowser
-from os import path
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from os import path, PathLike
+from queue import Queue, Full
+from time import monotonic
+from typing import Callable
 from urllib.parse import urlparse
 from xml.etree import ElementTree as ETree
 
@@ -14,8 +24,11 @@ from qgis.core import (
 )
 
 from geocatbridge.process.algorithm import BridgeAlgorithm
-from geocatbridge.publish.metadata import saveMetadata
-from geocatbridge.servers.bases import MetaCatalogServerBase
+from geocatbridge.publish.metadata import (
+    MefArchive, RecordFingerprints, buildRecord, metadataSnapshot, metadataFingerprint, uuidForLayer
+)
+from geocatbridge.publish.thumbnails import MAX_PARALLEL_JOBS, renderThumbnails
+from geocatbridge.servers.bases import MetaCatalogServerBase, CANCELED_MESSAGE
 from geocatbridge.servers.models.gn_profile import GeoNetworkProfiles
 from geocatbridge.servers.views.geonetwork import GeoNetworkWidget
 from geocatbridge.utils.network import BridgeSession
@@ -24,6 +37,9 @@ from geocatbridge.utils import feedback
 from geocatbridge.utils.network import TESTCON_TIMEOUT
 
 
+_ISO_DATE_REGEX = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.\d+)?(Z|[+-]\d{2}:?\d{2})?$')
+
+
 def parseMe(response: requests.Response) -> bool:
     """ Parses the response from a 'me' request to a GeoNetwork API.
     Returns True if the response was authenticated. """
@@ -50,6 +66,19 @@ class GeonetworkServer(MetaCatalogServerBase):
     profile: GeoNetworkProfiles = GeoNetworkProfiles.DEFAULT
     node: str = "srv"
 
+    # Maximum number of records and (compressed) size of a multi-record MEF upload
+    MEF_BATCH_RECORDS = 50
+    MEF_BATCH_BYTES = 25 * 1024 ** 2
+    # Maximum number of record IDs per bulk search or delete request
+    BULK_RECORDS = 100
+    # Number of threads that build (transform) and upload metadata records, and the maximum number of
+    # records that are waiting to be packaged
+    BUILD_WORKERS = 4
+    UPLOAD_WORKERS = 2
+    PIPELINE_QUEUE_SIZE = MEF_BATCH_RECORDS
+    # Number of seconds to wait for a free spot in the pipeline queue before checking if the packager stopped
+    PIPELINE_PUT_TIMEOUT = 0.5
+
     def __init__(self, name, authid="", url="", **options):
         """
         Creates a new GeoNetwork model instance.
@@ -63,6 +92,10 @@ class GeonetworkServer(MetaCatalogServerBase):
 
         super().__init__(name, authid, url, **options)
         self._session = GeonetworkSession(self.meUrl)
+        # Fingerprints and change dates of the records that were published to this catalog
+        self._fingerprints = RecordFingerprints(self.apiUrl)
+        # Set to False if the search API (GeoNetwork 4+) turns out to be unavailable
+        self._search_api = True
 
     @classmethod
     def getWidgetClass(cls) -> type:
@@ -74,9 +107,247 @@ class GeonetworkServer(MetaCatalogServerBase):
 
     def publishLayerMetadata(self, layer: BridgeLayer,
                              wms_url: str = None, wfs_url: str = None, linked_name: str = None):
-        mef_filename = saveMetadata(layer, None, self.apiUrl, wms_url, wfs_url, linked_name)
-        result = self.publishMetadata(mef_filename)
-        self.processApiResult(result)
+        errors = self.publishLayersMetadata([(layer, wms_url, wfs_url, linked_name)])[layer.id()]
+        if errors:
+            raise GeonetworkApiError('\r\n'.join(errors))
+
+    def _unchangedRecords(self, fingerprints: dict) -> set:
+        """ Returns the IDs of the records that do not have to be published again, because their fingerprint
+        did not change since the last publication and the record was not changed (or removed) on GeoNetwork.
+        A record counts as changed if GeoNetwork reports a change date after the stored upload date
+        (i.e. the HTTP date of the upload response, so edits within the same second are not noticed).
+        If either date is unknown, the record is published again.
+
+        :param fingerprints:    Dictionary of record ID and the current record fingerprint.
+        """
+        known = {}
+        for uuid, fingerprint in fingerprints.items():
+            stored_fingerprint, stored_date = self._fingerprints.get(uuid)
+            if stored_fingerprint == fingerprint:
+                known[uuid] = stored_date
+        if not known:
+            return set()
+
+        unchanged = set()
+        change_dates = self.metadataChangeDates(known)
+        for uuid, stored_date in known.items():
+            if uuid not in change_dates:
+                self.logInfo(f"Metadata record {uuid} no longer exists on {self.getLabel()}")
+                continue
+            change_date = _parseDate(change_dates[uuid])
+            stored_date = _parseDate(stored_date)
+            if not (change_date and stored_date):
+                self.logInfo(f"Change date of metadata record {uuid} on {self.getLabel()} is unknown")
+                continue
+            if change_date > stored_date:
+                self.logInfo(f"Metadata record {uuid} was changed on {self.getLabel()} since the last publication")
+                continue
+            unchanged.add(uuid)
+        return unchanged
+
+    def publishLayersMetadata(self, items: list, canceled: Callable[[], bool] = None) -> dict:
+        """ Publishes the metadata records for multiple layers in multi-record MEF batches, which are limited
+        by `MEF_BATCH_RECORDS` and `MEF_BATCH_BYTES`. The results of each record are read from the responses.
+
+        Records of which the fingerprint (see `metadataFingerprint()`) matches the one of the last publication
+        and that were not changed on GeoNetwork in the meantime, are skipped: these are not rebuilt nor uploaded.
+        Note that GeoNetwork removes all attachments when a record is overwritten, so the thumbnail can only
+        be left out if the complete record is skipped.
+
+        Layers that share a metadata record ID with a layer that comes earlier in the list are not published.
+
+        :param items:       List of (layer, wms_url, wfs_url, linked_name) tuples.
+        :param canceled:    Optional function that returns True if the publication was canceled (e.g. by the user).
+        :returns:           Dictionary of layer ID and a list of error messages (empty if the record was published),
+                            or None if the record did not change and was skipped.
+        """
+        results = {}
+        fingerprints = {}
+        candidates = []
+        layer_names = {}
+        for layer, wms_url, wfs_url, linked_name in items:
+            try:
+                uuid = uuidForLayer(layer)
+                if uuid in layer_names:
+                    results[layer.id()] = [f"Layer '{layer.name()}' has the same metadata identifier ({uuid}) "
+                                           f"as layer '{layer_names[uuid]}': metadata not published"]
+                    continue
+                layer_names[uuid] = layer.name()
+                fingerprints[uuid] = metadataFingerprint(layer, self.apiUrl, wms_url, wfs_url, linked_name)
+            except Exception:
+                results[layer.id()] = [traceback.format_exc()]
+                continue
+            candidates.append((uuid, layer, wms_url, wfs_url, linked_name))
+
+        unchanged = self._unchangedRecords(fingerprints)
+        changed = []
+        for uuid, layer, *links in candidates:
+            if uuid in unchanged:
+                self.logInfo(f"Metadata and thumbnail of layer '{layer.name()}' did not change: skipped upload")
+                results[layer.id()] = None
+            else:
+                changed.append((uuid, layer, *links))
+
+        record_results, published = self._publishRecords(changed, canceled)
+        results.update(record_results)
+
+        # Store the fingerprints and upload dates of the published records: GeoNetwork updates its search index
+        # asynchronously, so the change dates are not looked up now, but on the next publication
+        for uuid, upload_date in published.items():
+            self._fingerprints.set(uuid, fingerprints[uuid], upload_date)
+        self._fingerprints.save()
+        return results
+
+    def _publishRecords(self, records: list, canceled: Callable[[], bool] = None) -> tuple:
+        """ Builds and uploads metadata records in a pipeline of concurrent stages, connected by bounded queues:
+
+        1. The calling thread renders the thumbnails (in parallel batches) and takes snapshots of the layer metadata.
+        2. A pool of `BUILD_WORKERS` threads transforms the snapshots into ISO19139 records (XSLT).
+        3. A packaging thread adds the records to MEF batches, which are uploaded by `UPLOAD_WORKERS` threads.
+
+        All stages run at the same time, so the total duration is close to the duration of the slowest stage.
+        If the publication is canceled, no more records are built, but the records that were built are uploaded.
+        If the packaging thread fails, the pipeline is closed and the exception is raised to the caller.
+
+        :param records:     List of (uuid, layer, wms_url, wfs_url, linked_name) tuples (with unique record IDs).
+        :param canceled:    Optional function that returns True if the publication was canceled.
+        :returns:           A tuple of (dictionary of layer ID and error messages, dictionary of published record ID
+                            and upload date). The upload date is taken from the server response (if available).
+        """
+        results = {}
+        if not records:
+            return results, {}
+        built = Queue(self.PIPELINE_QUEUE_SIZE)
+        closed = threading.Event()
+        upload_slots = threading.BoundedSemaphore(self.UPLOAD_WORKERS)
+        build_pool = ThreadPoolExecutor(self.BUILD_WORKERS)
+        upload_pool = ThreadPoolExecutor(self.UPLOAD_WORKERS)
+        package_pool = ThreadPoolExecutor(1)
+        upload_dates = {}
+
+        def _submit(pool, func, *args):
+            # Run in a copy of the current context, so that the active tracer and log scope also apply to workers
+            return pool.submit(contextvars.copy_context().run, func, *args)
+
+        def _upload(batch: MefArchive) -> dict:
+            try:
+                response = self.publishMetadata(batch.close(), f"{len(batch)}_records.mef")
+                upload_date = _serverDate(response)
+                for uuid in batch.uuids:
+                    upload_dates[uuid] = upload_date
+                return self._recordErrors(response, batch.uuids)
+            except Exception:
+                return {u: [traceback.format_exc()] for u in batch.uuids}
+            finally:
+                upload_slots.release()
+
+        def _startUpload(batch: MefArchive):
+            # Blocks if all upload workers are busy, which stops the packaging (and eventually the other stages)
+            upload_slots.acquire()
+            return _submit(upload_pool, _upload, batch)
+
+        def _package() -> dict:
+            record_errors = {}
+            uploads = []
+            batch = MefArchive()
+            try:
+                while True:
+                    job = built.get()
+                    if job is None:
+                        break
+                    uuid_, future = job
+                    try:
+                        batch.add(future.result())
+                    except Exception:
+                        record_errors[uuid_] = [traceback.format_exc()]
+                        continue
+                    if len(batch) >= self.MEF_BATCH_RECORDS or batch.size >= self.MEF_BATCH_BYTES:
+                        uploads.append(_startUpload(batch))
+                        batch = MefArchive()
+                if len(batch):
+                    uploads.append(_startUpload(batch))
+            finally:
+                # Close the pipeline, so that the calling thread no longer waits for a free spot in the queue
+                closed.set()
+            for upload in uploads:
+                record_errors.update(upload.result())
+            return record_errors
+
+        def _put(job) -> bool:
+            # Returns False if the job could not be queued, because the packaging thread stopped
+            while not closed.is_set():
+                try:
+                    built.put(job, timeout=self.PIPELINE_PUT_TIMEOUT)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        layer_ids = {}
+        try:
+            packager = _submit(package_pool, _package)
+            try:
+                for i in range(0, len(records), MAX_PARALLEL_JOBS):
+                    if closed.is_set():
+                        break
+                    chunk = records[i:i + MAX_PARALLEL_JOBS]
+                    if canceled and canceled():
+                        for _, layer, *_ in records[i:]:
+                            results[layer.id()] = [CANCELED_MESSAGE]
+                        break
+                    try:
+                        renderThumbnails(layer for _, layer, *_ in chunk)
+                    except Exception as err:
+                        # Thumbnails that failed to render are reported per layer when the snapshot is taken
+                        self.logWarning(f"Failed to render thumbnails: {err}")
+                    for uuid, layer, wms_url, wfs_url, linked_name in chunk:
+                        try:
+                            snapshot = metadataSnapshot(layer, self.apiUrl, wms_url, wfs_url, linked_name)
+                        except Exception:
+                            results[layer.id()] = [traceback.format_exc()]
+                            continue
+                        layer_ids[uuid] = layer.id()
+                        if not _put((uuid, _submit(build_pool, buildRecord, snapshot))):
+                            break
+            finally:
+                _put(None)
+            # Raises the exception of the packaging thread (if any)
+            record_errors = packager.result()
+        finally:
+            for pool in (build_pool, upload_pool, package_pool):
+                pool.shutdown()
+
+        published = {}
+        for uuid, errors in record_errors.items():
+            results[layer_ids[uuid]] = errors
+            if not errors:
+                published[uuid] = upload_dates.get(uuid)
+        return results, published
+
+    def _recordErrors(self, result: requests.Response, uuids: list) -> dict:
+        """ Reads the import result of each record in a (multi-record) MEF upload from the API response.
+        Returns a dictionary of record UUID and a list of error messages (empty if the record was imported).
+        """
+        try:
+            body = result.json() or {}
+        except ValueError:
+            body = {}
+        imported = set(body.get('uuids') or [])
+        for infos in (body.get('metadataInfos') or {}).values():
+            imported.update(i.get('uuid') for i in infos if i.get('uuid'))
+        messages = [e.get('message') for e in body.get('errors', []) if e.get('message')]
+        for msg in messages:
+            self.logError(msg)
+
+        record_errors = {}
+        for uuid in uuids:
+            if uuid in imported or not (imported or messages):
+                # Older GeoNetwork versions may not report UUIDs: assume success if there are no errors
+                record_errors[uuid] = []
+                continue
+            record_errors[uuid] = [m for m in messages if uuid in m] or messages or \
+                [f"Record {uuid} was not imported by {self.getLabel()}"]
+        return record_errors
 
     def testConnection(self, errors: set):
         msg = f'Could not connect to {self.serverName}'
@@ -125,31 +396,123 @@ class GeonetworkServer(MetaCatalogServerBase):
         except requests.RequestException:
             return False
 
+    def existingMetadata(self, uuids) -> frozenset:
+        """ Returns the subset of the given record IDs that exist on GeoNetwork (see `metadataChangeDates()`). """
+        return frozenset(self.metadataChangeDates(uuids))
+
+    def metadataChangeDates(self, uuids) -> dict:
+        """ Returns a dictionary of record ID and change date for the given record IDs that exist on GeoNetwork.
+        The records are looked up using the search API (1 request per `BULK_RECORDS` records).
+        If the search API is not supported (GeoNetwork 3), each record is requested separately
+        and the change dates are unknown (None). This also applies if the search request fails for another reason,
+        but then the search API is tried again on the next call.
+        """
+        uuids = list(dict.fromkeys(uuids))
+        if not (uuids and self._search_api):
+            return self._recordsOneByOne(uuids)
+        url = f"{self.apiUrl}/search/records/_search"
+        headers = {'Accept': 'application/json'}
+        change_dates = {}
+        for i in range(0, len(uuids), self.BULK_RECORDS):
+            chunk = uuids[i:i + self.BULK_RECORDS]
+            query = {
+                'query': {'terms': {'uuid': chunk}},
+                '_source': ['uuid', 'changeDate', 'dateStamp'],
+                'size': len(chunk)
+            }
+            try:
+                hits = (self.sessionRequest(url, "post", data=query, headers=headers).json().get('hits') or {})
+            except (requests.RequestException, ValueError) as err:
+                response = getattr(err, 'response', None)
+                if response is not None and response.status_code in (404, 405):
+                    self.logWarning(f"{self.getLabel()} does not support the search API: checking records one by one")
+                    self._search_api = False
+                else:
+                    self.logWarning(f"{self.getLabel()} search request failed: checking records one by one ({err})")
+                return self._recordsOneByOne(uuids)
+            for hit in hits.get('hits') or []:
+                source = hit.get('_source') or {}
+                uuid = source.get('uuid') or hit.get('_id')
+                if uuid in chunk:
+                    change_dates[uuid] = source.get('changeDate') or source.get('dateStamp')
+        return change_dates
+
+    def _recordsOneByOne(self, uuids: list) -> dict:
+        """ Returns a dictionary of record ID and an unknown (None) change date for the given record IDs
+        that exist on GeoNetwork, by requesting each record separately.
+        """
+        return {uuid: None for uuid in uuids if self.metadataExists(uuid)}
+
     def getMetadata(self, uuid):
         """ Retrieves a record by the given ID. """
         url = self.metadataUrl(uuid)
         return self.sessionRequest(url)
 
-    def publishMetadata(self, metadata):
-        """ (Over)writes new metadata. """
+    def publishMetadata(self, metadata, filename: str = None):
+        """ (Over)writes new metadata.
+
+        :param metadata:    A MEF file path or a (binary) file-like object with the MEF data.
+        :param filename:    The MEF file name to upload (if omitted, the base name of the file path is used).
+        """
         url = self.apiUrl + "/records"
         headers = {'Accept': 'application/json'}
 
-        with open(metadata, "rb") as f:
-            files = {
-                'uuidProcessing': (None, 'OVERWRITE', 'text/plain'),
-                'file': (path.basename(metadata), f, 'application/octet-stream')
-            }
-            result = self.sessionRequest(url, "post", files=files, headers=headers)
-        return result
+        if isinstance(metadata, (str, PathLike)):
+            with open(metadata, "rb") as f:
+                return self.publishMetadata(f, filename or path.basename(metadata))
+
+        files = {
+            'uuidProcessing': (None, 'OVERWRITE', 'text/plain'),
+            'file': (filename or 'metadata.mef', metadata, 'application/octet-stream')
+        }
+        return self.sessionRequest(url, "post", files=files, headers=headers)
 
     def deleteMetadata(self, uuid):
         """ Deletes a record by the given ID. """
+        result = self._deleteRecord(uuid)
+        self._fingerprints.remove([uuid])
+        self._fingerprints.save()
+        return result
+
+    def _deleteRecord(self, uuid):
+        """ Deletes a record by the given ID, without updating the stored fingerprints. """
         url = self.metadataUrl(uuid)
         result = self.sessionRequest(url, "delete")
         self.processApiResult(result)
         return result
 
+    def deleteMetadataRecords(self, uuids) -> frozenset:
+        """ Deletes the records with the given IDs (1 request per `BULK_RECORDS` records)
+        and returns the IDs of the deleted records.
+        """
+        uuids = list(dict.fromkeys(uuids))
+        url = f"{self.apiUrl}/records"
+        headers = {'Accept': 'application/json'}
+        deleted = set()
+        for i in range(0, len(uuids), self.BULK_RECORDS):
+            chunk = uuids[i:i + self.BULK_RECORDS]
+            try:
+                result = self.sessionRequest(url, "delete", params=[('uuids', u) for u in chunk], headers=headers)
+                report = result.json() if result.content else {}
+            except (requests.RequestException, ValueError) as err:
+                self.logWarning(f"Bulk delete failed on {self.getLabel()}: deleting records one by one ({err})")
+                for uuid in chunk:
+                    try:
+                        self._deleteRecord(uuid)
+                    except Exception as err:
+                        self.logError(f"Failed to delete metadata record {uuid} on '{self.serverName}': {err}")
+                    else:
+                        deleted.add(uuid)
+                continue
+            if report.get('numberOfRecordsNotEditable') or report.get('errors') or report.get('metadataErrors'):
+                # Not all records could be deleted: check which ones still exist
+                deleted.update(u for u in chunk if not self.metadataExists(u))
+            else:
+                deleted.update(chunk)
+        self._fingerprints.remove(deleted)
+        self._fingerprints.save()
+        return frozenset(deleted)
+
     def processApiResult(self, result: requests.Response):
         """ Checks if the GeoNetwork API returned any errors in the response object.
         If it did, a GeonetworkApiError is raised. Otherwise, it only logs the info messages. """
@@ -203,12 +566,28 @@ class GeonetworkServer(MetaCatalogServerBase):
         webbrowser.open_new_tab(self.metadataUrl(uuid))
 
     def sessionRequest(self, url, method='get', **kwargs):
-        """ Wrapper for GeoNetwork tokenized session requests. """
+        """ Wrapper for GeoNetwork tokenized session requests.
+        The session is only signed in if it is not authenticated (or the authentication has expired).
+        If GeoNetwork rejects the request because the session is no longer valid, the user is signed in again
+        and the request is replayed once.
+        """
         kwargs['session'] = self._session
-        if self._session.signIn(*self.getCredentials()):
-            return self.request(url, method, **kwargs)
-        else:
+        user, pwd = self.getCredentials()
+        if not self._session.signIn(user, pwd):
+            raise GeonetworkAuthError(f'{self.getLabel()} user failed to authenticate')
+        try:
+            result = self.request(url, method, **kwargs)
+            if not self._session.isAuthFailure(result):
+                return result
+        except requests.HTTPError as err:
+            if not self._session.isAuthFailure(err.response):
+                raise
+        self.logInfo(f'{self.getLabel()} session is no longer authenticated: signing in again')
+        self._session.invalidate()
+        if not self._session.signIn(user, pwd, True):
             raise GeonetworkAuthError(f'{self.getLabel()} user failed to authenticate')
+        _rewind(kwargs)
+        return self.request(url, method, **kwargs)
 
     @classmethod
     def getAlgorithmInstance(cls):
@@ -252,18 +631,56 @@ class GeonetworkAlgorithm(BridgeAlgorithm):
         return {self.OUTPUT: True}
 
 
+def _rewind(kwargs: dict):
+    """ Rewinds the file-like objects in the request keyword arguments, so the request can be sent again. """
+    files = kwargs.get('files') or {}
+    for value in (kwargs.get('data'), *(v[1] if isinstance(v, tuple) else v for v in files.values())):
+        if hasattr(value, 'seek'):
+            value.seek(0)
+
+
+def _serverDate(response: requests.Response):
+    """ Returns the (HTTP) date of the given server response as an ISO 8601 string in UTC, or None if unknown. """
+    try:
+        return parsedate_to_datetime(response.headers['Date']).astimezone(timezone.utc).isoformat()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _parseDate(value):
+    """ Parses an ISO 8601 date and time string into a UTC datetime, truncated to whole seconds.
+    Returns None if the value is empty, invalid or does not specify a time zone.
+    """
+    match = _ISO_DATE_REGEX.match(value or '')
+    if not match:
+        return None
+    date_time, zone = match.groups()
+    if not zone:
+        return None
+    zone = '+00:00' if zone == 'Z' else f"{zone[:3]}:{zone[-2:]}"
+    try:
+        return datetime.fromisoformat(date_time + zone).astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+
 class GeonetworkSession(BridgeSession):
     COOKIE_TOKEN = 'XSRF-TOKEN'
     HEADER_TOKEN = 'X-XSRF-TOKEN'
+    # Number of seconds that a successful sign in is trusted, before the "me" endpoint is queried again
+    AUTH_TTL = 300
 
     def __init__(self, token_url):
         """
         Initializes a new GeoNetwork HTTP Session with cookie storage and token handling.
+        The session can be shared by multiple threads: signing in is serialized.
 
         :param token_url:   The URL from which to obtain a XSRF token cookie ("me" endpoint).
         """
         super().__init__()
         self._signin_url, self._token_url = self.getUrls(token_url)
+        self._lock = threading.RLock()
+        self._auth_time = None
 
     @staticmethod
     def getUrls(token_url):
@@ -285,7 +702,48 @@ class GeonetworkSession(BridgeSession):
         feedback.logError(f'Failed to query {self._token_url}: server returned {result.status_code}')
         return False
 
+    @property
+    def authenticated(self) -> bool:
+        """ Returns True if the session was signed in less than `AUTH_TTL` seconds ago (without querying the server). """
+        return self._auth_time is not None and monotonic() - self._auth_time < self.AUTH_TTL
+
+    def invalidate(self):
+        """ Marks the session as unauthenticated, so the next `signIn()` call has to check or sign in again. """
+        with self._lock:
+            self._auth_time = None
+
+    def isAuthFailure(self, response: requests.Response) -> bool:
+        """ Returns True if the response indicates that the session is not (or no longer) authenticated,
+        i.e. if the server returned a 401 or 403 or redirected to the sign in page. """
+        if response is None:
+            return False
+        if response.status_code in (401, 403):
+            return True
+        for r in (*response.history, response):
+            if r.is_redirect and urlparse(r.headers.get('Location', '')).path.endswith('/signin'):
+                return True
+        return urlparse(response.url or '').path.rstrip('/') == urlparse(self._signin_url).path
+
     def signIn(self, user: str, pwd: str, refresh_token: bool = False) -> bool:
+        """
+        Signs in to GeoNetwork if the session is not authenticated (see `_signIn()`).
+        Successful sign ins are trusted for `AUTH_TTL` seconds, so that no "me" requests are needed in between.
+
+        :param user:            The basic authentication user name.
+        :param pwd:             The basic authentication password.
+        :param refresh_token:   If True (default = False), the token will be refreshed and the user signed in again.
+        :returns:               True if sign in was successful.
+        """
+        with self._lock:
+            if self.authenticated and not refresh_token:
+                return True
+            if self._signIn(user, pwd, refresh_token):
+                self._auth_time = monotonic()
+                return True
+            self._auth_time = None
+            return False
+
+    def _signIn(self, user: str, pwd: str, refresh_token: bool = False) -> bool:
         """
         Checks if the current session is authenticated. If not, a token is retrieved (if not available yet)
         and its value is set in the session X-XSRF-TOKEN header. Finally, the user will be signed in to GeoNetwork.
@@ -295,7 +753,7 @@ class GeonetworkSession(BridgeSession):
         :param refresh_token:   If True (default = False), the token will be refreshed.
         :returns:               True if sign in was successful.
         """
-        if GeonetworkSession.HEADER_TOKEN in self.headers and self.signedIn and not refresh_token:
+        if not refresh_token and GeonetworkSession.HEADER_TOKEN in self.headers and self.signedIn:
             # We are still signed in: no need to do it again
             return True
 
@@ -331,7 +789,7 @@ class GeonetworkSession(BridgeSession):
                 if not refresh_token:
                     # Retry 1 more time with a refreshed token
                     feedback.logWarning(f"{prefix}: retrying with new token")
-                    return self.signIn(user, pwd, True)
+                    return self._signIn(user, pwd, True)
                 feedback.logError(f"{prefix}: access denied to user '{user}' ({status})")
             elif status == 401:
                 feedback.logError(f"{prefix}: user '{user}' not authorized (bad credentials)")
@@ -15,7 +15,8 @@ from requests.compat import json as rjson
 from requests.exceptions import HTTPError, RequestException
 
 from geocatbridge.publish.style import (
-    saveLayerStyleAsZippedSld, layerStyleAsMapboxFolder, convertMapboxGroup
+    layerStyleAsSld, layerStyleAsMapboxFolder, convertMapboxGroup, compactSld, styleConversion, sharedIconName,
+    buildSpriteSheet, SpriteSet
 )
 from geocatbridge.process.algorithm import BridgeAlgorithm
 from geocatbridge.publish.export import exportVector, exportRaster
@@ -23,7 +24,7 @@ from geocatbridge.servers import manager
 from geocatbridge.servers.bases import DataCatalogServerBase
 from geocatbridge.servers.models.gs_storage import GeoserverStorage
 from geocatbridge.servers.views.geoserver import GeoServerWidget
-from geocatbridge.utils import strings, meta
+from geocatbridge.utils import strings, meta, feedback
 from geocatbridge.utils.files import tempFileInSubFolder, tempSubFolder, Path, getResourcePath
 from geocatbridge.utils.network import TESTCON_TIMEOUT
 from geocatbridge.utils.layers import (
@@ -53,6 +54,8 @@ class GeoserverServer(DataCatalogServerBase):
         super().__init__(name, authid, url, **options)
         self._workspace = None
         self._slug_map = {}     # maps requested layer name (slug) to the resulting server name
+        self._icons = set()     # (shared) names of the style icons that were uploaded to the workspace
+        self._sprites = SpriteSet()  # Mapbox sprites of all published layer groups in the workspace
         self._apiurl = self.fixRestApiUrl()
         self._importer = None
         self._version = None
@@ -109,6 +112,8 @@ class GeoserverServer(DataCatalogServerBase):
         return self._apiurl
 
     def prepareForPublishing(self, only_symbology: bool):
+        self._icons = set()
+        self._sprites = SpriteSet()
         if not only_symbology:
             self.clearWorkspace()
         self._ensureWorkspaceExists()
@@ -129,10 +134,8 @@ class GeoserverServer(DataCatalogServerBase):
             layer = layerById(lyr_id)
             if not layer:
                 continue
-            # Make temporary layer clone and set web slug as name (for bridgestyle export)
-            layer_clone = layer.clone()
-            layer_clone.setName(layer.web_slug)
-            warnings.update(layerStyleAsMapboxFolder(layer_clone, tmp_dir))
+            # Use the web slug as the Mapbox source layer name (the style conversion is cached for the layer)
+            warnings.update(layerStyleAsMapboxFolder(layer, tmp_dir, layer.web_slug))
 
         # Log warnings, if any
         for w in warnings:
@@ -231,15 +234,45 @@ class GeoserverServer(DataCatalogServerBase):
         return self.storage == GeoserverStorage.POSTGIS_GEOSERVER
 
     def publishStyle(self, layer: BridgeLayer):
-        style_file = tempFileInSubFolder(layer.file_slug + ".zip")
+        # Upload the style icons to the workspace styles folder (once), so that all SLDs can share them
+        icon_names = self._publishIcons(styleConversion(layer).icons)
         # Convert style to SLD: for direct PostGIS feature types, we need to ensure lowercase property names!
-        warnings = saveLayerStyleAsZippedSld(layer, style_file, self.storage == GeoserverStorage.POSTGIS_BRIDGE)
+        sld_string, _, warnings = layerStyleAsSld(layer, self.storage == GeoserverStorage.POSTGIS_BRIDGE,
+                                                  not compactSld(), icon_names=icon_names)
         for w in warnings:
             self.logWarning(w)
-        self.logInfo(f"Style for layer '{layer.name()}' exported as ZIP file to '{style_file}'")
+        style_file = tempFileInSubFolder(layer.file_slug + ".sld")
+        with open(style_file, "w", encoding="utf-8") as f:
+            f.write(sld_string)
+        self.logInfo(f"Style for layer '{layer.name()}' exported as SLD file to '{style_file}'")
         self._publishStyle(layer.web_slug, style_file)
         return style_file
 
+    def _publishIcons(self, icons: dict) -> Dict[str, str]:
+        """ Uploads the given (local) style icons to the styles folder of the workspace, unless an icon with the
+        same content was uploaded before. Icons are stored under a name that is derived from their content hash.
+
+        :param icons:   Lookup of icon file path and symbol layer (as returned by the style conversion).
+        :returns:       Lookup of icon file path and the shared file name under which the icon was uploaded.
+        """
+        icon_names = {}
+        for path in icons:
+            if not (path and os.path.isfile(path)):
+                continue
+            name = sharedIconName(path)
+            if name not in self._icons:
+                url = f"{self.apiUrl}/resource/workspaces/{self.workspace}/styles/{name}"
+                try:
+                    with open(path, "rb") as f:
+                        self.request(url, "put", f.read())
+                except RequestException as e:
+                    self.logError(f"Failed to upload style icon '{path}' to workspace '{self.workspace}': {e}")
+                    continue
+                self._icons.add(name)
+            icon_names[path] = name
+        return icon_names
+
+    @feedback.scoped
     def publishLayer(self, layer: BridgeLayer, fields: List[str] = None):
         try:
             if layer.is_vector:
@@ -732,23 +765,20 @@ class GeoserverServer(DataCatalogServerBase):
         lookup = {self._slug_map.get(lyr.web_slug, lyr.web_slug): lyr for lyr in listBridgeLayers(layer_ids)}
         for group in LayerGroups(layer_ids, self._slug_map):
             self._publishGroup(group, lookup)
+        if self._sprites:
+            self._publishSpriteSheet()
 
     def _publishGroupMapBox(self, group: LayerGroup, lookup: Dict[str, BridgeLayer]):
-        """ Publishes layer group as a MapBox VT style. """
-
-        def getImageBytes(img) -> bytes:
-            """ Reads bytes from PNG sprite sheets. """
-            ba = QByteArray()
-            buff = QBuffer(ba)
-            buff.open(QIODevice.WriteOnly)
-            img.save(buff, "png")
-            return ba.data()
-
+        """ Publishes layer group as a MapBox VT style.
+        The sprites are collected, so that a single sprite sheet can be published for the workspace.
+        Sprites of which the name is already used by a different image in another group are renamed in the style.
+        """
         # Get suitable layer lookup for bridgestyle (filter out nested group layers!)
         published_layers = {name: lyr for name, lyr in lookup.items() if name in group.layers}
 
         # Compute actual style
-        mb_style, warnings, sprite_sheet = convertMapboxGroup(group, published_layers, self.apiUrl, self.workspace)
+        mb_style, warnings, _ = convertMapboxGroup(group, published_layers, self.apiUrl, self.workspace,
+                                                   self._sprites)
         for warning in warnings:
             self.logWarning(warning)
 
@@ -772,11 +802,21 @@ class GeoserverServer(DataCatalogServerBase):
         headers = {"Content-Type": "application/vnd.geoserver.mbstyle+json"}
         self.request(url, "put", mb_style, headers=headers)
 
-        if not sprite_sheet:
-            return
+    def _publishSpriteSheet(self):
+        """ Publishes a single (deduplicated) sprite sheet with the sprites of all Mapbox groups in the workspace. """
+
+        def getImageBytes(img) -> bytes:
+            """ Reads bytes from PNG sprite sheets. """
+            ba = QByteArray()
+            buff = QBuffer(ba)
+            buff.open(QIODevice.WriteOnly)
+            img.save(buff, "png")
+            return ba.data()
 
-        # Publish sprite sheet data, if present
         try:
+            sprite_sheet = buildSpriteSheet(self._sprites)
+            if not sprite_sheet:
+                return
             img_bytes = getImageBytes(sprite_sheet["img"])
             img2x_bytes = getImageBytes(sprite_sheet["img2x"])
             url = f"{self.apiUrl}/resource/workspaces/{self.workspace}/styles/spriteSheet.png"
@@ -788,7 +828,7 @@ class GeoserverServer(DataCatalogServerBase):
             url = f"{self.apiUrl}/resource/workspaces/{self.workspace}/styles/spriteSheet@2x.json"
             self.request(url, "put", sprite_sheet["json2x"])
         except Exception as err:
-            self.logError(f"Failed to upload sprite sheet(s) for Mapbox style '{group.name}': {err}")
+            self.logError(f"Failed to upload sprite sheet(s) for workspace '{self.workspace}': {err}")
 
     def _publishGroup(self, group: LayerGroup, lookup: Dict[str, BridgeLayer]):
         """ Publishes the given layer group to GeoServer. Also sets up Mapbox VT groups if needed.
@@ -1113,7 +1153,11 @@ class GeoserverServer(DataCatalogServerBase):
         filemode = 'r'
         filename = os.path.basename(style_filepath)
         _, ext = os.path.splitext(filename.casefold())
-        if ext == ".zip":
+        if ext == ".sld":
+            filetype = 'SLD'
+            headers = {"Content-Type": "application/vnd.ogc.sld+xml"}
+            filemode = 'rb'
+        elif ext == ".zip":
             filetype = 'ZIP'
             headers = {"Content-Type": "application/zip"}
             filemode = 'rb'
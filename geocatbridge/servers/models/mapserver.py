@@ -15,7 +15,7 @@ from geocatbridge.publish.ftpupload import uploadFolder
 from geocatbridge.publish.style import convertDictToMapfile, layerStyleAsMapfileFolder
 from geocatbridge.servers.bases import DataCatalogServerBase
 from geocatbridge.servers.views.mapserver import MapServerWidget
-from geocatbridge.utils import files
+from geocatbridge.utils import files, feedback
 from geocatbridge.utils.layers import BridgeLayer, layerById
 
 
@@ -60,6 +60,7 @@ class MapserverServer(DataCatalogServerBase):
     def publishStyle(self, layer: BridgeLayer):
         pass  # TODO?
 
+    @feedback.scoped
     def publishLayer(self, layer: BridgeLayer, fields: List[str] = None, exporter=None):
         if layer.is_vector:
             shp_path = os.path.join(self.dataFolder(), f"{layer.file_slug}{export.EXT_SHAPEFILE}")
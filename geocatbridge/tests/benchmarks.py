@@ -0,0 +1,543 @@
+'''
+The functions in this file are micro-benchmarks for performance-critical
+Bridge code paths that do not require a server connection.
+
+Each benchmark creates its own (synthetic) QGIS project content, measures
+the wall time of the code under test and returns a dictionary with results,
+which is also printed to the QGIS Python console.
+
+Note that the benchmarks CLEAR the current QGIS project, so save your work first!
+
+To run a benchmark, use the following code from the QGIS Python console:
+
+>>> from geocatbridge.tests.benchmarks import benchmark_bridge_layers
+>>> benchmark_bridge_layers(5000)
+
+Publish benchmarks run against a local server stand-in (see standins.py),
+so they do not need network access. For example, to publish the BC OSM
+test project to a GeoServer stand-in with 20 ms latency per request:
+
+>>> from geocatbridge.tests.benchmarks import benchmark_geoserver_publish
+>>> benchmark_geoserver_publish(use_bc_osm=True, latency=0.02)
+
+Similarly, to measure metadata publishing throughput to a GeoNetwork stand-in:
+
+>>> from geocatbridge.tests.benchmarks import benchmark_geonetwork_metadata
+>>> benchmark_geonetwork_metadata(100, latency=0.02)
+
+To measure the style conversion (SLD, Mapbox GL and Mapfile) of 100 layers:
+
+>>> from geocatbridge.tests.benchmarks import benchmark_style_conversion
+>>> benchmark_style_conversion(100)
+
+To measure SLD serialization for a style with 5000 (categorized) rules:
+
+>>> from geocatbridge.tests.benchmarks import benchmark_sld_serialization
+>>> benchmark_sld_serialization(5000)
+
+To measure the effect of style rule compaction on a categorized style with 2000 classes (in 20 colors):
+
+>>> from geocatbridge.tests.benchmarks import benchmark_rule_compaction
+>>> benchmark_rule_compaction(2000, 20)
+
+To publish 50 layer styles that share 4 SVG markers (2 of which have the same file name) to a GeoServer
+stand-in, and check that each marker is uploaded once and that the SLDs reference the uploaded markers:
+
+>>> from geocatbridge.tests.benchmarks import benchmark_style_icons
+>>> benchmark_style_icons(50, 4)
+
+'''
+
+import os
+import random
+import tempfile
+import tracemalloc
+from time import perf_counter
+from xml.dom import minidom
+from xml.etree import ElementTree as ETree
+
+from qgis.PyQt.QtCore import QSize
+from qgis.PyQt.QtGui import QColor
+from qgis.core import (
+    QgsCategorizedSymbolRenderer,
+    QgsFeature,
+    QgsGeometry,
+    QgsMapRendererParallelJob,
+    QgsMapSettings,
+    QgsMarkerSymbol,
+    QgsPointXY,
+    QgsProject,
+    QgsRendererCategory,
+    QgsSingleSymbolRenderer,
+    QgsSvgMarkerSymbolLayer,
+    QgsSymbol,
+    QgsVectorLayer
+)
+
+from geocatbridge.publish import style
+from geocatbridge.publish.tasks import PublishTask
+from geocatbridge.servers.models.geonetwork import GeonetworkServer
+from geocatbridge.servers.models.geoserver import GeoserverServer
+from geocatbridge.tests.standins import GeoNetworkStandIn, GeoServerStandIn
+from geocatbridge.utils import metrics, strings, tracing
+from geocatbridge.utils.layers import BridgeLayer, LayerGroups, listBridgeLayers, layerById
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+BC_OSM_PROJECT = os.path.join(os.path.dirname(__file__), "data-bc-osm", "OSM_Vic.qgs")
+
+# Traced metadata functions (span names) that are reported separately by the metadata benchmark
+METADATA_STEPS = {
+    "_transformDom": "XSLT transform",
+    "renderThumbnails": "thumbnail rendering",
+    "_createMef": "MEF packaging"
+}
+
+
+def _timed(func, *args, **kwargs):
+    """ Calls the given function and returns a tuple of (elapsed milliseconds, result). """
+    start = perf_counter()
+    result = func(*args, **kwargs)
+    return (perf_counter() - start) * 1000, result
+
+
+def _print_results(title, results):
+    print(title)
+    for key, value in results.items():
+        print(f"  {key:<32} {value:>10.2f} ms" if isinstance(value, float) else f"  {key:<32} {value:>10}")
+
+
+def _print_requests(standin, top=10):
+    print("  Most frequent requests:")
+    for (method, endpoint), count in standin.requests.most_common(top):
+        print(f"    {count:>6}  {method:<6} {endpoint}")
+
+
+def _peak_memory(func, *args, **kwargs):
+    """ Calls the given function with tracemalloc enabled and returns a tuple of (peak MB, result). """
+    tracemalloc.start()
+    try:
+        result = func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return f"{peak / 1024 ** 2:.2f}", result
+
+
+def _span_totals(tracer, cat):
+    """ Returns a dictionary with the total duration (in milliseconds) of the traced spans per name for a category. """
+    totals = {}
+    for event in tracer.events:
+        if event['cat'] == cat:
+            totals[event['name']] = totals.get(event['name'], 0.0) + event['dur'] / 1000
+    return totals
+
+
+def _field_map(layer_ids):
+    """ Returns a field lookup for the given layers that publishes all fields (like the publish widget does). """
+    result = {}
+    for layer in listBridgeLayers(layer_ids):
+        if layer.is_vector:
+            result[layer.id()] = {name: True for name in layer.fields().names()}
+    return result
+
+
+def _load_project(num_layers, use_bc_osm):
+    """ Loads the BC OSM test project or creates a synthetic project and returns the publishable layer IDs. """
+    if use_bc_osm:
+        QgsProject().instance().read(BC_OSM_PROJECT)
+    else:
+        create_synthetic_project(num_layers)
+    return [lyr.id() for lyr in listBridgeLayers()]
+
+
+def create_synthetic_project(num_layers, group_size=50):
+    """ Clears the current QGIS project and fills it with `num_layers` layers that all point to the
+    same Shapefile, using unique non-ASCII layer names. Layers are grouped per `group_size` layers.
+    Returns the list of created layers.
+    """
+    project = QgsProject().instance()
+    project.clear()
+    source = os.path.join(DATA_DIR, "worldcountries.shp")
+    template = QgsVectorLayer(source, "template", "ogr")
+    root = project.layerTreeRoot()
+    layers = []
+    group = None
+    for i in range(num_layers):
+        if i % group_size == 0:
+            group = root.addGroup(f"Gröup {i // group_size}")
+        layer = template.clone()
+        layer.setName(f"Länder é {i}")
+        project.addMapLayer(layer, False)
+        group.addLayer(layer)
+        layers.append(layer)
+    return layers
+
+
+def benchmark_bridge_layers(num_layers=5000):
+    """ Measures the cost of wrapping layers with BridgeLayer (first versus repeated wraps),
+    and the functions that repeatedly wrap the same layers (listBridgeLayers, LayerGroups and layerById).
+    """
+    layers = create_synthetic_project(num_layers)
+    strings._slugify.cache_clear()  # noqa
+
+    results = {"layers": num_layers}
+    results["BridgeLayer (first wrap)"], _ = _timed(lambda: [BridgeLayer(lyr).web_slug for lyr in layers])
+    results["BridgeLayer (repeated wrap)"], _ = _timed(lambda: [BridgeLayer(lyr).web_slug for lyr in layers])
+    results["listBridgeLayers"], _ = _timed(listBridgeLayers)
+    results["LayerGroups"], _ = _timed(LayerGroups)
+    ids = [lyr.id() for lyr in layers]
+    results["layerById (all layers)"], _ = _timed(lambda: [layerById(id_) for id_ in ids])
+
+    # Renaming a layer must invalidate the cached slug
+    layers[0].setName("Renamed layer")
+    results["slug invalidated on rename"] = BridgeLayer(layers[0]).web_slug == "renamed_layer"
+
+    _print_results(f"BridgeLayer benchmark ({num_layers} layers)", results)
+    return results
+
+
+def benchmark_geoserver_publish(num_layers=100, latency=0.0, bandwidth=None,
+                                use_bc_osm=False, measure_memory=True):
+    """ Publishes layers (data and style) to a local GeoServer REST stand-in using the PublishTask,
+    and reports the number of requests per layer, wall time and the time spent per publish step.
+
+    :param num_layers:      Number of layers in the synthetic project (ignored if `use_bc_osm` is True).
+    :param latency:         Simulated latency per request (in seconds).
+    :param bandwidth:       Simulated bandwidth (in bytes per second) or None for unlimited.
+    :param use_bc_osm:      If True, the tests/data-bc-osm project is published instead of a synthetic project.
+    :param measure_memory:  If True, the publish task runs a second time with tracemalloc enabled
+                            to determine the peak (Python) memory usage.
+    """
+    layer_ids = _load_project(num_layers, use_bc_osm)
+    field_map = _field_map(layer_ids)
+
+    results = {"layers": len(layer_ids)}
+    with GeoServerStandIn(latency, bandwidth) as standin:
+        server = GeoserverServer("standin", url=standin.url)
+        server.setBasicAuthCredentials("admin", "geoserver")
+        server.forceWorkspace("bench")
+
+        task = PublishTask(layer_ids, field_map, False, server, None, None)
+        results["publish (wall time)"], success = _timed(task.run)
+        if not success:
+            print(task.exception)
+        results["requests"] = standin.requestCount()
+        results["requests per layer"] = f"{standin.requestCount() / max(len(layer_ids), 1):.1f}"
+        results["uploaded MB"] = f"{standin.uploaded_bytes / 1024 ** 2:.2f}"
+        for step, (_, duration) in task.tracer.summary().items():
+            results[f"step: {step}"] = duration * 1000
+        _print_results(f"GeoServer publish benchmark ({len(layer_ids)} layers, "
+                       f"latency {latency}s, bandwidth {bandwidth or 'unlimited'})", results)
+        _print_requests(standin)
+
+        if measure_memory:
+            tracemalloc.start()
+            PublishTask(layer_ids, field_map, False, server, None, None).run()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results["peak memory (MB)"] = f"{peak / 1024 ** 2:.2f}"
+            print(f"  {'peak memory (MB)':<32} {results['peak memory (MB)']:>10}")
+
+    return results
+
+
+def benchmark_geonetwork_metadata(num_layers=100, latency=0.0, bandwidth=None, use_bc_osm=False, batched=False):
+    """ Publishes the metadata of all layers to a local GeoNetwork stand-in using `publishLayerMetadata`
+    (or `publishLayersMetadata` for multi-record MEF uploads if `batched` is True),
+    and reports the throughput (records per second) and the time spent on the XSLT transformation,
+    thumbnail rendering, MEF packaging and (API) HTTP requests separately.
+    Finally, the records are published again to measure an incremental publication (nothing changed).
+
+    :param num_layers:      Number of layers in the synthetic project (ignored if `use_bc_osm` is True).
+    :param latency:         Simulated latency per request (in seconds).
+    :param bandwidth:       Simulated bandwidth (in bytes per second) or None for unlimited.
+    :param use_bc_osm:      If True, the tests/data-bc-osm project is used instead of a synthetic project.
+    :param batched:         If True, the records are uploaded in multi-record MEF batches.
+    """
+    layers = listBridgeLayers(_load_project(num_layers, use_bc_osm))
+
+    results = {"records": len(layers)}
+    with GeoNetworkStandIn(latency, bandwidth) as standin:
+        server = GeonetworkServer("standin", url=standin.url)
+        server.setBasicAuthCredentials(standin.username, standin.password)
+
+        tracer = tracing.Tracer("benchmark_metadata")
+        with tracer.activate():
+            if batched:
+                elapsed, _ = _timed(server.publishLayersMetadata, [(lyr, None, None, None) for lyr in layers])
+            else:
+                elapsed, _ = _timed(lambda: [server.publishLayerMetadata(lyr) for lyr in layers])
+        results["publish (wall time)"] = elapsed
+        results["records per second"] = f"{len(layers) / (elapsed / 1000):.1f}" if elapsed else "n/a"
+        results["published records"] = len(standin.records)
+        results["requests"] = standin.requestCount()
+        results["uploaded MB"] = f"{standin.uploaded_bytes / 1024 ** 2:.2f}"
+        metadata_times = _span_totals(tracer, tracing.CAT_METADATA)
+        for name, label in METADATA_STEPS.items():
+            results[label] = metadata_times.get(name, 0.0)
+        results["HTTP requests"] = sum(_span_totals(tracer, tracing.CAT_HTTP).values())
+
+        # Publish again: all records are unchanged, so these should be skipped
+        request_count = standin.requestCount()
+        results["republish (wall time)"], republished = _timed(
+            server.publishLayersMetadata, [(lyr, None, None, None) for lyr in layers]
+        )
+        results["republish skipped records"] = sum(1 for errors in republished.values() if errors is None)
+        results["republish requests"] = standin.requestCount() - request_count
+        _print_results(f"GeoNetwork metadata benchmark ({len(layers)} records, {'batched, ' if batched else ''}"
+                       f"latency {latency}s, bandwidth {bandwidth or 'unlimited'})", results)
+        _print_requests(standin)
+
+    return results
+
+
+def benchmark_style_conversion(num_layers=100, use_bc_osm=False):
+    """ Converts the style of all layers to SLD, Mapbox GL and Mapfile (like a publish with vector tiles and
+    the StyleViewer would do), and reports the wall time of a first (cold) and second (cached) pass,
+    as well as the number of GeoStyler conversions.
+
+    :param num_layers:  Number of layers in the synthetic project (ignored if `use_bc_osm` is True).
+    :param use_bc_osm:  If True, the tests/data-bc-osm project is used instead of a synthetic project.
+    """
+    layers = listBridgeLayers(_load_project(num_layers, use_bc_osm))
+    style.clearStyleCache()
+
+    def convert_all():
+        for lyr in layers:
+            style.layerStyleAsSld(lyr)
+            style.layerStyleAsMapbox(lyr)
+            style.layerStyleAsMapfile(lyr)
+
+    def conversions():
+        return metrics.REGISTRY.cacheStats().get('geostyler', (0, 0))[1]
+
+    results = {"layers": len(layers)}
+    start = conversions()
+    results["first pass (wall time)"], _ = _timed(convert_all)
+    results["first pass conversions"] = conversions() - start
+    start = conversions()
+    results["second pass (wall time)"], _ = _timed(convert_all)
+    results["second pass conversions"] = conversions() - start
+    _print_results(f"Style conversion benchmark ({len(layers)} layers)", results)
+    return results
+
+
+def _categorized_sld_tree(num_rules):
+    """ Returns an SLD ElementTree for a synthetic categorized style with the given number of rules. """
+    root = ETree.Element("StyledLayerDescriptor", attrib={
+        "version": "1.0.0",
+        "xmlns": "http://www.opengis.net/sld",
+        "xmlns:ogc": "http://www.opengis.net/ogc"
+    })
+    named_layer = ETree.SubElement(root, "NamedLayer")
+    ETree.SubElement(named_layer, "Name").text = "categorized"
+    feature_type_style = ETree.SubElement(ETree.SubElement(named_layer, "UserStyle"), "FeatureTypeStyle")
+    for i in range(num_rules):
+        feature_type_style.append(style.sld.fromgeostyler.processRule({
+            "name": f"Catégorie {i}",
+            "filter": ["PropertyIsEqualTo", ["PropertyName", "category"], f"value & {i}"],
+            "symbolizers": [{
+                "kind": "Fill", "color": f"#{i % 0xffffff:06x}", "opacity": 1.0,
+                "outlineColor": "#232323", "outlineWidth": 0.26, "outlineOpacity": 1.0
+            }]
+        }))
+    root.insert(0, ETree.Comment("Generated by the SLD serialization benchmark"))
+    return root
+
+
+def benchmark_sld_serialization(num_rules=5000):
+    """ Serializes an SLD with a large number of rules using the previous approach (ElementTree to string,
+    minidom re-parse and pretty-print) and using the single-pass writer (indented and compact),
+    and reports the wall time and peak (Python) memory usage of each, and whether the outputs are identical.
+
+    :param num_rules:   Number of rules in the synthetic categorized style.
+    """
+    root = _categorized_sld_tree(num_rules)
+
+    def minidom_pretty():
+        xml = ETree.tostring(root, encoding="utf-8", method="xml").decode()
+        return minidom.parseString(xml).toprettyxml(indent="  ", encoding="utf-8").decode()
+
+    results = {"rules": num_rules}
+    results["minidom (wall time)"], expected = _timed(minidom_pretty)
+    results["single pass (wall time)"], pretty = _timed(style.serializeSld, root)
+    results["compact (wall time)"], compact = _timed(style.serializeSld, root, False)
+    results["minidom peak memory (MB)"], _ = _peak_memory(minidom_pretty)
+    results["single pass peak memory (MB)"], _ = _peak_memory(style.serializeSld, root)
+    results["output identical"] = pretty == expected
+    results["indented size (KB)"] = f"{len(pretty.encode()) / 1024:.1f}"
+    results["compact size (KB)"] = f"{len(compact.encode()) / 1024:.1f}"
+    _print_results(f"SLD serialization benchmark ({num_rules} rules)", results)
+    return results
+
+
+def create_categorized_layer(num_categories, num_colors, num_features=20000):
+    """ Clears the current QGIS project and adds a memory point layer with `num_features` random points
+    and a categorized renderer with `num_categories` classes that use `num_colors` different colors.
+    Returns the created layer.
+    """
+    project = QgsProject().instance()
+    project.clear()
+    layer = QgsVectorLayer("Point?crs=EPSG:4326&field=code:string", "Catégories", "memory")
+    rnd = random.Random(42)
+    features = []
+    for i in range(num_features):
+        feature = QgsFeature(layer.fields())
+        feature.setAttribute("code", f"c{i % num_categories}")
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(rnd.uniform(-180, 180), rnd.uniform(-90, 90))))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    layer.updateExtents()
+
+    categories = []
+    for i in range(num_categories):
+        symbol = QgsSymbol.defaultSymbol(layer.geometryType())
+        symbol.setColor(QColor.fromHsv(int(i % num_colors * 359 / num_colors), 200, 200))
+        categories.append(QgsRendererCategory(f"c{i}", symbol, f"Class {i}"))
+    layer.setRenderer(QgsCategorizedSymbolRenderer("code", categories))
+    project.addMapLayer(layer)
+    return layer
+
+
+def _render_sld(layer, sld_string, size=1024):
+    """ Applies the SLD to a clone of the layer and returns the time (in milliseconds) needed to render it. """
+    clone = layer.clone()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "style.sld")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(sld_string)
+        clone.loadSldStyle(path)
+    settings = QgsMapSettings()
+    settings.setLayers([clone])
+    settings.setExtent(clone.extent())
+    settings.setOutputSize(QSize(size, size))
+
+    def render():
+        job = QgsMapRendererParallelJob(settings)
+        job.start()
+        job.waitForFinished()
+
+    elapsed, _ = _timed(render)
+    return elapsed
+
+
+def benchmark_rule_compaction(num_categories=2000, num_colors=20, num_features=20000):
+    """ Converts a large categorized style to SLD and Mapfile with and without rule compaction, and reports
+    the number of rules (classes), the SLD size and the conversion time.
+    The render time is measured by loading the SLDs into QGIS and rendering them: QGIS evaluates SLD rules
+    per feature like GeoServer does. Note that QGIS does not support Recode functions, so the compacted SLD
+    is rendered with merged rules only (i.e. without recoding).
+
+    :param num_categories:  Number of classes of the categorized renderer.
+    :param num_colors:      Number of distinct colors (symbols) used by the classes.
+    :param num_features:    Number of (point) features to render.
+    """
+    layer = create_categorized_layer(num_categories, num_colors, num_features)
+    style.convertStyle(layer)  # GeoStyler conversion is cached: only measure SLD and Mapfile generation
+
+    results = {"categories": num_categories, "colors": num_colors, "features": num_features}
+    results["SLD (wall time)"], (sld_full, _, _) = _timed(style.layerStyleAsSld, layer, compact=False)
+    results["compacted SLD (wall time)"], (sld_compact, _, _) = _timed(style.layerStyleAsSld, layer,
+                                                                       compact=True, recode=True)
+    sld_merged, _, _ = style.layerStyleAsSld(layer, compact=True, recode=False)
+    for label, sld_string in (("SLD", sld_full), ("merged SLD", sld_merged), ("compacted SLD", sld_compact)):
+        results[f"{label} rules"] = sld_string.count("<Rule>")
+        results[f"{label} size (KB)"] = f"{len(sld_string.encode()) / 1024:.1f}"
+
+    conversion = style.styleConversion(layer)
+    results["Mapfile classes"] = conversion.mapfile(compact=False)[0].count("CLASS\n")
+    results["compacted Mapfile classes"] = conversion.mapfile(compact=True)[0].count("CLASS\n")
+
+    results["render SLD (wall time)"] = _render_sld(layer, sld_full)
+    results["render merged SLD (wall time)"] = _render_sld(layer, sld_merged)
+    _print_results(f"Rule compaction benchmark ({num_categories} categories, {num_colors} colors)", results)
+    return results
+
+
+# SVG marker template for the style icon benchmark
+_SVG_MARKER = '<svg xmlns="http://www.w3.org/2000/svg" width="16" height="16">' \
+              '<circle cx="8" cy="8" r="{r}" fill="{color}"/></svg>'
+
+
+def create_svg_marker_project(num_layers, num_icons):
+    """ Clears the current QGIS project and adds `num_layers` memory point layers with an SVG marker symbol.
+    The layers share `num_icons` different SVG files, which are written to a temporary folder.
+    The files are named 'marker.svg' in alternating subfolders, so that different icons have the same file name.
+    Returns a tuple of (created layers, SVG file paths).
+    """
+    project = QgsProject().instance()
+    project.clear()
+    folder = tempfile.mkdtemp()
+    icons = []
+    for i in range(num_icons):
+        subfolder = os.path.join(folder, f"set{i // 2}" if i % 2 else f"set{i // 2}_alt")
+        os.makedirs(subfolder, exist_ok=True)
+        path = os.path.join(subfolder, "marker.svg")
+        with open(path, "w") as f:
+            f.write(_SVG_MARKER.format(r=4 + i % 4, color=QColor.fromHsv(i * 359 // num_icons, 200, 200).name()))
+        icons.append(path)
+
+    layers = []
+    for i in range(num_layers):
+        layer = QgsVectorLayer("Point?crs=EPSG:4326", f"Markers {i}", "memory")
+        symbol = QgsMarkerSymbol()
+        symbol.changeSymbolLayer(0, QgsSvgMarkerSymbolLayer(icons[i % num_icons], 6))
+        layer.setRenderer(QgsSingleSymbolRenderer(symbol))
+        project.addMapLayer(layer)
+        layers.append(layer)
+    return layers, icons
+
+
+def benchmark_style_icons(num_layers=50, num_icons=4):
+    """ Publishes the styles of layers that share SVG markers to a local GeoServer REST stand-in
+    (see `create_svg_marker_project()`), and checks that:
+
+    - each distinct marker is uploaded to the workspace styles folder exactly once;
+    - all SLD icon references (hrefs) point to an uploaded marker;
+    - the combined Mapbox sprite sheet keeps a separate sprite for markers with the same file name.
+
+    :param num_layers:  Number of layers (styles) to publish.
+    :param num_icons:   Number of different SVG markers used by the layers.
+    """
+    layers, _ = create_svg_marker_project(num_layers, num_icons)
+    layer_ids = [lyr.id() for lyr in layers]
+
+    results = {"layers": num_layers, "icons": num_icons}
+    with GeoServerStandIn() as standin:
+        server = GeoserverServer("standin", url=standin.url)
+        server.setBasicAuthCredentials("admin", "geoserver")
+        server.forceWorkspace("bench")
+
+        task = PublishTask(layer_ids, _field_map(layer_ids), True, server, None, None)
+        results["publish styles (wall time)"], success = _timed(task.run)
+        if not success:
+            print(task.exception)
+
+        prefix = "workspaces/bench/styles/"
+        uploads = {path[len(prefix):]: count for path, count in standin.resource_uploads.items()
+                   if path.startswith(prefix)}
+        results["uploaded icons"] = len(uploads)
+        results["icons uploaded once"] = len(uploads) == num_icons and all(c == 1 for c in uploads.values())
+
+        # Icons are referenced by external graphics (images) or by SVG marks (as "file://" well-known names)
+        hrefs = set()
+        styles = standin.workspaces.get("bench", {}).get("styles", {})
+        for sld in styles.values():
+            root = ETree.fromstring(sld)
+            for e in root.iter("{http://www.opengis.net/sld}OnlineResource"):
+                hrefs.add(e.get("{http://www.w3.org/1999/xlink}href"))
+            for e in root.iter("{http://www.opengis.net/sld}WellKnownName"):
+                if (e.text or "").startswith("file://"):
+                    hrefs.add(e.text[7:])
+        results["published SLDs"] = len(styles)
+        results["SLD hrefs rewritten"] = bool(hrefs) and hrefs <= set(uploads)
+
+    sprites = style.SpriteSet()
+    for layer in listBridgeLayers(layer_ids):
+        sprites.add(style.styleConversion(layer).sprites)
+    sheet = style.buildSpriteSheet(sprites)
+    results["distinct sprites"] = len(sprites.unique())
+    results["sprites kept"] = sheet is not None and len(sprites.unique()) == num_icons
+
+    _print_results(f"Style icon benchmark ({num_layers} layers, {num_icons} icons)", results)
+    return results
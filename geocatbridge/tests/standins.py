@@ -0,0 +1,748 @@
+'''
+The classes in this file are local, in-process HTTP stand-ins for the
+server REST APIs that Bridge talks to. They make it possible to run
+publish flows (e.g. for benchmarks) without network access or a live server.
+
+The stand-ins only implement the endpoints (and the response structures)
+that Bridge actually uses, and keep all state in memory. They do not
+validate uploaded data, styles or metadata.
+
+Each stand-in runs a threaded HTTP server on a free local port and can
+simulate a slow server or connection:
+
+- `latency`:    fixed delay in seconds that is added to each request
+- `bandwidth`:  transfer speed in bytes per second for request and response
+                bodies (None means unlimited)
+
+All handled requests are counted per method and (generalized) endpoint.
+
+Example from the QGIS Python console:
+
+>>> from geocatbridge.tests.standins import GeoServerStandIn
+>>> from geocatbridge.servers.models.geoserver import GeoserverServer
+>>> with GeoServerStandIn(latency=0.01) as standin:
+...     server = GeoserverServer("standin", url=standin.url)
+...     server.forceWorkspace("bench")
+...     server.workspaceExists()
+>>> standin.requestCount()
+
+'''
+
+import json
+import re
+import threading
+import zipfile
+from collections import Counter
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from time import sleep
+from urllib.parse import urlparse, parse_qs, parse_qsl, unquote
+from uuid import uuid4
+
+from geocatbridge.utils import metrics
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """ Dispatches all requests to the stand-in that owns the HTTP server. """
+    protocol_version = 'HTTP/1.1'
+
+    def _dispatch(self):
+        self.server.standin.dispatch(self)  # noqa
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+    def log_message(self, format, *args):  # noqa
+        # Do not write access logs to stderr
+        pass
+
+
+class StandInServer:
+    """ Base class for an in-process HTTP server stand-in.
+    Subclasses must call `route()` to register handler methods for URL path patterns.
+    """
+
+    def __init__(self, latency: float = 0, bandwidth: int = None, prefix: str = ''):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.prefix = prefix
+        self.requests = Counter()
+        self._routes = []
+        self._lock = threading.RLock()
+        self._httpd = None
+        self._thread = None
+
+    def route(self, method: str, pattern: str, handler):
+        """ Registers a handler for the given HTTP method and URL path regex (relative to the prefix).
+        Named groups in the pattern are passed as keyword arguments to the handler, which is called as
+        `handler(request, body, query, **groups)` and must return a (status, payload, headers) tuple.
+        Dictionaries and lists are returned as JSON, strings as XML and bytes as-is.
+        """
+        self._routes.append((method.upper(), re.compile(f"^{self.prefix}{pattern}$"), handler))
+
+    @property
+    def url(self) -> str:
+        """ Returns the base URL of the stand-in (including the prefix). """
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{self.prefix}"
+
+    def start(self):
+        """ Starts the HTTP server on a free local port in a background thread. """
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.standin = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Shuts down the HTTP server. """
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def requestCount(self) -> int:
+        """ Returns the total number of handled requests. """
+        return sum(self.requests.values())
+
+    def resetCounts(self):
+        self.requests.clear()
+
+    def _throttle(self, num_bytes: int):
+        """ Simulates latency and limited bandwidth for a transfer of the given number of bytes. """
+        delay = self.latency
+        if self.bandwidth:
+            delay += num_bytes / self.bandwidth
+        if delay > 0:
+            sleep(delay)
+
+    def dispatch(self, req: BaseHTTPRequestHandler):
+        """ Reads the request body, calls the matching route handler and writes the response. """
+        parsed = urlparse(req.path)
+        path = unquote(parsed.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        length = int(req.headers.get('Content-Length') or 0)
+        body = req.rfile.read(length) if length else b''
+
+        status, payload, headers = 404, {'error': f'no route for {req.command} {path}'}, {}
+        for method, pattern, handler in self._routes:
+            if method != req.command:
+                continue
+            match = pattern.match(path)
+            if not match:
+                continue
+            with self._lock:
+                self.requests[(req.command, metrics.endpoint(path))] += 1
+                status, payload, headers = handler(req, body, query, **match.groupdict())
+            break
+        else:
+            self.requests[(req.command, metrics.endpoint(path))] += 1
+
+        if isinstance(payload, (dict, list)):
+            data, content_type = json.dumps(payload).encode(), 'application/json'
+        elif isinstance(payload, str):
+            data, content_type = payload.encode(), 'application/xml'
+        else:
+            data, content_type = payload or b'', 'application/octet-stream'
+        self._throttle(len(body) + len(data))
+
+        req.send_response(status)
+        for key, value in dict({'Content-Type': content_type}, **(headers or {})).items():
+            req.send_header(key, value)
+        req.send_header('Content-Length', str(len(data)))
+        req.end_headers()
+        if req.command != 'HEAD':
+            req.wfile.write(data)
+
+
+def _json(body: bytes) -> dict:
+    try:
+        return json.loads(body.decode() or '{}')
+    except ValueError:
+        return {}
+
+
+def _strip(name: str) -> str:
+    """ Removes a .json or .xml extension from a REST resource name. """
+    return re.sub(r'\.(json|xml)$', '', name)
+
+
+def _named_list(outer: str, inner: str, names) -> dict:
+    """ Returns a GeoServer-style list object (which is an empty string if there are no items). """
+    items = [{'name': n} for n in names]
+    return {outer: {inner: items} if items else ''}
+
+
+class GeoServerStandIn(StandInServer):
+    """ Stand-in for the GeoServer REST API endpoints that GeoserverServer uses:
+    about (version/manifest), workspaces, namespaces, datastores (including GeoPackage file uploads),
+    feature types, coverage stores (GeoTIFF uploads), styles, layers, layer groups, the Importer extension,
+    resources and GeoWebCache layers.
+
+    :param version:         The GeoServer version to report.
+    :param importer:        The Importer extension version to report (None if not installed).
+    """
+    NAME = r'(?P<{}>[^/]+?)'
+
+    def __init__(self, latency: float = 0, bandwidth: int = None,
+                 version: str = '2.22.0', importer: str = '2.22.0'):
+        super().__init__(latency, bandwidth, '/geoserver')
+        self.version = version
+        self.importer = importer
+        self.workspaces = {}
+        self.imports = {}
+        self.resources = {}
+        self.resource_uploads = Counter()
+        self.gwc_layers = {}
+        self.uploaded_bytes = 0
+
+        ws = self.NAME.format('ws')
+        ds = self.NAME.format('ds')
+        ft = self.NAME.format('ft')
+        cs = self.NAME.format('cs')
+        name = self.NAME.format('name')
+        ext = r'(?:\.json|\.xml)?'
+        rest = '/rest'
+        self.route('GET', rf'{rest}/about/version{ext}', self._version)
+        self.route('GET', rf'{rest}/about/manifest{ext}', self._manifest)
+        self.route('GET', rf'{rest}/workspaces{ext}', self._listWorkspaces)
+        self.route('POST', rf'{rest}/workspaces{ext}', self._createWorkspace)
+        self.route('DELETE', rf'{rest}/workspaces/{ws}{ext}', self._deleteWorkspace)
+        self.route('GET', rf'{rest}/namespaces/{ws}{ext}', self._namespace)
+        self.route('GET', rf'{rest}/workspaces/{ws}/datastores{ext}', self._listDatastores)
+        self.route('POST', rf'{rest}/workspaces/{ws}/datastores{ext}', self._createDatastore)
+        self.route('GET', rf'{rest}/workspaces/{ws}/datastores/{ds}{ext}', self._getDatastore)
+        self.route('PUT', rf'{rest}/workspaces/{ws}/datastores/{ds}{ext}', self._updateDatastore)
+        self.route('DELETE', rf'{rest}/workspaces/{ws}/datastores/{ds}{ext}', self._deleteDatastore)
+        self.route('PUT', rf'{rest}/workspaces/{ws}/datastores/{ds}/file\.gpkg', self._uploadGeoPackage)
+        self.route('GET', rf'{rest}/workspaces/{ws}/datastores/{ds}/featuretypes{ext}', self._listFeatureTypes)
+        self.route('POST', rf'{rest}/workspaces/{ws}/datastores/{ds}/featuretypes{ext}', self._createFeatureType)
+        self.route('GET', rf'{rest}/workspaces/{ws}/datastores/{ds}/featuretypes/{ft}{ext}', self._getResource)
+        self.route('PUT', rf'{rest}/workspaces/{ws}/datastores/{ds}/featuretypes/{ft}{ext}', self._updateResource)
+        self.route('PUT', rf'{rest}/workspaces/{ws}/coveragestores/{cs}/file\.geotiff', self._uploadGeoTiff)
+        self.route('GET', rf'{rest}/workspaces/{ws}/coveragestores/{cs}/coverages/{ft}{ext}', self._getResource)
+        self.route('PUT', rf'{rest}/workspaces/{ws}/coveragestores/{cs}/coverages/{ft}{ext}', self._updateResource)
+        self.route('GET', rf'{rest}/workspaces/{ws}/styles{ext}', self._listStyles)
+        self.route('POST', rf'{rest}/workspaces/{ws}/styles{ext}', self._createStyle)
+        self.route('PUT', rf'{rest}/workspaces/{ws}/styles/{name}{ext}', self._updateStyle)
+        self.route('DELETE', rf'{rest}/workspaces/{ws}/styles/{name}{ext}', self._deleteStyle)
+        self.route('GET', rf'{rest}/workspaces/{ws}/layers{ext}', self._listLayers)
+        self.route('GET', rf'{rest}/workspaces/{ws}/layers/{name}{ext}', self._getLayer)
+        self.route('PUT', rf'{rest}/workspaces/{ws}/layers/{name}{ext}', self._updateLayer)
+        self.route('DELETE', rf'{rest}/workspaces/{ws}/layers/{name}{ext}', self._deleteLayer)
+        self.route('POST', rf'{rest}/workspaces/{ws}/layergroups{ext}', self._saveLayerGroup)
+        self.route('PUT', rf'{rest}/workspaces/{ws}/layergroups{ext}', self._saveLayerGroup)
+        self.route('DELETE', rf'{rest}/workspaces/{ws}/layergroups{ext}/{name}', self._deleteLayerGroup)
+        self.route('POST', rf'{rest}/imports{ext}', self._createImport)
+        self.route('POST', rf'{rest}/imports/(?P<id>\d+)/tasks{ext}', self._createImportTask)
+        self.route('GET', rf'{rest}/imports/(?P<id>\d+)/tasks/(?P<task>\d+){ext}', self._getImportTask)
+        self.route('PUT', rf'{rest}/imports/(?P<id>\d+)/tasks/(?P<task>\d+){ext}', self._updateImportTask)
+        self.route('POST', rf'{rest}/imports/(?P<id>\d+)', self._runImport)
+        self.route('PUT', rf'{rest}/resource/(?P<path>.+)', self._putResource)
+        self.route('GET', rf'/gwc/rest/layers/{name}{ext}', self._getGwcLayer)
+        self.route('PUT', rf'/gwc/rest/layers/{name}{ext}', self._putGwcLayer)
+
+    @property
+    def rest_url(self) -> str:
+        return f"{self.url}/rest"
+
+    def _workspace(self, ws) -> dict:
+        return self.workspaces.get(_strip(ws))
+
+    def _addResource(self, ws: str, store: str, name: str, kind: str = 'featureType', **props):
+        """ Adds a feature type (or coverage) and a matching layer (with a global default style). """
+        workspace = self.workspaces[ws]
+        resource = dict({'name': name, 'nativeName': name, 'enabled': True}, **props)
+        if kind == 'featureType':
+            workspace['datastores'][store]['featuretypes'][name] = resource
+            href = f"{self.rest_url}/workspaces/{ws}/datastores/{store}/featuretypes/{name}.json"
+        else:
+            workspace['coveragestores'][store]['coverages'][name] = resource
+            href = f"{self.rest_url}/workspaces/{ws}/coveragestores/{store}/coverages/{name}.json"
+        workspace['layers'][name] = {
+            'kind': kind,
+            'store': store,
+            'layer': {
+                'name': name,
+                'type': 'VECTOR' if kind == 'featureType' else 'RASTER',
+                'defaultStyle': {'name': 'generic', 'href': f"{self.rest_url}/styles/generic.json"},
+                'resource': {'@class': kind, 'name': f"{ws}:{name}", 'href': href}
+            }
+        }
+
+    def _findResource(self, ws: str, name: str):
+        """ Returns a tuple of (kind, resource dict) for the given feature type or coverage name. """
+        workspace = self._workspace(ws)
+        if not workspace:
+            return None, None
+        for store in workspace['datastores'].values():
+            if name in store['featuretypes']:
+                return 'featureType', store['featuretypes'][name]
+        for store in workspace['coveragestores'].values():
+            if name in store['coverages']:
+                return 'coverage', store['coverages'][name]
+        return None, None
+
+    def _removeResources(self, workspace: dict, store: str):
+        """ Removes all layers that refer to the given store. """
+        for name in [n for n, lyr in workspace['layers'].items() if lyr['store'] == store]:
+            del workspace['layers'][name]
+
+    # About
+    def _version(self, req, body, query):
+        return 200, {'about': {'resource': [
+            {'@name': 'GeoServer', 'Version': self.version},
+            {'@name': 'GeoTools', 'Version': '28.0'}
+        ]}}, None
+
+    def _manifest(self, req, body, query):
+        if self.importer and query.get('value') == 'org.geoserver.importer':
+            return 200, {'about': {'resource': [
+                {'@name': 'gs-importer-core', 'Implementation-Version': self.importer}
+            ]}}, None
+        return 200, {'about': ''}, None
+
+    # Workspaces and namespaces
+    def _listWorkspaces(self, req, body, query):
+        return 200, _named_list('workspaces', 'workspace', self.workspaces), None
+
+    def _createWorkspace(self, req, body, query):
+        name = _json(body).get('workspace', {}).get('name')
+        if not name or name in self.workspaces:
+            return 409 if name else 400, '', None
+        self.workspaces[name] = {
+            'datastores': {}, 'coveragestores': {}, 'styles': {}, 'layers': {}, 'layergroups': {}
+        }
+        return 201, name.encode(), None
+
+    def _deleteWorkspace(self, req, body, query, ws):
+        if self.workspaces.pop(_strip(ws), None) is None:
+            return 404, '', None
+        return 200, b'', None
+
+    def _namespace(self, req, body, query, ws):
+        if not self._workspace(ws):
+            return 404, '', None
+        return 200, {'namespace': {'prefix': _strip(ws), 'uri': f"http://{_strip(ws)}"}}, None
+
+    # Datastores
+    def _listDatastores(self, req, body, query, ws):
+        workspace = self._workspace(ws)
+        if workspace is None:
+            return 404, '', None
+        stores = [{'name': n, 'href': f"{self.rest_url}/workspaces/{_strip(ws)}/datastores/{n}.json"}
+                  for n in workspace['datastores']]
+        return 200, {'dataStores': {'dataStore': stores} if stores else ''}, None
+
+    def _createDatastore(self, req, body, query, ws):
+        workspace = self._workspace(ws)
+        definition = _json(body).get('dataStore', {})
+        if workspace is None or not definition.get('name'):
+            return 400, '', None
+        workspace['datastores'][definition['name']] = {'definition': definition, 'featuretypes': {}}
+        return 201, definition['name'].encode(), None
+
+    def _getDatastore(self, req, body, query, ws, ds):
+        store = (self._workspace(ws) or {}).get('datastores', {}).get(_strip(ds))
+        if store is None:
+            return 404, '', None
+        return 200, {'dataStore': store['definition']}, None
+
+    def _updateDatastore(self, req, body, query, ws, ds):
+        store = (self._workspace(ws) or {}).get('datastores', {}).get(_strip(ds))
+        if store is None:
+            return 404, '', None
+        store['definition'].update(_json(body).get('dataStore', {}))
+        return 200, b'', None
+
+    def _deleteDatastore(self, req, body, query, ws, ds):
+        workspace = self._workspace(ws) or {}
+        if workspace.get('datastores', {}).pop(_strip(ds), None) is None:
+            return 404, '', None
+        self._removeResources(workspace, _strip(ds))
+        return 200, b'', None
+
+    def _uploadGeoPackage(self, req, body, query, ws, ds):
+        workspace = self._workspace(ws)
+        if workspace is None:
+            return 404, '', None
+        self.uploaded_bytes += len(body)
+        workspace['datastores'][ds] = {
+            'definition': {
+                'name': ds,
+                'type': 'GeoPackage',
+                'connectionParameters': {'entry': [{'@key': 'database', '$': f"file:data/{ws}/{ds}/{ds}.gpkg"},
+                                                   {'@key': 'dbtype', '$': 'geopkg'}]}
+            },
+            'featuretypes': {}
+        }
+        # Bridge writes a single table to the GeoPackage, named after the datastore
+        self._addResource(_strip(ws), ds, ds)
+        return 201, b'', None
+
+    # Feature types and coverages
+    def _listFeatureTypes(self, req, body, query, ws, ds):
+        store = (self._workspace(ws) or {}).get('datastores', {}).get(_strip(ds))
+        if store is None:
+            return 404, '', None
+        names = list(store['featuretypes'])
+        if query.get('list') == 'all':
+            return 200, {'list': {'string': names}}, None
+        return 200, _named_list('featureTypes', 'featureType', names), None
+
+    def _createFeatureType(self, req, body, query, ws, ds):
+        workspace = self._workspace(ws)
+        definition = _json(body).get('featureType', {})
+        if workspace is None or _strip(ds) not in workspace['datastores'] or not definition.get('name'):
+            return 400, '', None
+        self._addResource(_strip(ws), _strip(ds), definition['name'], **definition)
+        return 201, definition['name'].encode(), None
+
+    def _getResource(self, req, body, query, ws, ft, ds=None, cs=None):
+        kind, resource = self._findResource(ws, _strip(ft))
+        if resource is None:
+            return 404, '', None
+        return 200, {kind: resource}, None
+
+    def _updateResource(self, req, body, query, ws, ft, ds=None, cs=None):
+        kind, resource = self._findResource(ws, _strip(ft))
+        if resource is None:
+            return 404, '', None
+        resource.update(_json(body).get(kind, {}))
+        return 200, b'', None
+
+    def _uploadGeoTiff(self, req, body, query, ws, cs):
+        workspace = self._workspace(ws)
+        if workspace is None:
+            return 404, '', None
+        self.uploaded_bytes += len(body)
+        workspace['coveragestores'][cs] = {'coverages': {}}
+        self._removeResources(workspace, cs)
+        self._addResource(_strip(ws), cs, query.get('coverageName', cs), 'coverage')
+        return 201, b'', None
+
+    # Styles
+    def _listStyles(self, req, body, query, ws):
+        workspace = self._workspace(ws)
+        if workspace is None:
+            return 404, '', None
+        return 200, _named_list('styles', 'style', workspace['styles']), None
+
+    def _createStyle(self, req, body, query, ws):
+        workspace = self._workspace(ws)
+        if workspace is None:
+            return 404, '', None
+        name = query.get('name')
+        if not name:
+            # Style definition XML (e.g. for Mapbox styles)
+            match = re.search(rb'<name>([^<]+)</name>', body)
+            name = match.group(1).decode() if match else None
+        if not name:
+            return 400, '', None
+        if name in workspace['styles']:
+            return 403, '', None
+        self.uploaded_bytes += len(body)
+        workspace['styles'][name] = body
+        return 201, name.encode(), None
+
+    def _updateStyle(self, req, body, query, ws, name):
+        workspace = self._workspace(ws)
+        if workspace is None or _strip(name) not in workspace['styles']:
+            return 404, '', None
+        self.uploaded_bytes += len(body)
+        workspace['styles'][_strip(name)] = body
+        return 200, b'', None
+
+    def _deleteStyle(self, req, body, query, ws, name):
+        workspace = self._workspace(ws) or {}
+        if workspace.get('styles', {}).pop(_strip(name), None) is None:
+            return 404, '', None
+        return 200, b'', None
+
+    # Layers and layer groups
+    def _listLayers(self, req, body, query, ws):
+        workspace = self._workspace(ws)
+        if workspace is None:
+            return 404, '', None
+        return 200, _named_list('layers', 'layer', workspace['layers']), None
+
+    def _getLayer(self, req, body, query, ws, name):
+        layer = (self._workspace(ws) or {}).get('layers', {}).get(_strip(name))
+        if layer is None:
+            return 404, '', None
+        return 200, {'layer': layer['layer']}, None
+
+    def _updateLayer(self, req, body, query, ws, name):
+        layer = (self._workspace(ws) or {}).get('layers', {}).get(_strip(name))
+        if layer is None:
+            return 404, '', None
+        layer['layer'].update(_json(body).get('layer', {}))
+        return 200, b'', None
+
+    def _deleteLayer(self, req, body, query, ws, name):
+        workspace = self._workspace(ws) or {}
+        if workspace.get('layers', {}).pop(_strip(name), None) is None:
+            return 404, '', None
+        return 200, b'', None
+
+    def _saveLayerGroup(self, req, body, query, ws):
+        workspace = self._workspace(ws)
+        definition = _json(body).get('layerGroup', {})
+        if workspace is None or not definition.get('name'):
+            return 400, '', None
+        exists = definition['name'] in workspace['layergroups']
+        if exists and req.command == 'POST':
+            return 403, '', None
+        workspace['layergroups'][definition['name']] = definition
+        return 200 if exists else 201, b'', None
+
+    def _deleteLayerGroup(self, req, body, query, ws, name):
+        workspace = self._workspace(ws) or {}
+        if workspace.get('layergroups', {}).pop(_strip(name), None) is None:
+            return 404, '', None
+        return 200, b'', None
+
+    # Importer extension
+    def _createImport(self, req, body, query):
+        definition = _json(body).get('import', {})
+        import_id = len(self.imports)
+        self.imports[import_id] = {
+            'workspace': definition.get('targetWorkspace', {}).get('workspace', {}).get('name'),
+            'datastore': definition.get('targetStore', {}).get('dataStore', {}).get('name'),
+            'tasks': {}
+        }
+        return 201, {'import': {'id': import_id, 'state': 'PENDING'}}, None
+
+    def _createImportTask(self, req, body, query, id):  # noqa
+        job = self.imports.get(int(id))
+        if job is None:
+            return 404, '', None
+        self.uploaded_bytes += len(body)
+        task_id = len(job['tasks'])
+        job['tasks'][task_id] = {'id': task_id, 'state': 'READY', 'errorMessage': '', 'layer': {}}
+        return 201, {'task': job['tasks'][task_id]}, None
+
+    def _getImportTask(self, req, body, query, id, task):  # noqa
+        task = self.imports.get(int(id), {}).get('tasks', {}).get(int(task))
+        if task is None:
+            return 404, '', None
+        return 200, {'task': task}, None
+
+    def _updateImportTask(self, req, body, query, id, task):  # noqa
+        task = self.imports.get(int(id), {}).get('tasks', {}).get(int(task))
+        if task is None:
+            return 404, '', None
+        task['layer'].update(_json(body).get('task', {}).get('layer', {}))
+        return 204, b'', None
+
+    def _runImport(self, req, body, query, id):  # noqa
+        job = self.imports.get(int(id))
+        if job is None or job['workspace'] not in self.workspaces:
+            return 404, '', None
+        workspace = self.workspaces[job['workspace']]
+        store = workspace['datastores'].setdefault(job['datastore'], {
+            'definition': {'name': job['datastore'], 'type': 'PostGIS'}, 'featuretypes': {}
+        })
+        for task in job['tasks'].values():
+            name = task['layer'].get('name') or f"import_{id}_{task['id']}"
+            if name in store['featuretypes']:
+                name = f"{name}{len(store['featuretypes'])}"
+            task['layer']['name'] = name
+            task['state'] = 'COMPLETE'
+            self._addResource(job['workspace'], job['datastore'], name)
+        return 204, b'', None
+
+    # Resources and GeoWebCache
+    def _putResource(self, req, body, query, path):
+        self.uploaded_bytes += len(body)
+        self.resources[path] = body
+        self.resource_uploads[path] += 1
+        return 201, b'', None
+
+    def _getGwcLayer(self, req, body, query, name):
+        xml = self.gwc_layers.get(_strip(name))
+        if xml is None:
+            xml = f"<GeoServerLayer><name>{_strip(name)}</name><mimeFormats>" \
+                  f"<string>image/png</string></mimeFormats></GeoServerLayer>"
+        return 200, xml, None
+
+    def _putGwcLayer(self, req, body, query, name):
+        self.gwc_layers[_strip(name)] = body.decode()
+        return 200, b'', None
+
+
+def _multipart(req: BaseHTTPRequestHandler, body: bytes) -> dict:
+    """ Parses a multipart/form-data request body and returns a dictionary of field name and (bytes) value. """
+    header = f"Content-Type: {req.headers.get('Content-Type', '')}\r\n\r\n".encode()
+    message = BytesParser().parsebytes(header + body)
+    if not message.is_multipart():
+        return {}
+    return {part.get_param('name', header='Content-Disposition'): part.get_payload(decode=True)
+            for part in message.get_payload()}
+
+
+class GeoNetworkStandIn(StandInServer):
+    """ Stand-in for the GeoNetwork endpoints that GeonetworkServer (and its session) use:
+    site info (version), the "me" endpoint that hands out XSRF token cookies, form-based sign in,
+    record uploads (MEF files), retrieval and deletion (also in bulk), and the record search API.
+
+    Like GeoNetwork, the stand-in only accepts write requests from signed in sessions that send
+    a matching X-XSRF-TOKEN header.
+
+    :param version:     The GeoNetwork version to report.
+    :param username:    The user name that is allowed to sign in.
+    :param password:    The password for the user.
+    """
+    COOKIE_TOKEN = 'XSRF-TOKEN'
+    COOKIE_SESSION = 'JSESSIONID'
+
+    def __init__(self, latency: float = 0, bandwidth: int = None, version: str = '4.2.2',
+                 username: str = 'admin', password: str = 'admin'):
+        super().__init__(latency, bandwidth, '/geonetwork')
+        self.version = version
+        self.username = username
+        self.password = password
+        self.records = {}
+        self.change_dates = {}
+        self.sessions = set()
+        self.uploaded_bytes = 0
+
+        api = '/srv/api'
+        uuid = r'(?P<uuid>[^/]+)'
+        self.route('GET', f'{api}/site', self._site)
+        self.route('GET', f'{api}/info', self._me)
+        self.route('POST', f'{api}/info', self._token)
+        self.route('POST', '/signin', self._signIn)
+        self.route('POST', f'{api}/records', self._uploadRecord)
+        self.route('DELETE', f'{api}/records', self._deleteRecords)
+        self.route('POST', f'{api}/search/records/_search', self._search)
+        self.route('GET', f'{api}/records/{uuid}', self._getRecord)
+        self.route('DELETE', f'{api}/records/{uuid}', self._deleteRecord)
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/srv/api"
+
+    def expireSessions(self):
+        """ Signs out all sessions (e.g. to simulate a session timeout on the server). """
+        self.sessions.clear()
+
+    def touchRecord(self, uuid):
+        """ Updates the change date of a record (e.g. to simulate an edit in the GeoNetwork editor).
+        Like the GeoNetwork 4 search index, the date is in UTC with milliseconds.
+        """
+        now = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        self.change_dates[uuid] = now.replace('+00:00', 'Z')
+
+    def _cookieHeader(self, name, value) -> dict:
+        return {'Set-Cookie': f"{name}={value}; Path={self.prefix}"}
+
+    def _authenticated(self, req) -> bool:
+        """ Returns True if the request belongs to a signed in session and has a valid XSRF token header. """
+        cookies = {k: m.value for k, m in SimpleCookie(req.headers.get('Cookie', '')).items()}
+        token = cookies.get(self.COOKIE_TOKEN)
+        return bool(token) and req.headers.get('X-XSRF-TOKEN') == token and \
+            cookies.get(self.COOKIE_SESSION) in self.sessions
+
+    def _site(self, req, body, query):
+        return 200, {
+            'system/site/name': 'GeoNetwork stand-in',
+            'system/platform/version': self.version,
+            'system/platform/subVersion': '0'
+        }, None
+
+    def _me(self, req, body, query):
+        if query.get('type') != 'me':
+            return 400, '', None
+        authenticated = str(self._authenticated(req)).lower()
+        return 200, f'<info><me authenticated="{authenticated}"/></info>', None
+
+    def _token(self, req, body, query):
+        # GeoNetwork refuses POST requests without a token, but does return a token cookie
+        return 403, '', self._cookieHeader(self.COOKIE_TOKEN, uuid4().hex)
+
+    def _signIn(self, req, body, query):
+        form = dict(parse_qsl(body.decode()))
+        cookies = {k: m.value for k, m in SimpleCookie(req.headers.get('Cookie', '')).items()}
+        if not form.get('_csrf') or form['_csrf'] != cookies.get(self.COOKIE_TOKEN):
+            return 403, '', None
+        if (form.get('username'), form.get('password')) != (self.username, self.password):
+            return 401, '', None
+        session_id = uuid4().hex
+        self.sessions.add(session_id)
+        headers = self._cookieHeader(self.COOKIE_SESSION, session_id)
+        headers['Location'] = f"{self.url}/srv/eng/catalog.search"
+        return 302, b'', headers
+
+    def _uploadRecord(self, req, body, query):
+        if not self._authenticated(req):
+            return 403, {'message': 'Access denied'}, None
+        self.uploaded_bytes += len(body)
+        mef = _multipart(req, body).get('file')
+        imported, infos, errors = [], {}, []
+        try:
+            with zipfile.ZipFile(BytesIO(mef or b'')) as z:
+                names = z.namelist()
+                # A MEF (v2) archive may contain multiple records: one folder (named after the UUID) per record
+                for uuid in sorted({n.split('/')[0] for n in names if n.endswith('/info.xml')}):
+                    if f"{uuid}/metadata/metadata.xml" not in names:
+                        errors.append({'message': f"Failed to import record '{uuid}': metadata.xml not found"})
+                        continue
+                    self.records[uuid] = z.read(f"{uuid}/metadata/metadata.xml")
+                    self.touchRecord(uuid)
+                    imported.append(uuid)
+                    infos[str(len(self.records))] = [
+                        {'message': f"Metadata imported from MEF with UUID '{uuid}'", 'uuid': uuid}
+                    ]
+        except zipfile.BadZipFile as err:
+            errors.append({'message': f"Invalid MEF file: {err}"})
+        return 201, {
+            'errors': errors,
+            'infos': [],
+            'uuids': imported,
+            'metadataInfos': infos,
+            'numberOfRecordsProcessed': len(imported) + len(errors),
+            'numberOfRecordsWithErrors': len(errors)
+        }, None
+
+    def _getRecord(self, req, body, query, uuid):
+        record = self.records.get(uuid)
+        if record is None:
+            return 404, {'message': f"Record with UUID '{uuid}' not found"}, None
+        return 200, record, {'Content-Type': 'application/xml'}
+
+    def _deleteRecords(self, req, body, query):
+        if not self._authenticated(req):
+            return 403, {'message': 'Access denied'}, None
+        uuids = parse_qs(urlparse(req.path).query).get('uuids', [])
+        not_found = [u for u in uuids if self.records.pop(u, None) is None]
+        return 200, {
+            'errors': [],
+            'infos': [],
+            'numberOfRecordsProcessed': len(uuids) - len(not_found),
+            'numberOfRecordNotFound': len(not_found),
+            'numberOfRecordsNotEditable': 0
+        }, None
+
+    def _search(self, req, body, query):
+        terms = _json(body).get('query', {}).get('terms', {}).get('uuid', [])
+        hits = [{'_id': u, '_source': {'uuid': u, 'changeDate': self.change_dates.get(u)}}
+                for u in terms if u in self.records]
+        return 200, {'hits': {'total': {'value': len(hits)}, 'hits': hits}}, None
+
+    def _deleteRecord(self, req, body, query, uuid):
+        if not self._authenticated(req):
+            return 403, {'message': 'Access denied'}, None
+        if self.records.pop(uuid, None) is None:
+            return 404, {'message': f"Record with UUID '{uuid}' not found"}, None
+        return 204, b'', None
@@ -1,14 +1,18 @@
 from functools import partial
+from html import escape
 
-from qgis.PyQt.QtCore import Qt
-from qgis.PyQt.QtGui import QIcon
+from qgis.PyQt.QtCore import Qt, QUrl
+from qgis.PyQt.QtGui import QIcon, QFont, QColor
 from qgis.PyQt.QtWidgets import (
     QHBoxLayout,
     QHeaderView,
+    QTableWidget,
     QTableWidgetItem,
+    QAbstractItemView,
     QWidget, QLabel, QToolButton
 )
 
+from geocatbridge.publish.style.lint import SEVERITY_HIGH
 from geocatbridge.servers import bases
 from geocatbridge.utils import gui, files
 from geocatbridge.utils.strings import pluralize
@@ -19,7 +23,8 @@ WIDGET, BASE = gui.loadUiType(__file__)
 
 class PublishReportDialog(FeedbackMixin, BASE, WIDGET):
 
-    def __init__(self, results, only_symbology, geodata_server, metadata_server, parent):
+    def __init__(self, results, only_symbology, geodata_server, metadata_server, parent,
+                 tracer=None, trace_file=None, skipped_metadata=None, style_issues=None):
         super(PublishReportDialog, self).__init__(parent)
         self.results = results
         self.setupUi(self)
@@ -43,7 +48,13 @@ class PublishReportDialog(FeedbackMixin, BASE, WIDGET):
         self.labelPublishMapData.setText(txt_on if publish_data and not only_symbology else txt_off)
         self.labelPublishSymbology.setText(txt_on if publish_data or only_symbology else txt_off)
         self.labelPublishMetadata.setText(txt_on if metadata_server is not None else txt_off)
+        if skipped_metadata:
+            unchanged = self.translate('unchanged records skipped')
+            self.labelPublishMetadata.setText(f"{self.labelPublishMetadata.text()} "
+                                              f"({len(skipped_metadata)} {unchanged})")
         self.tableWidget.setRowCount(len(results))
+        skipped_metadata = skipped_metadata or set()
+        txt_unchanged = self.translate('metadata unchanged')
 
         # Populate report table
         for i, name in enumerate(results.keys()):
@@ -51,9 +62,11 @@ class PublishReportDialog(FeedbackMixin, BASE, WIDGET):
             self.tableWidget.setItem(i, 0, QTableWidgetItem(name))
 
             # Just show "success" in the last column if there are no errors and warnings
+            # Layers of which the metadata record was skipped (because it did not change) are marked as such
             warnings, errors = results[name]
+            skipped = f" ({txt_unchanged})" if name in skipped_metadata else ""
             if not (warnings or errors):
-                self.tableWidget.setItem(i, 1, QTableWidgetItem('OK'))
+                self.tableWidget.setItem(i, 1, QTableWidgetItem(f'OK{skipped}'))
                 continue
 
             # Show error and warning count and dialog button (for details) in the last column if there are issues
@@ -64,7 +77,7 @@ class PublishReportDialog(FeedbackMixin, BASE, WIDGET):
             button.clicked.connect(partial(self.openDetails, name))  # noqa
             layout.addWidget(button)  # noqa
             status_lbl = QLabel()
-            status_lbl.setText(f"{pluralize(len(warnings), 'warning')}, {pluralize(len(errors), 'error')}")
+            status_lbl.setText(f"{pluralize(len(warnings), 'warning')}, {pluralize(len(errors), 'error')}{skipped}")
             if errors:
                 # Also render text in red if there are any errors
                 status_lbl.setStyleSheet("QLabel { color: red; }")
@@ -74,6 +87,77 @@ class PublishReportDialog(FeedbackMixin, BASE, WIDGET):
             status_widget.setLayout(layout)
             self.tableWidget.setCellWidget(i, 1, status_widget)
 
+        if style_issues:
+            self.addStylePerformance(style_issues)
+        if tracer is not None:
+            self.addTimingSummary(tracer, trace_file)
+
+    def addStylePerformance(self, style_issues: dict):
+        """ Adds a table with the style performance issues of all layers (ranked by estimated cost) below the results.
+
+        :param style_issues:    Dictionary of layer name -> list of StyleIssue objects.
+        """
+        ranked = sorted(((issue, name) for name, issues in style_issues.items() for issue in issues),
+                        key=lambda item: item[0].cost, reverse=True)
+        index = self.verticalLayout.indexOf(self.buttonBox)
+
+        title = QLabel(self.translate('Style performance'))
+        font = QFont()
+        font.setBold(True)
+        title.setFont(font)
+        self.verticalLayout.insertWidget(index, title)
+
+        table = QTableWidget(len(ranked), 3, self)
+        table.setHorizontalHeaderLabels([self.translate(h) for h in ('Layer', 'Severity', 'Issue')])
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.verticalHeader().hide()
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setSelectionMode(QAbstractItemView.NoSelection)
+        table.setWordWrap(True)
+        for i, (issue, name) in enumerate(ranked):
+            table.setItem(i, 0, QTableWidgetItem(name))
+            table.setItem(i, 1, QTableWidgetItem(self.translate(issue.severity)))
+            item = QTableWidgetItem(issue.message)
+            item.setToolTip(f"{issue.message} ({self.translate('estimated cost')}: {issue.cost:,.0f})")
+            table.setItem(i, 2, item)
+            if issue.severity == SEVERITY_HIGH:
+                table.item(i, 1).setForeground(QColor('red'))
+        table.resizeRowsToContents()
+        self.verticalLayout.insertWidget(index + 1, table)
+
+    def addTimingSummary(self, tracer, trace_file=None):
+        """ Adds a table with the time spent per publish step (from the task trace) below the results. """
+        summary = tracer.summary()
+        if not summary:
+            return
+        index = self.verticalLayout.indexOf(self.buttonBox)
+
+        title = QLabel(self.translate('Timing'))
+        font = QFont()
+        font.setBold(True)
+        title.setFont(font)
+        self.verticalLayout.insertWidget(index, title)
+
+        table = QTableWidget(len(summary), 3, self)
+        table.setHorizontalHeaderLabels([self.translate(h) for h in ('Step', 'Count', 'Time (s)')])
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.verticalHeader().hide()
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setSelectionMode(QAbstractItemView.NoSelection)
+        for i, (step, (count, duration)) in enumerate(summary.items()):
+            table.setItem(i, 0, QTableWidgetItem(step.capitalize()))
+            table.setItem(i, 1, QTableWidgetItem(str(count)))
+            table.setItem(i, 2, QTableWidgetItem(f"{duration:.2f}"))
+        self.verticalLayout.insertWidget(index + 1, table)
+
+        if trace_file:
+            url = QUrl.fromLocalFile(trace_file).toString()
+            link = QLabel(f'{self.translate("Trace file")}: <a href="{escape(url)}">{escape(trace_file)}</a>')
+            link.setOpenExternalLinks(True)
+            link.setWordWrap(True)
+            self.verticalLayout.insertWidget(index + 2, link)
+
     def openDetails(self, name):
         """ Populates and shows an HTML dialog with errors and warnings. """
         warnings, errors = self.results[name]
@@ -1,7 +1,8 @@
 import json
 import webbrowser
-from collections import Counter
+from collections import Counter, OrderedDict
 from functools import partial
+from html import escape
 from typing import List, FrozenSet
 
 import requests
@@ -22,6 +23,7 @@ from qgis.PyQt.QtWidgets import (
     QCheckBox,
     QListWidgetItem,
     QTableWidgetItem,
+    QToolButton,
     QFileDialog
 )
 from qgis.core import (
@@ -33,12 +35,16 @@ from qgis.core import (
 )
 from qgis.utils import iface
 
-from geocatbridge.publish.metadata import uuidForLayer, loadMetadataFromXml, MetadataDependencyError
+from geocatbridge.publish.metadata import (
+    uuidForLayer, loadMetadataFromXml, convertMetadataFromXml, applyQmdMetadata, sidecarMetadataFile,
+    MetadataDependencyError
+)
+from geocatbridge.publish.profiling import prepareProfile, profileLayer, exportProfiles
 from geocatbridge.publish.tasks import PublishTask, ExportTask
 from geocatbridge.servers import manager
 from geocatbridge.ui.metadatadialog import MetadataDialog
 from geocatbridge.ui.progressdialog import ProgressDialog
-from geocatbridge.utils import files, gui, meta, l10n
+from geocatbridge.utils import files, gui, meta, l10n, feedback
 from geocatbridge.utils.feedback import FeedbackMixin
 from geocatbridge.utils.layers import (
     BridgeLayer, listBridgeLayers, layerById, listLayerNames, listGroupNames
@@ -56,6 +62,9 @@ IMPORT_ICON = QIcon(files.getIconPath("save"))
 
 IDENTIFICATION, CATEGORIES, KEYWORDS, ACCESS, EXTENT, CONTACT = range(6)
 
+# Maximum number of metadata files that are converted at the same time during a batch import
+MAX_IMPORT_WORKERS = 4
+
 WIDGET, BASE = gui.loadUiType(__file__)
 
 
@@ -78,6 +87,13 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
         self.isMetadataPublished = {}
         self.isDataPublished = {}
 
+        # Worker thread of a running batch metadata import (if any)
+        self._importWorker = None
+
+        # Render-cost profiles of the profiled layers (layer ID -> LayerProfile) and the worker thread (if running)
+        self.renderProfiles = OrderedDict()
+        self._profileWorker = None
+
         # Default "not set" values for comboboxes
         self.COMBO_NOTSET_LANG = self.translate("Not specified")
         self.COMBO_NOTSET_DATA = self.translate("Do not publish data")
@@ -106,6 +122,11 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
         self.btnPreview.setIcon(PREVIEW_ICON)
         self.btnImport.setIcon(IMPORT_ICON)
         self.btnImport.clicked.connect(self.importMetadata)
+        import_menu = QMenu(self.btnImport)
+        import_menu.addAction(self.translate("Import metadata for current layer"), self.importMetadata)
+        import_menu.addAction(self.translate("Import metadata for all selected layers"), self.importAllMetadata)
+        self.btnImport.setMenu(import_menu)
+        self.btnImport.setPopupMode(QToolButton.MenuButtonPopup)
         self.btnValidate.clicked.connect(self.validateMetadata)
         self.btnUseConstraints.clicked.connect(partial(self.openMetadataEditor, ACCESS))
         self.btnAccessConstraints.clicked.connect(partial(self.openMetadataEditor, ACCESS))
@@ -339,6 +360,10 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
         if self.isMetadataPublished.get(layer_id):
             menu.addAction(self.translate("View metadata record"), partial(self.viewMetadata, layer_id))
             menu.addAction(self.translate("Unpublish metadata"), partial(self.unpublishMetadata, layer_id))
+        menu.addSeparator()
+        menu.addAction(self.translate("Profile rendering of selected layers"), self.profileRendering)
+        if self.renderProfiles:
+            menu.addAction(self.translate("Export rendering profiles..."), self.exportRenderProfiles)
         menu.exec_(self.listLayers.mapToGlobal(pos))
 
     def populateLayers(self):
@@ -401,14 +426,7 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
                 "Can only import metadata for file-based layer sources"
             )
 
-        layer_source = self.currentLayer.uri
-        metadata_file = layer_source.with_suffix(".xml")
-        if not metadata_file.exists():
-            # First find XML using source path with extension replaced for .xml, then use path with .xml appended
-            metadata_file = layer_source.with_suffix(f"{layer_source.suffix}.xml")
-            if not metadata_file.exists():
-                metadata_file = None
-
+        metadata_file = sidecarMetadataFile(self.currentLayer)
         if metadata_file is None:
             res = self.showQuestionBox("Metadata",
                                        "Could not find a suitable metadata XML file.\n"
@@ -436,6 +454,64 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
             self.populateLayerMetadata()
             self.showSuccessBar("", "Successfully imported metadata")
 
+    def importAllMetadata(self):
+        """ Imports the metadata for all selected layers from the metadata XML (sidecar) files next to the layer data.
+        The files are converted in a pool of worker threads, after which the results are applied on the main thread.
+        """
+        self.storeMetadata()
+        layer_ids = self.getCheckedLayers()
+        if not layer_ids:
+            return self.showWarningBar("Nothing to import", "Please select one or more layers.")
+
+        # Lookup of layer ID and a (layer name, result message) tuple
+        results = OrderedDict()
+        sidecars = []
+        for layer in listBridgeLayers(layer_ids):
+            metadata_file = sidecarMetadataFile(layer)
+            if metadata_file is None:
+                results[layer.id()] = (layer.name(), self.translate("No metadata file found"))
+                continue
+            results[layer.id()] = (layer.name(), self.translate("Canceled"))
+            sidecars.append((layer.id(), metadata_file))
+        if not sidecars:
+            return self.showWarningBar("Error importing metadata",
+                                       "Could not find a metadata XML file for any of the selected layers")
+
+        worker = gui.ItemProcessor(sidecars, _convertSidecarFile, min(MAX_IMPORT_WORKERS, len(sidecars)))
+        pg_dialog = self.getProgressDialog("Importing metadata...", len(sidecars), worker.requestInterruption)
+        worker.progress.connect(pg_dialog.setValue)
+        worker.resultReady.connect(partial(self.applyImportedMetadata, results))
+        self._importWorker = worker
+        worker.start()
+
+    def applyImportedMetadata(self, results: OrderedDict, converted: list):
+        """ Applies the converted metadata (see `importAllMetadata()`) to the layers and shows the results.
+
+        :param results:     Lookup of layer ID and a (layer name, result message) tuple.
+        :param converted:   List of (layer ID, QMD data, error message) tuples.
+        """
+        self._importWorker = None
+        imported = 0
+        for layer_id, qmd_data, error in converted:
+            layer = layerById(layer_id)
+            if layer is None:
+                error = self.translate("Layer no longer exists")
+            elif error is None:
+                try:
+                    applyQmdMetadata(layer, qmd_data)
+                    imported += 1
+                except Exception as err:
+                    error = str(err)
+            results[layer_id] = (results[layer_id][0], error or "OK")
+
+        self.populateLayerMetadata()
+        rows = "".join(f"<tr><td>{escape(name)}</td><td>{escape(msg)}</td></tr>" for name, msg in results.values())
+        self.showHtmlMessage("Metadata import", f"<table>{rows}</table>")
+        if imported == len(results):
+            self.showSuccessBar("", f"Successfully imported metadata for {imported} layers")
+        else:
+            self.showWarningBar("Metadata import", f"Imported metadata for {imported} of {len(results)} layers")
+
     def validateMetadata(self):
         if self.currentLayer is None:
             return
@@ -451,6 +527,62 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
             html = f"<p>{tr_text}:<ul>{issues}</ul></p>"
         self.showHtmlMessage("Metadata validation", html)
 
+    def profileRendering(self):
+        """ Renders all selected layers on tile-sized images at representative scales (on a separate thread)
+        and shows the render time per tile for each layer.
+        The render jobs are prepared here (on the GUI thread) from snapshots of the layers.
+        """
+        layer_ids = self.getCheckedLayers()
+        if not layer_ids:
+            return self.showWarningBar("Nothing to profile", "Please select one or more layers.")
+        jobs = []
+        for layer in listBridgeLayers(layer_ids):
+            try:
+                jobs.append(prepareProfile(layer))
+            except Exception as err:
+                self.logError(f"Failed to prepare rendering profile of layer '{layer.name()}': {err}")
+        if not jobs:
+            return self.showWarningBar("Rendering profile", "Could not profile any of the selected layers")
+
+        # Use a single worker: layers are profiled one at a time, so that the timings are not skewed
+        worker = gui.ItemProcessor(jobs, profileLayer)
+        pg_dialog = self.getProgressDialog("Profiling layer rendering...", len(jobs), worker.requestInterruption)
+        worker.progress.connect(pg_dialog.setValue)
+        worker.resultReady.connect(self.applyRenderProfiles)
+        self._profileWorker = worker
+        worker.start()
+
+    def applyRenderProfiles(self, profiles: list):
+        """ Shows the render-cost profiles (see `profileRendering()`) per layer and in a summary message. """
+        self._profileWorker = None
+        for profile in profiles:
+            self.renderProfiles[profile.layer_id] = profile
+            for i in range(self.listLayers.count()):
+                widget = self.listLayers.itemWidget(self.listLayers.item(i))
+                if widget.id == profile.layer_id:
+                    widget.setRenderProfile(profile)
+        if not profiles:
+            return self.showWarningBar("Rendering profile", "Could not profile any of the selected layers")
+
+        headers = "".join(f"<th>{self.translate(h)}</th>" for h in ('Layer', 'Mean (ms per tile)', 'Slowest scale'))
+        rows = "".join(f"<tr><td>{escape(p.name)}</td><td>{p.mean:.0f}</td>"
+                       f"<td>1:{p.worst.scale:,.0f} ({p.worst.ms:.0f} ms)</td></tr>"
+                       for p in sorted(profiles, key=lambda p: p.mean, reverse=True) if p.samples)
+        self.showHtmlMessage("Rendering profile", f"<table><tr>{headers}</tr>{rows}</table>")
+
+    def exportRenderProfiles(self):
+        """ Exports the render-cost profiles of all profiled layers to a CSV file. """
+        filename, _ = QFileDialog.getSaveFileName(self, self.translate("Export rendering profiles"),
+                                                  "", "CSV files (*.csv)")
+        if not filename:
+            return
+        try:
+            exportProfiles(self.renderProfiles.values(), filename)
+        except OSError as err:
+            self.logError(err)
+            return self.showErrorBar("Error exporting rendering profiles", str(err))
+        self.showSuccessBar("", f"Exported rendering profiles to {filename}")
+
     def openMetadataEditor(self, tab):
         if self.currentLayer is None:
             return
@@ -543,10 +675,7 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
         def _isMetadataOnServer(srv: manager.bases.MetaCatalogServerBase, lyr: BridgeLayer, existing_items: FrozenSet):
             if not srv:
                 return False
-            uuid = uuidForLayer(lyr)
-            if existing_items:
-                return uuid in existing_items
-            return srv.metadataExists(uuid)
+            return uuidForLayer(lyr) in existing_items
 
         def _isDataOnServer(srv: manager.bases.DataCatalogServerBase, lyr: BridgeLayer, existing_items: FrozenSet):
             if not srv:
@@ -563,15 +692,20 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
                 for e in errors:
                     self.showErrorBar("Error", e)
 
-            # Get list of all item names on server to prevent doing a lot of requests   TODO: metadata
-            existing_items = frozenset(server_.layerNames().keys()
-                                       if isinstance(server_, manager.bases.DataCatalogServerBase) else [])
+            widgets = [self.listLayers.itemWidget(self.listLayers.item(i)) for i in range(self.listLayers.count())]
+            layers = {w.id: layerById(w.id) for w in widgets}
+
+            # Get all item names or record IDs on the server at once to prevent doing a lot of requests
+            if isinstance(server_, manager.bases.DataCatalogServerBase):
+                existing_items = frozenset(server_.layerNames().keys())
+            elif isinstance(server_, manager.bases.MetaCatalogServerBase):
+                existing_items = server_.existingMetadata(uuidForLayer(lyr) for lyr in layers.values() if lyr)
+            else:
+                existing_items = frozenset()
 
             # Update layer publication status
-            for i in range(self.listLayers.count()):
-                item = self.listLayers.item(i)
-                widget = self.listLayers.itemWidget(item)
-                layer = layerById(widget.id)
+            for widget in widgets:
+                layer = layers[widget.id]
                 if not layer:
                     continue
                 if isinstance(server_, manager.bases.DataCatalogServerBase):
@@ -638,9 +772,13 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
 
         # Clear metadata (only what has been published)
         if meta_server:
+            uuids = {}
             for layer_id, status in self.isMetadataPublished.items():
-                if status:
-                    self.isMetadataPublished[layer_id] = not self.unpublishMetadata(layer_id)
+                layer = layerById(layer_id) if status else None
+                if layer:
+                    uuids[uuidForLayer(layer)] = layer_id
+            for uuid in meta_server.deleteMetadataRecords(uuids):
+                self.updateLayerIsMetadataPublished(uuids[uuid], None)
 
         r_msg = "Removed "
         if data_deleted and meta_server:
@@ -749,9 +887,10 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
         elif isinstance(task, ExportTask):
             self.showSuccessBar(f"{action.capitalize()} completed", "No issues encountered.")
 
+        # Write the task trace (and show the report dialog for publish tasks)
+        task.finished(ret)
         if isinstance(task, PublishTask):
-            # Show report dialog for publish tasks and update publication status
-            task.finished(ret)
+            # Update publication status
             self.updateOnlineLayersPublicationStatus(task.geodata_server is not None, task.metadata_server is not None)
 
     def publishOnBackground(self, to_publish: List[str]):
@@ -841,6 +980,20 @@ class PublishWidget(FeedbackMixin, BASE, WIDGET):
                           self.chkExportGeodata.isChecked(), self.chkExportMetadata.isChecked(), style_only)
 
 
+def _convertSidecarFile(item: tuple) -> tuple:
+    """ Converts the metadata XML file of a layer into a QGIS metadata document (runs in a worker thread).
+
+    :param item:    A (layer ID, metadata file path) tuple.
+    :returns:       A (layer ID, QMD data, error message) tuple. Either the data or the error message is None.
+    """
+    layer_id, metadata_file = item
+    try:
+        return layer_id, convertMetadataFromXml(metadata_file), None
+    except Exception as err:
+        feedback.logError(f"Failed to convert metadata file {metadata_file}: {err}")
+        return layer_id, None, str(err) or type(err).__name__
+
+
 class LayerItemWidget(QWidget):
     def __init__(self, layer: BridgeLayer, parent=None):
         super(LayerItemWidget, self).__init__(parent)  # noqa
@@ -855,8 +1008,10 @@ class LayerItemWidget(QWidget):
         self._metalabel.setFixedWidth(20)
         self._datalabel = QLabel()
         self._datalabel.setFixedWidth(20)
+        self._renderlabel = QLabel()
         layout = QHBoxLayout()
         layout.addWidget(self._checkbox)  # noqa
+        layout.addWidget(self._renderlabel)  # noqa
         layout.addWidget(self._datalabel)  # noqa
         layout.addWidget(self._metalabel)  # noqa
         self.setLayout(layout)
@@ -903,6 +1058,13 @@ class LayerItemWidget(QWidget):
             self._datalabel.setToolTip('')
         self.update()
 
+    def setRenderProfile(self, profile):
+        """ Shows the mean render time per tile of the given LayerProfile (details are shown as a tooltip). """
+        self._renderlabel.setText(f"{profile.mean:.0f} ms")
+        self._renderlabel.setStyleSheet("QLabel { color: red; }" if profile.is_slow else "")
+        self._renderlabel.setToolTip("\n".join(f"1:{s.scale:,.0f}: {s.ms:.0f} ms per tile" for s in profile.samples))
+        self.update()
+
     @property
     def checked(self) -> bool:
         """ Returns True if the list widget item checkbox is in a checked state. """
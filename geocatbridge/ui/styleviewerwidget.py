@@ -1,19 +1,102 @@
 import json
-from itertools import chain
+from collections import OrderedDict
 
 from qgis.PyQt.Qsci import QsciScintilla, QsciLexerXML, QsciLexerJSON
+from qgis.PyQt.QtCore import QThread, QTimer, pyqtSignal
 from qgis.PyQt.QtGui import QFont, QColor, QFontMetrics
-from qgis.PyQt.QtWidgets import QVBoxLayout
+from qgis.PyQt.QtWidgets import QVBoxLayout, QWidget
 from qgis.utils import iface
 
 from geocatbridge.publish.style import (
-    layerStyleAsSld, layerStyleAsMapbox, layerStyleAsMapfile, convertStyle
+    layerStyleAsSld, layerStyleAsMapbox, layerStyleAsMapfile, convertStyle, snapshotSource, styleKey
 )
+from geocatbridge.publish.style.lint import lintLayerStyle
 from geocatbridge.utils.layers import isSupportedLayer
 from geocatbridge.utils import gui
 
 WIDGET, BASE = gui.loadUiType(__file__)
 
+# Delay (in milliseconds) before the viewer is refreshed after a (burst of) style or current layer change(s)
+REFRESH_DELAY = 300
+
+# Maximum number of converted layer styles to keep in memory
+MAX_CACHED_STYLES = 20
+
+FORMAT_SLD = 'sld'
+FORMAT_GEOSTYLER = 'geostyler'
+FORMAT_MAPBOX = 'mapbox'
+FORMAT_MAPFILE = 'mapfile'
+FORMAT_LINT = 'lint'
+
+
+def _toSld(layer) -> tuple:
+    sld, _, warnings = layerStyleAsSld(layer)
+    return sld, warnings
+
+
+def _toGeostyler(layer) -> tuple:
+    geostyler, _, _, warnings = convertStyle(layer)
+    return json.dumps(geostyler, indent=4), warnings
+
+
+def _toMapbox(layer) -> tuple:
+    mapbox, _, warnings = layerStyleAsMapbox(layer)
+    return mapbox, warnings
+
+
+def _toMapfile(layer) -> tuple:
+    mapserver, _, _, warnings = layerStyleAsMapfile(layer)
+    return mapserver, warnings
+
+
+def _toLint(layer) -> tuple:
+    issues = lintLayerStyle(layer)
+    if not issues:
+        return "No style performance issues found", []
+    return "\n".join(str(issue) for issue in issues), []
+
+
+# Style format -> (converter function, display name)
+CONVERTERS = OrderedDict([
+    (FORMAT_SLD, (_toSld, 'SLD')),
+    (FORMAT_GEOSTYLER, (_toGeostyler, 'GeoStyler')),
+    (FORMAT_MAPBOX, (_toMapbox, 'MapBox GL')),
+    (FORMAT_MAPFILE, (_toMapfile, 'Mapfile')),
+    (FORMAT_LINT, (_toLint, 'performance report'))
+])
+
+
+class StyleConverter(QThread):
+    """ Converts a snapshot (clone) of a layer to the given style formats on a separate (non-blocking) thread.
+    The clone must be created on the GUI thread, so that the user can keep on editing the original layer style.
+
+    :param key:         Key that identifies the converted style (passed on to the resultReady signal).
+    :param layer_id:    ID of the original layer, for which the style conversion is cached.
+    :param snapshot:    Clone of the original layer.
+    :param formats:     The style formats to convert to (see `CONVERTERS`).
+    :returns:           The resultReady signal slot receives the key and a dictionary of
+                        format -> (style text, warnings) for each requested format.
+    """
+    resultReady = pyqtSignal(str, dict)
+
+    def __init__(self, key: str, layer_id: str, snapshot, formats):
+        super().__init__()
+        self._key = key
+        self._layer_id = layer_id
+        self._snapshot = snapshot
+        self._formats = formats
+
+    def run(self):
+        outputs = {}
+        with snapshotSource(self._layer_id):
+            for fmt in self._formats:
+                func, name = CONVERTERS[fmt]
+                try:
+                    outputs[fmt] = func(self._snapshot)
+                except Exception as e:
+                    outputs[fmt] = "", [f"Failed to convert to {name}: {e}"]
+        self.resultReady.emit(self._key, outputs)  # noqa
+
 
 class StyleviewerWidget(BASE, WIDGET):
 
@@ -39,7 +122,43 @@ class StyleviewerWidget(BASE, WIDGET):
         self.txtMapserver = EditorWidget()
         layout = QVBoxLayout()
         layout.addWidget(self.txtMapserver)
-        self.widgetMapserver.setLayout(layout)        
+        self.widgetMapserver.setLayout(layout)
+
+        self.txtPerformance = EditorWidget()
+        self.txtPerformance.setWrapMode(QsciScintilla.WrapWord)
+        layout = QVBoxLayout()
+        layout.addWidget(self.txtPerformance)
+        self.tabPerformance = QWidget()
+        self.tabPerformance.setLayout(layout)
+        self.tabWidget.insertTab(self.tabWidget.indexOf(self.tab_4), self.tabPerformance, self.tr("Performance"))
+
+        # Style format -> editor and tab -> style format (the warnings tab has no format of its own)
+        self._editors = {
+            FORMAT_SLD: self.txtSld,
+            FORMAT_GEOSTYLER: self.txtGeostyler,
+            FORMAT_MAPBOX: self.txtMapbox,
+            FORMAT_MAPFILE: self.txtMapserver,
+            FORMAT_LINT: self.txtPerformance
+        }
+        self._tabs = {
+            self.tab_2: FORMAT_SLD,
+            self.tab: FORMAT_GEOSTYLER,
+            self.tab_3: FORMAT_MAPBOX,
+            self.tab_5: FORMAT_MAPFILE,
+            self.tabPerformance: FORMAT_LINT
+        }
+
+        self._outputs = OrderedDict()  # style key -> {format: (style text, warnings)}
+        self._displayed = {}  # editor -> displayed text
+        self._current_key = None
+        self._converter = None
+        self._pending = False
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(REFRESH_DELAY)
+        self._timer.timeout.connect(self._refresh)  # noqa
+        self.tabWidget.currentChanged.connect(self._refresh)  # noqa
 
         self.updateForCurrentLayer()
 
@@ -49,41 +168,83 @@ class StyleviewerWidget(BASE, WIDGET):
             self.updateForCurrentLayer()
 
     def updateForCurrentLayer(self):
-        layer = iface.activeLayer()        
-        sld = ""
-        geostyler = ""
-        mapbox = ""
-        mapserver = ""
-        warnings = set()
-        if isSupportedLayer(layer):
-            # Try SLD conversion
-            try:
-                sld, _, sld_warnings = layerStyleAsSld(layer)
-            except Exception as e:
-                sld_warnings = [f"Failed to convert to SLD: {e}"]
-            # Try GeoStyler conversion
-            try:
-                geostyler, _, _, geostyler_warnings = convertStyle(layer)
-                geostyler = json.dumps(geostyler, indent=4)
-            except Exception as e:
-                geostyler_warnings = [f"Failed to convert to GeoStyler: {e}"]
-            # Try MapBox GL conversion
-            try:
-                mapbox, _, mapbox_warnings = layerStyleAsMapbox(layer)
-            except Exception as e:
-                mapbox_warnings = [f"Failed to convert to MapBox GL: {e}"]
-            # Try Mapfile conversion
-            try:
-                mapserver, _, _, mapserver_warnings = layerStyleAsMapfile(layer)
-            except Exception as e:
-                mapserver_warnings = [f"Failed to convert to Mapfile: {e}"]
-            # Collect all warnings
-            warnings.update(chain(sld_warnings, geostyler_warnings, mapbox_warnings, mapserver_warnings))
-        self.txtSld.setText(sld)
-        self.txtGeostyler.setText(geostyler)
-        self.txtMapbox.setText(mapbox)
-        self.txtMapserver.setText(mapserver)
-        self.txtWarnings.setPlainText("\n".join(warnings))
+        """ Schedules a refresh of the viewer for the current layer.
+        Bursts of calls (e.g. when the user drags a symbol slider) only result in a single refresh.
+        """
+        self._timer.start()
+
+    def stopRefresh(self):
+        """ Cancels a scheduled refresh and waits for a running style conversion to finish. """
+        self._timer.stop()
+        self._pending = False
+        if self._converter is not None:
+            self._converter.wait()
+
+    def _visibleFormats(self) -> list:
+        """ Returns the style formats that should be converted for the current tab. """
+        fmt = self._tabs.get(self.tabWidget.currentWidget())
+        return [fmt] if fmt else list(CONVERTERS)
+
+    def _refresh(self, *_):
+        """ Shows the converted styles for the current layer.
+        Only the formats of the visible tab are converted (in the background), if they were not converted before.
+        """
+        if not self.isVisible():
+            # Viewer will be refreshed when it is shown again
+            return
+        layer = iface.activeLayer()
+        if not isSupportedLayer(layer):
+            self._current_key = None
+            self._show({})
+            return
+
+        key = f"{layer.id()}:{styleKey(layer)}"
+        self._current_key = key
+        outputs = self._outputs.get(key, {})
+        self._show(outputs)
+        missing = [fmt for fmt in self._visibleFormats() if fmt not in outputs]
+        if not missing:
+            return
+        if self._converter is not None:
+            # Refresh again when the running conversion has finished
+            self._pending = True
+            return
+        self._converter = StyleConverter(key, layer.id(), layer.clone(), missing)
+        self._converter.resultReady.connect(self._converted)  # noqa
+        self._converter.finished.connect(self._converterFinished)  # noqa
+        self._converter.start()
+
+    def _converted(self, key: str, outputs: dict):
+        self._outputs.setdefault(key, {}).update(outputs)
+        self._outputs.move_to_end(key)
+        while len(self._outputs) > MAX_CACHED_STYLES:
+            self._outputs.popitem(last=False)
+        if key == self._current_key:
+            self._show(self._outputs[key])
+
+    def _converterFinished(self):
+        self._converter.deleteLater()
+        self._converter = None
+        if self._pending:
+            self._pending = False
+            self._refresh()
+
+    def _setText(self, editor, text: str):
+        """ Sets the editor text, unless it is already displayed (setting large texts is expensive). """
+        if self._displayed.get(editor) != text:
+            editor.setText(text)
+            self._displayed[editor] = text
+
+    def _show(self, outputs: dict):
+        warnings = OrderedDict()
+        for fmt, editor in self._editors.items():
+            text, fmt_warnings = outputs.get(fmt, ("", []))
+            self._setText(editor, text)
+            warnings.update((w, None) for w in fmt_warnings)
+        text = "\n".join(warnings)
+        if self._displayed.get(self.txtWarnings) != text:
+            self.txtWarnings.setPlainText(text)
+            self._displayed[self.txtWarnings] = text
 
 
 class EditorWidget(QsciScintilla):
@@ -1,22 +1,24 @@
 import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
 
 from qgis.PyQt import QtCore
 from qgis.PyQt.QtWidgets import QMessageBox, QWidget, QProgressDialog
 from qgis.PyQt.QtWidgets import QSizePolicy
-from qgis.core import Qgis, QgsMessageLog, QgsMessageOutput
+from qgis.core import Qgis, QgsMessageOutput
 from qgis.gui import QgsMessageBar
 from qgis.utils import iface
 
-from geocatbridge.utils.meta import getAppName
-
-_LOGGER = QgsMessageLog()
+from geocatbridge.utils.logchannel import CHANNEL, LogIssues, currentScope
+from geocatbridge.utils.meta import getAppName, PLUGIN_NAMESPACE
 
 
 def _log(message, level):
-    """ Simple log wrapper function. """
+    """ Simple log wrapper function that writes to the (buffered) Bridge log channel. """
     if isinstance(message, Exception):
         message = str(message)
-    _LOGGER.logMessage(message, getAppName(), level)
+    CHANNEL.emit(message, level)
 
 
 def translate(message, *args, **kwargs):
@@ -39,21 +41,59 @@ def logError(message):
     _log(translate(message), Qgis.Critical)
 
 
+# The FeedbackMixin instance that receives feedback for the code that currently executes.
+# Each thread (and asyncio task) has its own context, so concurrent tasks never see each other's sink.
+_SINK = ContextVar(f'{PLUGIN_NAMESPACE}_feedback_sink', default=None)
+
+
+@contextmanager
+def sink(target):
+    """ Context manager that makes the given FeedbackMixin instance the current feedback sink
+    for the duration of the `with` block. Functions decorated with `inject` that are called
+    within that block will receive the sink as their 'feedback' keyword argument.
+
+    The sink is bound to the current thread (context) only. Code that is submitted to a worker thread
+    should either set its own sink or run within a copied context (see `contextvars.copy_context()`).
+    """
+    token = _SINK.set(target)
+    try:
+        yield target
+    finally:
+        _SINK.reset(token)
+
+
+def scoped(method):
+    """ Decorator for FeedbackMixin methods that makes the instance the current feedback sink
+    while the method executes (see `sink()`).
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with sink(self):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def currentSink():
+    """ Returns the current feedback sink (FeedbackMixin instance) or None if it was not set. """
+    return _SINK.get()
+
+
 def inject(f, kwarg_name: str = 'feedback'):
     """ Decorator that can be used to inject a FeedbackMixin instance into the 'feedback' keyword argument
-    of a wrapped function, if that function has **kwargs and the caller has/is a FeedbackMixin.
-    If the wrapped function already has a 'feedback' keyword argument or the caller does not have a FeedbackMixin,
+    of a wrapped function, if that function has **kwargs and a feedback sink has been set (see `sink()`).
+    If the wrapped function already has a 'feedback' keyword argument or no sink was set,
     this decorator does nothing. The wrapped function is responsible for handling the 'feedback' argument correctly.
     """
+    if inspect.getfullargspec(f).varkw is None:
+        # Function does not accept **kwargs: nothing to inject
+        return f
+
+    @wraps(f)
     def wrapper(*args, **kwargs):
-        try:
-            has_kwargs = inspect.getfullargspec(f).varkw is not None
-            caller = inspect.stack()[1][0].f_locals['self']
-        except (KeyError, IndexError, AttributeError):
-            has_kwargs = False
-            caller = None
-        if isinstance(caller, FeedbackMixin) and has_kwargs and kwarg_name not in kwargs:
-            kwargs[kwarg_name] = caller
+        if kwarg_name not in kwargs:
+            caller = _SINK.get()
+            if isinstance(caller, FeedbackMixin):
+                kwargs[kwarg_name] = caller
         return f(*args, **kwargs)
     return wrapper
 
@@ -71,8 +111,7 @@ class FeedbackMixin:
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._errors = []
-        self._warnings = []
+        self._issues = LogIssues()
         self._main_bar = iface.messageBar()
         self._widget_bar = self._main_bar
         self.translate = translate
@@ -89,10 +128,7 @@ class FeedbackMixin:
             message = str(message)
         text = self.translate(message)
         _log(text, level)
-        if level == Qgis.Warning:
-            self._warnings.append(text)
-        elif level == Qgis.Critical:
-            self._errors.append(text)
+        (currentScope() or self._issues).add(text, level)
 
     def _propagate(self, message, level, **kwargs):
         value = kwargs.get("propagate")
@@ -127,14 +163,21 @@ class FeedbackMixin:
         """ Logs an error message. """
         self._log(message, Qgis.Critical)
 
+    def logDebug(self, message):
+        """ Logs a (high volume) debug message, e.g. for each request.
+        Depending on the log verbosity settings, these messages are sampled or not logged at all.
+        Debug messages are not translated and never collected as issues.
+        """
+        if CHANNEL.accepts(Qgis.Info, True):
+            CHANNEL.emit(str(message), Qgis.Info)
+
     def getLogIssues(self):
-        """ Returns a tuple of all logged (warnings, errors). """
-        return self._warnings, self._errors
+        """ Returns a tuple of all logged (warnings, errors) that were not collected by a log scope. """
+        return self._issues.warnings, self._issues.errors
 
     def resetLogIssues(self):
         """ Reset the logged warnings and errors lists. """
-        self._errors = []
-        self._warnings = []
+        self._issues = LogIssues()
 
     def showSuccessBar(self, title, message, **kwargs):
         """
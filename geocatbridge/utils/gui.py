@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Iterable
 
 from qgis.PyQt import QtCore
@@ -40,20 +41,23 @@ class ItemProcessor(QtCore.QThread):
 
     :param items:       Iterable of items to process.
     :param processor:   The processor function to call on each item. This function must accept one argument.
+    :param workers:     Number of worker threads that process the items concurrently (default = 1).
+                        The processor function must be thread-safe if this is larger than 1.
     :returns:           The resultReady signal slot receives a list of results for each processed item.
+                        Results are in the same order as the items (failed items are left out).
     """
     progress = QtCore.pyqtSignal(int)
     resultReady = QtCore.pyqtSignal(list)
 
-    def __init__(self, items: Iterable, processor):
+    def __init__(self, items: Iterable, processor, workers: int = 1):
         super().__init__()
         self._items = items
         self._func = processor
+        self._workers = max(1, workers)
 
-    def run(self):
+    def _processSerial(self) -> tuple:
         results = []
         total_steps = 0
-        QApplication.processEvents()
         for step, item in enumerate(self._items):
             total_steps += 1
             self.progress.emit(step)  # noqa
@@ -64,6 +68,31 @@ class ItemProcessor(QtCore.QThread):
                 logError(e)
             if self.isInterruptionRequested():
                 break
+        return results, total_steps
+
+    def _processParallel(self) -> tuple:
+        items = list(self._items)
+        results = {}
+        with ThreadPoolExecutor(self._workers) as pool:
+            futures = {pool.submit(self._func, item): i for i, item in enumerate(items)}
+            for step, future in enumerate(as_completed(futures)):
+                self.progress.emit(step)  # noqa
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    logError(e)
+                if self.isInterruptionRequested():
+                    for f in futures:
+                        f.cancel()
+                    break
+        return [results[i] for i in sorted(results)], len(items)
+
+    def run(self):
+        QApplication.processEvents()
+        if self._workers > 1:
+            results, total_steps = self._processParallel()
+        else:
+            results, total_steps = self._processSerial()
         if not self.isInterruptionRequested():
             # Emit 100% progress and wait briefly so that user sees it
             self.progress.emit(total_steps)  # noqa
@@ -2,6 +2,7 @@ from re import compile
 from pathlib import Path
 from itertools import chain
 from functools import partial
+from weakref import ref
 from typing import Union, Tuple, List, Iterable, FrozenSet
 from collections import namedtuple
 
@@ -19,36 +20,95 @@ LAYERNAME_REGEX = compile(r'^layername=(.*)$')
 
 
 class BridgeLayer:
+    # QGIS layer classes that already have the BridgeLayer properties assigned to them
+    _patched_classes = set()
+
     def __new__(cls, qgis_layer):
         """ Wrapper for a QGIS layer (QgsMapLayer, QgsVectorLayer, QgsRasterLayer etc.) that
         sets some protected attributes and adds some properties to the layer that are often required by Bridge,
         and immediately returns the modified layer instance.
 
+        Wrapping is idempotent: the properties are assigned to the layer class only once,
+        and the parsed data source and slugs are cached on the layer instance until
+        the layer name or data source changes.
+
         Note that the type will be that of the 'qgis_layer'!
         This means that `isinstance(<val>, BridgeLayer)` will always return False.
 
         :param qgis_layer:  QgsMapLayer instance or one of its inheritors.
         """
-        qgis_layer.__dataset_name, qgis_layer.__source_uri = cls._parse_source(qgis_layer)
-        qgis_layer.__web_slug = strings.layer_slug(qgis_layer)
-        qgis_layer.__file_slug = strings.layer_slug(qgis_layer, False)
-        for pname, pval in cls.__dict__.items():
-            if isinstance(pval, property):
-                setattr(qgis_layer.__class__, pname, pval)
+        if getattr(qgis_layer, '_BridgeLayer__wrapped', False):
+            # Layer has been wrapped before: nothing to do
+            return qgis_layer
+
+        layer_class = qgis_layer.__class__
+        if layer_class not in cls._patched_classes:
+            for pname, pval in cls.__dict__.items():
+                if isinstance(pval, property):
+                    setattr(layer_class, pname, pval)
+            cls._patched_classes.add(layer_class)
+
+        cls._reset(qgis_layer)
         # Override title, abstract and keyword methods, so they look in metadata instead
-        qgis_layer.title = qgis_layer.metadata().title
-        qgis_layer.abstract = qgis_layer.metadata().abstract
+        qgis_layer.title = partial(cls.title, qgis_layer)
+        qgis_layer.abstract = partial(cls.abstract, qgis_layer)
         qgis_layer.keywords = partial(cls.keywords, qgis_layer)
+        cls._connect(qgis_layer)
+        qgis_layer.__wrapped = True
         return qgis_layer
 
+    @staticmethod
+    def _reset(layer):
+        """ Clears the cached source and slug attributes, so they will be recomputed on the next access. """
+        layer.__source = None
+        layer.__web_slug = None
+        layer.__file_slug = None
+
+    @classmethod
+    def _connect(cls, layer):
+        """ Resets the cached attributes whenever the layer name or data source changes.
+        A weak reference is used, so that the signal connection does not keep the layer wrapper alive.
+        """
+        layer_ref = ref(layer)
+
+        def _invalidate(*_):
+            lyr = layer_ref()
+            if lyr is not None:
+                cls._reset(lyr)
+
+        for signal_name in ('nameChanged', 'dataSourceChanged'):
+            signal = getattr(layer, signal_name, None)
+            if signal is None:
+                # Older QGIS versions may not have all signals
+                continue
+            try:
+                signal.connect(_invalidate)
+            except (TypeError, RuntimeError):
+                pass
+
     def __getattr__(self, attr):
         # Prevent IDE's from showing errors for missing methods or attributes on the QgsMapLayer
         return getattr(self, attr)
 
+    def title(self) -> str:
+        """ Returns the title from the layer metadata. """
+        return self.metadata().title()
+
+    def abstract(self) -> str:
+        """ Returns the abstract from the layer metadata. """
+        return self.metadata().abstract()
+
     def keywords(self) -> List[str]:
         """ Returns a list of all keywords in the metadata. """
         return sorted([v.strip() for v in chain.from_iterable(self.metadata().keywords().values())])
 
+    @property
+    def _source(self) -> Tuple[str, Union[Path, QgsDataSourceUri, None]]:
+        """ Returns the cached (dataset name, source URI) tuple. The source is parsed on first access. """
+        if self.__source is None:
+            self.__source = BridgeLayer._parse_source(self)
+        return self.__source
+
     @staticmethod
     def _parse_source(layer) -> Tuple[str, Union[Path, QgsDataSourceUri, None]]:
         """ Analyzes the layer source and returns either a Path or a QgsDataSourceUri instance (or None). """
@@ -81,6 +141,8 @@ class BridgeLayer:
         Any character that does not comply is replaced by an underscore.
         If the output string would otherwise start with a non-alpha character, it will be prepended by an 'L'.
         """
+        if self.__web_slug is None:
+            self.__web_slug = strings.layer_slug(self)
         return self.__web_slug
 
     @property
@@ -95,6 +157,8 @@ class BridgeLayer:
         they are replaced by underscores here. This is done to avoid potential problems
         with double file extensions or unquoted paths in shell commands, for example.
         """
+        if self.__file_slug is None:
+            self.__file_slug = strings.layer_slug(self, False)
         return self.__file_slug
 
     @property
@@ -110,18 +174,18 @@ class BridgeLayer:
     @property
     def is_postgis_based(self) -> bool:
         """ Returns True if the layer source is stored in a PostGIS database. """
-        return isinstance(self.__source_uri, QgsDataSourceUri)
+        return isinstance(self._source[1], QgsDataSourceUri)
 
     @property
     def is_file_based(self) -> bool:
         """ Returns True if the layer source is file-based (e.g. GeoPackage, Shapefile, GeoTIFF, etc.). """
-        return isinstance(self.__source_uri, Path)
+        return isinstance(self._source[1], Path)
 
     @property
     def uri(self) -> Union[Path, QgsDataSourceUri, None]:
         """ Returns the layer source path or database connection details.
         May return None if the layer data provider is not supported. """
-        return self.__source_uri
+        return self._source[1]
 
     @property
     def dataset_name(self):
@@ -130,15 +194,16 @@ class BridgeLayer:
         For a file-based source, this will be the name of the file without the extension (i.e. stem).
         For a GeoPackage, this will be the name of the layer inside the .gpkg file.
         """
-        return self.__dataset_name
+        return self._source[0]
 
     @property
     def can_publish(self) -> bool:
         """ Returns True if the layer can be published with Bridge,
         assuming that the layer is also supported (see isSupportedLayer()).
-        This is the case if the __dataset_name and __source_uri have been set.
+        This is the case if the dataset name and source URI have been set.
         """
-        return self.__dataset_name and self.__source_uri and (self.is_vector or self.is_raster)
+        dataset_name, source_uri = self._source
+        return dataset_name and source_uri and (self.is_vector or self.is_raster)
 
 
 LayerGroup = namedtuple('LayerGroup', 'name title abstract layers')
@@ -276,7 +341,14 @@ def layerById(layer_id: str, publishable_only: bool = True) -> Union[None, Bridg
     :param publishable_only:    If True, only search within publishable layers (default).
     :returns:                   A BridgeLayer (if 'publishable_only' is True), QgsMapLayer or None if not found.
     """
-    for lyr in (listBridgeLayers() if publishable_only else QgsProject().instance().mapLayers().values()):
-        if lyr.id() == layer_id:
-            return lyr
+    project = QgsProject().instance()
+    lyr = project.mapLayer(layer_id)
+    if not (lyr and publishable_only):
+        return lyr
+    if project.layerTreeRoot().findLayer(layer_id) is None:
+        # Only layers in the TOC are publishable
+        return None
+    bridge_layer = BridgeLayer(lyr)
+    if isSupportedLayer(bridge_layer) and bridge_layer.can_publish:
+        return bridge_layer
     return None
@@ -0,0 +1,210 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from itertools import count
+
+from qgis.PyQt.QtCore import QSettings, QTimer
+from qgis.core import Qgis, QgsMessageLog
+
+from geocatbridge.utils.enum_ import LabeledIntEnum
+from geocatbridge.utils.meta import getAppName, PLUGIN_NAMESPACE
+
+VERBOSITY_SETTING = f"{PLUGIN_NAMESPACE}/LogVerbosity"
+SAMPLING_SETTING = f"{PLUGIN_NAMESPACE}/LogRequestSampling"
+
+# Interval (in milliseconds) at which the buffered messages are written to the QGIS message log
+FLUSH_INTERVAL = 250
+# Maximum number of buffered messages to write per flush (keeps the main thread responsive)
+FLUSH_BATCH_SIZE = 1000
+
+
+class Verbosity(LabeledIntEnum):
+    """ Container class for log verbosity constants. """
+    QUIET = 'Warnings and errors only'
+    NORMAL = 'Default'
+    VERBOSE = 'All messages (including every request)'
+
+
+class LogIssues:
+    """ Collects the warnings and errors that were logged within a scope (e.g. a task or a layer).
+    Adding issues is thread-safe, so worker threads can report into the same collection.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self._warnings = deque()
+        self._errors = deque()
+
+    def add(self, text, level):
+        """ Stores the given message if the level is a warning or error level. """
+        if level == Qgis.Warning:
+            self._warnings.append(text)
+        elif level == Qgis.Critical:
+            self._errors.append(text)
+
+    def clear(self):
+        """ Removes all collected warnings and errors. """
+        self._warnings.clear()
+        self._errors.clear()
+
+    @property
+    def warnings(self) -> list:
+        return list(self._warnings)
+
+    @property
+    def errors(self) -> list:
+        return list(self._errors)
+
+
+# The LogIssues instance that collects the warnings and errors for the code that currently executes.
+# Like the feedback sink, each thread (and asyncio task) has its own scope.
+_SCOPE = ContextVar(f'{PLUGIN_NAMESPACE}_log_scope', default=None)
+
+
+@contextmanager
+def scope(name=None):
+    """ Context manager that collects all warnings and errors logged by FeedbackMixin instances
+    within the `with` block into a new LogIssues instance, which is returned.
+    While a scope is active, the issues are NOT added to the FeedbackMixin instance itself.
+
+    The scope is bound to the current thread (context) only.
+    """
+    issues = LogIssues(name)
+    token = _SCOPE.set(issues)
+    try:
+        yield issues
+    finally:
+        _SCOPE.reset(token)
+
+
+def scoped(method):
+    """ Decorator for (task) methods that collects all logged issues into a new scope
+    named after the instance class while the method executes (see `scope()`).
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with scope(self.__class__.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def currentScope():
+    """ Returns the current LogIssues scope or None if there is no active scope. """
+    return _SCOPE.get()
+
+
+class LogChannel:
+    """ Buffered logging channel that writes to the QGIS message log.
+
+    Messages are appended to a queue without locking, so worker threads never block on the log.
+    Once `start()` has been called (on the main thread), a timer flushes the queue in batches
+    from the main thread. Until then (or after `stop()`), messages are written directly.
+    """
+
+    def __init__(self):
+        self._queue = deque()
+        self._timer = None
+        self._counter = count()
+        self.verbosity = Verbosity.NORMAL
+        self.sampling = 1
+        self._log_info = True
+        self._debug_all = False
+        self._debug_sampled = True
+        self.loadSettings()
+
+    def loadSettings(self):
+        """ Reads the verbosity level and request log sampling rate from the QGIS settings. """
+        settings = QSettings()
+        try:
+            verbosity = Verbosity[int(settings.value(VERBOSITY_SETTING, int(Verbosity.NORMAL)))]
+        except (TypeError, ValueError, IndexError):
+            verbosity = Verbosity.NORMAL
+        try:
+            sampling = max(0, int(settings.value(SAMPLING_SETTING, 1)))
+        except (TypeError, ValueError):
+            sampling = 1
+        self.configure(verbosity, sampling)
+
+    def configure(self, verbosity, sampling: int = 1):
+        """ Sets the verbosity level and request log sampling rate.
+        The verbosity is resolved here once, so that `accepts()` does not need to look it up for every message.
+        """
+        self.verbosity = verbosity
+        self.sampling = sampling
+        self._log_info = verbosity != Verbosity.QUIET
+        self._debug_all = verbosity == Verbosity.VERBOSE
+        self._debug_sampled = verbosity == Verbosity.NORMAL and bool(sampling)
+
+    def accepts(self, level, debug=False) -> bool:
+        """ Returns True if a message with the given level would be logged.
+        Debug messages (e.g. per-request logs) are always logged if the verbosity is VERBOSE.
+        For NORMAL verbosity, only 1 in every N debug messages is logged, where N is the sampling rate.
+        If N is 0, debug messages are switched off.
+        """
+        if debug:
+            if self._debug_all:
+                return True
+            if not self._debug_sampled:
+                return False
+            return next(self._counter) % self.sampling == 0
+        return self._log_info or level != Qgis.Info
+
+    def emit(self, text, level, debug=False):
+        """ Queues a message for the QGIS message log (or writes it directly if the channel is not started). """
+        if not self.accepts(level, debug):
+            return
+        if self._timer is None:
+            QgsMessageLog.logMessage(text, getAppName(), level)
+            return
+        self._queue.append((level, text))
+
+    def flush(self):
+        """ Writes the queued messages to the QGIS message log.
+        Consecutive identical messages (same text and level) are combined into a single log entry.
+        """
+        app_name = getAppName()
+        last, repeats = None, 0
+        for _ in range(min(len(self._queue), FLUSH_BATCH_SIZE)):
+            try:
+                message = self._queue.popleft()
+            except IndexError:
+                break
+            if message == last:
+                repeats += 1
+                continue
+            if last is not None:
+                self._write(app_name, last, repeats)
+            last, repeats = message, 1
+        if last is not None:
+            self._write(app_name, last, repeats)
+
+    @staticmethod
+    def _write(app_name: str, message: tuple, repeats: int):
+        level, text = message
+        if repeats > 1:
+            text = f"{text} (repeated {repeats} times)"
+        QgsMessageLog.logMessage(text, app_name, level)
+
+    def start(self, interval=FLUSH_INTERVAL):
+        """ Starts buffering and periodic flushing. Must be called from the main thread. """
+        self.loadSettings()
+        if self._timer is not None:
+            return
+        self._timer = QTimer()
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(interval)
+
+    def stop(self):
+        """ Stops the flush timer and writes all remaining messages. Must be called from the main thread. """
+        if self._timer is None:
+            return
+        self._timer.stop()
+        self._timer.timeout.disconnect(self.flush)
+        self._timer = None
+        while self._queue:
+            self.flush()
+
+
+# Plugin-wide logging channel
+CHANNEL = LogChannel()
@@ -0,0 +1,354 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlparse
+
+from geocatbridge.utils import strings
+from geocatbridge.utils.meta import PLUGIN_NAMESPACE
+
+# Environment variable that can be set to a folder path for headless (processing) runs:
+# if set, the metrics are written to that folder after each Bridge algorithm has finished.
+METRICS_DIR_ENV = f"{PLUGIN_NAMESPACE.upper()}_METRICS_DIR"
+
+# Default latency histogram bucket upper bounds (in seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Metric:
+    """ Base class for a labeled metric. All updates are thread-safe. """
+    kind = None
+
+    def __init__(self, name, doc):
+        self.name = name
+        self.doc = doc
+        self._lock = threading.Lock()
+        self._values = OrderedDict()
+
+    @staticmethod
+    def _key(labels: dict) -> tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def items(self, since: dict = None) -> list:
+        """ Returns a list of (labels dict, value) tuples.
+        If a snapshot (see `snapshot()`) is given, only the changes since that snapshot are returned.
+        """
+        with self._lock:
+            values = [(k, self._copy(v)) for k, v in self._values.items()]
+        if since is None:
+            return [(dict(k), v) for k, v in values]
+        result = []
+        for k, v in values:
+            delta = self._delta(v, since.get(k))
+            if delta is not None:
+                result.append((dict(k), delta))
+        return result
+
+    def snapshot(self) -> dict:
+        """ Returns a copy of the current values, which can be passed to `items()` to get the changes since then. """
+        with self._lock:
+            return {k: self._copy(v) for k, v in self._values.items()}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def _delta(value, base):
+        """ Returns the change of the value since the base value, or None if the value did not change. """
+        if base is None:
+            return value
+        return value - base if value != base else None
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """ Metric with a value that only goes up (e.g. number of requests). """
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def total(self, since: dict = None, **labels):
+        """ Returns the sum of all values that match the given labels (since the given snapshot, if any). """
+        match = set(self._key(labels))
+        return sum(v for k, v in self.items(since) if match.issubset(self._key(k)))
+
+
+class Histogram(_Metric):
+    """ Metric that counts observations (e.g. request durations) in cumulative buckets. """
+    kind = 'histogram'
+
+    def __init__(self, name, doc, buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc)
+        self.buckets = tuple(sorted(buckets))
+
+    @staticmethod
+    def _copy(value):
+        return {'buckets': list(value['buckets']), 'sum': value['sum'], 'count': value['count']}
+
+    @staticmethod
+    def _delta(value, base):
+        if base is None:
+            return value
+        if value['count'] == base['count']:
+            return None
+        return {
+            'buckets': [v - b for v, b in zip(value['buckets'], base['buckets'])],
+            'sum': value['sum'] - base['sum'],
+            'count': value['count'] - base['count']
+        }
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            data['buckets'][index] += 1
+            data['sum'] += value
+            data['count'] += 1
+
+
+class MetricsRegistry:
+    """ Lightweight in-process metrics registry that can be exported as JSON or Prometheus text. """
+
+    def __init__(self, prefix=PLUGIN_NAMESPACE):
+        self.prefix = prefix
+        self._metrics = OrderedDict()
+        self._cache_collectors = OrderedDict()
+        self._cache_baselines = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, doc, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, doc, **kwargs)
+            elif not isinstance(metric, cls):
+                raise TypeError(f"metric '{name}' is a {metric.kind}, not a {cls.kind}")
+            return metric
+
+    def counter(self, name, doc='') -> Counter:
+        """ Returns the counter with the given name (creates it if it does not exist). """
+        return self._get(Counter, name, doc)
+
+    def histogram(self, name, doc='', buckets=LATENCY_BUCKETS) -> Histogram:
+        """ Returns the histogram with the given name (creates it if it does not exist). """
+        return self._get(Histogram, name, doc, buckets=buckets)
+
+    def registerCache(self, name, collector):
+        """ Registers a function that returns a (hits, misses) tuple for a cache that keeps its own
+        statistics (e.g. `lambda: f.cache_info()[:2]` for `functools.lru_cache` functions).
+        """
+        self._cache_collectors[name] = collector
+
+    def baseline(self) -> dict:
+        """ Returns a snapshot of all metric values and cache statistics. Pass it to `cacheStats()`, `asDict()`,
+        `asPrometheus()` or `save()` to report only what happened since then (e.g. during a single task run),
+        without resetting the metrics of other runs that may still be in progress.
+        """
+        return {
+            'metrics': {name: metric.snapshot() for name, metric in list(self._metrics.items())},
+            'caches': {name: tuple(collector()) for name, collector in self._cache_collectors.items()}
+        }
+
+    def cacheStats(self, baseline: dict = None) -> OrderedDict:
+        """ Returns an ordered dictionary with the (hits, misses) per cache (since the given baseline, if any). """
+        stats = OrderedDict()
+        cache_baselines = self._cache_baselines if baseline is None else baseline['caches']
+        for name, collector in self._cache_collectors.items():
+            hits, misses = collector()
+            base_hits, base_misses = cache_baselines.get(name, (0, 0))
+            stats[name] = (hits - base_hits, misses - base_misses)
+        for labels, value in CACHE_REQUESTS.items(self._since(baseline, CACHE_REQUESTS)):
+            hits, misses = stats.get(labels['cache'], (0, 0))
+            if labels['result'] == 'hit':
+                hits += value
+            else:
+                misses += value
+            stats[labels['cache']] = (hits, misses)
+        return stats
+
+    def reset(self):
+        """ Resets all metric values. Caches that keep their own statistics are not cleared,
+        but their current statistics are used as a baseline, so that only new hits and misses are reported.
+        """
+        for metric in list(self._metrics.values()):
+            metric.reset()
+        self._cache_baselines = {name: tuple(collector()) for name, collector in self._cache_collectors.items()}
+
+    @staticmethod
+    def _since(baseline: dict, metric: _Metric):
+        """ Returns the snapshot of the given metric in the baseline (None if there is no baseline). """
+        if baseline is None:
+            return None
+        return baseline['metrics'].get(metric.name, {})
+
+    def asDict(self, baseline: dict = None) -> dict:
+        """ Returns all metrics (and derived ratios and throughput figures) as a JSON-serializable dictionary.
+        If a baseline is given (see `baseline()`), only the changes since that baseline are reported.
+        """
+        result = OrderedDict()
+        for name, metric in list(self._metrics.items()):
+            result[name] = {
+                'type': metric.kind,
+                'help': metric.doc,
+                'values': [{'labels': labels, 'value': value}
+                           for labels, value in metric.items(self._since(baseline, metric))]
+            }
+        result['cache_hit_ratio'] = OrderedDict(
+            (name, round(hits / (hits + misses), 4) if hits + misses else None)
+            for name, (hits, misses) in self.cacheStats(baseline).items()
+        )
+        throughput = OrderedDict()
+        for labels, seconds in EXPORT_SECONDS.items(self._since(baseline, EXPORT_SECONDS)):
+            if not seconds:
+                continue
+            features = EXPORT_FEATURES.total(self._since(baseline, EXPORT_FEATURES), **labels)
+            size = EXPORT_BYTES.total(self._since(baseline, EXPORT_BYTES), **labels)
+            throughput[labels['format']] = {
+                'features_per_second': round(features / seconds, 2),
+                'mb_per_second': round(size / seconds / 1024 ** 2, 3)
+            }
+        result['export_throughput'] = throughput
+        return result
+
+    def asPrometheus(self, baseline: dict = None) -> str:
+        """ Returns all metrics in the Prometheus text exposition format (version 0.0.4).
+        If a baseline is given (see `baseline()`), only the changes since that baseline are reported.
+        """
+
+        def _labels(labels: dict, **extra):
+            labels = dict(labels, **extra)
+            if not labels:
+                return ''
+            pairs = (f'{k}="{_escape(v)}"' for k, v in labels.items())
+            return '{' + ','.join(pairs) + '}'
+
+        lines = []
+        for name, metric in list(self._metrics.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {metric.doc}")
+            lines.append(f"# TYPE {full_name} {metric.kind}")
+            for labels, value in metric.items(self._since(baseline, metric)):
+                if metric.kind == Histogram.kind:
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + ('+Inf',), value['buckets']):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{_labels(labels, le=bound)} {cumulative}")
+                    lines.append(f"{full_name}_sum{_labels(labels)} {value['sum']}")
+                    lines.append(f"{full_name}_count{_labels(labels)} {value['count']}")
+                else:
+                    lines.append(f"{full_name}{_labels(labels)} {value}")
+        full_name = f"{self.prefix}_cache_hits_ratio"
+        lines.append(f"# HELP {full_name} Ratio of cache hits versus all cache lookups")
+        lines.append(f"# TYPE {full_name} gauge")
+        for name, (hits, misses) in self.cacheStats(baseline).items():
+            if hits + misses:
+                lines.append(f"{full_name}{_labels({'cache': name})} {hits / (hits + misses)}")
+        return '\n'.join(lines) + '\n'
+
+    def save(self, folder, name='metrics', baseline: dict = None) -> tuple:
+        """ Writes the metrics to a JSON file and a Prometheus text file (.prom) in the given folder.
+        If a baseline is given (see `baseline()`), only the changes since that baseline are written.
+        Returns a tuple with both file paths.
+        """
+        base = os.path.join(folder, f"{PLUGIN_NAMESPACE}_{name}_{datetime.now():%Y%m%d_%H%M%S}")
+        with open(f"{base}.json", 'w') as fp:
+            json.dump(self.asDict(baseline), fp, indent=2)
+        with open(f"{base}.prom", 'w') as fp:
+            fp.write(self.asPrometheus(baseline))
+        return f"{base}.json", f"{base}.prom"
+
+
+def _escape(value) -> str:
+    """ Escapes a Prometheus label value. """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def endpoint(url) -> str:
+    """ Returns a generalized endpoint path for the given URL, so that it can be used as a metric label.
+    In REST-style paths (i.e. after a "rest" or "api" path segment), each item that follows a collection name
+    (a plural, like "workspaces") is replaced by "{}", e.g. "/geoserver/rest/workspaces/{}/styles/{}.json"
+    or "/geonetwork/srv/api/records/{}".
+    """
+    parts = [p for p in urlparse(url).path.split('/') if p]
+    start = next((i + 1 for i, p in enumerate(parts) if p in ('rest', 'api')), 1)
+    for i in range(start, len(parts)):
+        if parts[i - 1].endswith('s') and parts[i - 1] != '{}':
+            parts[i] = '{}' + os.path.splitext(parts[i])[1]
+    return '/' + '/'.join(parts)
+
+
+def recordRequest(method: str, url: str, seconds: float, response=None, error=None):
+    """ Records the latency, status, retries and transferred bytes of an HTTP request.
+
+    :param method:      HTTP method (e.g. "get").
+    :param url:         The requested URL.
+    :param seconds:     Duration of the request.
+    :param response:    The `requests.Response` (if any).
+    :param error:       The exception that was raised (if any).
+    """
+    labels = {'method': method.upper(), 'endpoint': endpoint(url)}
+    REQUEST_LATENCY.observe(seconds, **labels)
+    if response is None:
+        REQUEST_COUNT.inc(status='error', **labels)
+        REQUEST_ERRORS.inc(error=type(error).__name__ if error else 'unknown', **labels)
+        return
+    REQUEST_COUNT.inc(status=response.status_code, **labels)
+    if response.status_code >= 400:
+        REQUEST_ERRORS.inc(error=f"HTTP {response.status_code}", **labels)
+    retries = getattr(getattr(response.raw, 'retries', None), 'history', None)
+    if retries:
+        REQUEST_RETRIES.inc(len(retries), **labels)
+    try:
+        BYTES_SENT.inc(int(response.request.headers.get('Content-Length') or 0), **labels)
+    except (AttributeError, ValueError):
+        pass
+    BYTES_RECEIVED.inc(len(response.content or b''), **labels)
+
+
+def recordExport(fmt: str, seconds: float, features: int = 0, path=None):
+    """ Records the duration, number of features and output file size of a data export. """
+    EXPORT_SECONDS.inc(seconds, format=fmt)
+    EXPORT_FEATURES.inc(max(features, 0), format=fmt)
+    try:
+        EXPORT_BYTES.inc(os.path.getsize(path) if path else 0, format=fmt)
+    except OSError:
+        pass
+
+
+def cacheHit(cache: str):
+    """ Records a cache hit for the cache with the given name. """
+    CACHE_REQUESTS.inc(cache=cache, result='hit')
+
+
+def cacheMiss(cache: str):
+    """ Records a cache miss for the cache with the given name. """
+    CACHE_REQUESTS.inc(cache=cache, result='miss')
+
+
+# Plugin-wide metrics registry
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram('http_request_duration_seconds', 'HTTP request latency per endpoint')
+REQUEST_COUNT = REGISTRY.counter('http_requests_total', 'Number of HTTP requests per endpoint and status')
+REQUEST_ERRORS = REGISTRY.counter('http_request_errors_total', 'Number of failed HTTP requests per endpoint')
+REQUEST_RETRIES = REGISTRY.counter('http_request_retries_total', 'Number of HTTP request retries per endpoint')
+BYTES_SENT = REGISTRY.counter('http_sent_bytes_total', 'Number of bytes sent per endpoint')
+BYTES_RECEIVED = REGISTRY.counter('http_received_bytes_total', 'Number of bytes received per endpoint')
+EXPORT_SECONDS = REGISTRY.counter('export_seconds_total', 'Time spent on data exports per format')
+EXPORT_FEATURES = REGISTRY.counter('export_features_total', 'Number of exported features per format')
+EXPORT_BYTES = REGISTRY.counter('export_bytes_total', 'Size of exported data files per format')
+CACHE_REQUESTS = REGISTRY.counter('cache_requests_total', 'Number of cache lookups per cache and result')
+
+REGISTRY.registerCache('layer_slug', lambda: strings._slugify.cache_info()[:2])  # noqa
@@ -1,4 +1,5 @@
 import unicodedata
+from functools import lru_cache
 from string import digits as DIGITS, ascii_letters as ASCII_LETTERS  # noqa
 from typing import Iterable
 
@@ -7,6 +8,9 @@ FILEPATH_CHARS = BASIC_CHARS.union("-")  # technically, dots and spaces are also
 WORKSPACE_CHARS = FILEPATH_CHARS.union(".")
 RFC3986_CHARS = WORKSPACE_CHARS.union("~")
 
+#: Maximum number of memoized layer slugs
+SLUG_CACHE_SIZE = 16384
+
 
 def replace_spaces(text: str) -> str:
     """ Replaces spaces for underscores in the given text string. """
@@ -71,11 +75,18 @@ def validate(text: str, first_alpha: bool = False, allowed_chars: Iterable = RFC
 
 def layer_slug(layer, to_web: bool = True) -> str:
     """ Convenience function to quickly convert the given layer/name to a "slug" for URLs or file names.
+    Results are memoized by name, since the same layer names are typically slugified many times.
 
     :param layer:   Layer object or name. If the first, the name() property will be used.
     :param to_web:  If True (default), a web slug is returned. Otherwise, a file slug.
     """
     name = layer.name() if hasattr(layer, 'name') else layer
+    return _slugify(name, to_web)
+
+
+@lru_cache(maxsize=SLUG_CACHE_SIZE)
+def _slugify(name: str, to_web: bool) -> str:
+    """ Memoized implementation of `layer_slug()`. """
     norm_options = {'first_letter': 'L', 'prepend': True}
     if not to_web:
         # Override allowed characters for file slugs
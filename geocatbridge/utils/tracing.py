@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from time import perf_counter
+
+from geocatbridge.utils.meta import PLUGIN_NAMESPACE
+
+# Span categories
+CAT_TASK = 'task'
+CAT_LAYER = 'layer'
+CAT_STEP = 'step'
+CAT_STYLE = 'style'
+CAT_EXPORT = 'export'
+CAT_METADATA = 'metadata'
+CAT_HTTP = 'http'
+
+# The Tracer that records spans for the code that currently executes (None if tracing is off).
+_TRACER = ContextVar(f'{PLUGIN_NAMESPACE}_tracer', default=None)
+
+
+class Tracer:
+    """ Records nested, timed spans that can be saved as a Chrome `trace_event` JSON file
+    (open it in chrome://tracing, https://ui.perfetto.dev or speedscope).
+    Recording is thread-safe: each thread is shown as a separate track.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.created = datetime.now()
+        self._start = perf_counter()
+        self._events = deque()
+
+    def now(self) -> float:
+        """ Returns the elapsed time since the creation of the tracer in microseconds. """
+        return (perf_counter() - self._start) * 1e6
+
+    def record(self, name, cat, start, end, args=None):
+        """ Adds a complete span event. Start and end times are in microseconds (see `now()`). """
+        event = {
+            'name': name,
+            'cat': cat,
+            'ph': 'X',
+            'ts': round(start, 1),
+            'dur': round(end - start, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        }
+        if args:
+            event['args'] = {k: str(v) for k, v in args.items()}
+        self._events.append(event)
+
+    def begin(self, name, cat, **args) -> tuple:
+        """ Starts a span that can not be wrapped in a `with` block and returns a token for `end()`. """
+        return name, cat, self.now(), args
+
+    def end(self, token: tuple):
+        """ Ends (records) a span that was started using `begin()`. """
+        name, cat, start, args = token
+        self.record(name, cat, start, self.now(), args)
+
+    @contextmanager
+    def activate(self):
+        """ Makes this tracer the current tracer (for the current thread) within the `with` block. """
+        token = _TRACER.set(self)
+        try:
+            yield self
+        finally:
+            _TRACER.reset(token)
+
+    @property
+    def events(self) -> list:
+        return list(self._events)
+
+    def summary(self) -> OrderedDict:
+        """ Returns an ordered dictionary with (span count, total duration in seconds) per step.
+        Task steps (symbology, data, metadata, groups) are listed by name, other spans by category.
+        """
+        totals = OrderedDict()
+        for event in sorted(self.events, key=lambda e: e['ts']):
+            cat = event['cat']
+            if cat in (CAT_TASK, CAT_LAYER):
+                continue
+            key = event['name'] if cat == CAT_STEP else cat
+            count, duration = totals.get(key, (0, 0.0))
+            totals[key] = (count + 1, duration + event['dur'] / 1e6)
+        return totals
+
+    def save(self, folder) -> str:
+        """ Writes the trace as a Chrome `trace_event` JSON file to the given folder and returns the file path. """
+        filename = f"{PLUGIN_NAMESPACE}_{self.name}_{self.created:%Y%m%d_%H%M%S}.trace.json"
+        path = os.path.join(folder, filename)
+        with open(path, 'w') as fp:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, fp)
+        return path
+
+
+def currentTracer():
+    """ Returns the current Tracer or None if tracing is not active. """
+    return _TRACER.get()
+
+
+@contextmanager
+def span(name, cat, **args):
+    """ Context manager that records a span with the given name and category on the current tracer.
+    Additional keyword arguments are stored as span arguments.
+    If there is no active tracer, this does (almost) nothing.
+    """
+    tracer = _TRACER.get()
+    if tracer is None:
+        yield
+        return
+    start = tracer.now()
+    try:
+        yield
+    finally:
+        tracer.record(name, cat, start, tracer.now(), args)
+
+
+def active(method):
+    """ Decorator for task methods that makes the `tracer` attribute of the instance the current tracer
+    while the method executes, and records the method call as a task span.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.tracer.activate():
+            with span(self.tracer.name, CAT_TASK):
+                return method(self, *args, **kwargs)
+    return wrapper
+
+
+def traced(cat, name=None):
+    """ Decorator that records each call of the wrapped function as a span in the given category.
+    By default, the span is named after the function.
+    """
+    def decorator(f):
+        span_name = name or f.__name__
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if _TRACER.get() is None:
+                return f(*args, **kwargs)
+            with span(span_name, cat):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator